@@ -0,0 +1,177 @@
+"""アセットの配信（内容のハッシュを含む URL と、事前に圧縮した gzip / brotli 版）"""
+import gzip
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+import logging
+
+try:
+    import brotli
+except ImportError:
+    # brotli は任意の依存（なければ gzip 版だけを作る）
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 圧縮済みの形式（圧縮版を作らない。バンドルでも圧縮せずに格納する）
+PRECOMPRESSED_SUFFIXES = {
+    ".png", ".jpg", ".jpeg", ".gif", ".webp",
+    ".mp3", ".ogg", ".m4a", ".aac", ".opus",
+    ".mp4", ".webm", ".mov",
+}
+# 圧縮してもこの割合以上小さくならなければ圧縮版を使わない
+COMPRESS_MIN_SAVING = 0.05
+
+# URL に含める SHA-256 の桁数
+ASSET_VERSION_LENGTH = 16
+# これより大きいファイルは圧縮版を作らない（バイト）
+ASSET_COMPRESS_MAX_SIZE = int(os.environ.get("MOCOTCH_ASSET_COMPRESS_MAX_SIZE", str(8 * 1024 * 1024)))
+# 圧縮レベル（1回だけ圧縮して使い回すので最大にする）
+ASSET_GZIP_LEVEL = 9
+ASSET_BROTLI_QUALITY = int(os.environ.get("MOCOTCH_ASSET_BROTLI_QUALITY", "11"))
+
+# バージョン付き URL のレスポンスに付ける Cache-Control
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# 圧縮版の置き場所（プロジェクトからの相対パス。ファイル名は内容の SHA-256）
+VARIANTS_DIR = Path(".git") / "mocotch" / "asset-variants"
+
+# Content-Encoding → 圧縮版の拡張子（優先する順）
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+# 作成中の圧縮版のロック（同じ内容を同時に圧縮しない）
+_building: Dict[Path, threading.Lock] = {}
+_building_guard = threading.Lock()
+
+
+def asset_version(sha256: str) -> str:
+    """URL に含めるバージョン（内容の SHA-256 の先頭）"""
+    return sha256[:ASSET_VERSION_LENGTH]
+
+
+def asset_url(project: str, asset_type: str, filename: str, sha256: str) -> str:
+    """内容が変わらない限り同じで、変われば変わるアセットの URL"""
+    return f"/api/projects/{quote(project)}/assets/{asset_type}/{quote(filename)}?v={asset_version(sha256)}"
+
+
+def asset_etag(sha256: str, encoding: Optional[str] = None) -> str:
+    """表現（圧縮の有無と種類）ごとの強い ETag"""
+    tag = sha256[:32]
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+def is_compressible(filename: str) -> bool:
+    """圧縮版を作る形式か（画像・音声・動画の圧縮済み形式は除く）"""
+    return Path(filename).suffix.lower() not in PRECOMPRESSED_SUFFIXES
+
+
+def accepted_encodings(accept_encoding: Optional[str]) -> List[str]:
+    """Accept-Encoding のうち、圧縮版を返せるもの（サーバーの優先順）"""
+    if not accept_encoding:
+        return []
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+    return [
+        encoding for encoding in ENCODING_SUFFIXES
+        if (encoding in accepted or "*" in accepted) and (encoding != "br" or brotli is not None)
+    ]
+
+
+class AssetVariants:
+    """
+    プロジェクトのアセットの圧縮版
+
+    圧縮版は最初に要求されたときに1回だけ作り、内容の SHA-256 をファイル名として
+    保存する。同じ内容なら別名・別の種類のアセットでも共有し、内容が変われば
+    別のファイルになるので無効化は要らない。圧縮しても十分に小さくならなかった場合は
+    空のファイルを残し、次からは圧縮を試さない（圧縮結果が空になることはない）。
+    """
+
+    def __init__(self, project_path: Path):
+        self.variants_dir = project_path / VARIANTS_DIR
+
+    def select(
+        self, source: Path, sha256: str, size: int, encodings: List[str]
+    ) -> Tuple[Path, Optional[str]]:
+        """
+        返すファイルと Content-Encoding（圧縮版がなければ元のファイルと None）
+
+        Args:
+            encodings: クライアントが受け付ける Content-Encoding（優先順）
+        """
+        if size <= ASSET_COMPRESS_MAX_SIZE:
+            for encoding in encodings:
+                variant = self.variant(source, sha256, encoding)
+                if variant is not None:
+                    return variant, encoding
+        return source, None
+
+    def variant(self, source: Path, sha256: str, encoding: str) -> Optional[Path]:
+        """圧縮版のパス（なければ作成。小さくならない場合は None）"""
+        path = self.variants_dir / f"{sha256}{ENCODING_SUFFIXES[encoding]}"
+        usable = self._built(path)
+        if usable is None:
+            with _building_lock(path):
+                usable = self._built(path)
+                if usable is None:
+                    usable = self._build(source, path, encoding)
+            with _building_guard:
+                _building.pop(path, None)
+        return path if usable else None
+
+    @staticmethod
+    def _built(path: Path) -> Optional[bool]:
+        """作成済みなら圧縮版を使えるか（未作成なら None）"""
+        try:
+            return path.stat().st_size > 0
+        except OSError:
+            return None
+
+    def _build(self, source: Path, path: Path, encoding: str) -> bool:
+        self.variants_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(source, "rb") as src, open(tmp_path, "wb") as dst:
+                if encoding == "gzip":
+                    with gzip.GzipFile(fileobj=dst, mode="wb", compresslevel=ASSET_GZIP_LEVEL, mtime=0) as gz:
+                        shutil.copyfileobj(src, gz, _COPY_CHUNK_SIZE)
+                else:
+                    compressor = brotli.Compressor(quality=ASSET_BROTLI_QUALITY)
+                    for chunk in iter(lambda: src.read(_COPY_CHUNK_SIZE), b""):
+                        dst.write(compressor.process(chunk))
+                    dst.write(compressor.finish())
+
+            original, compressed = source.stat().st_size, tmp_path.stat().st_size
+            usable = compressed <= original * (1 - COMPRESS_MIN_SAVING)
+            if not usable:
+                # 小さくならない（空のファイルで記録する）
+                tmp_path.write_bytes(b"")
+            os.replace(tmp_path, path)
+            if usable:
+                logger.info(f"アセットの圧縮版を作成: {source.name} {encoding} {original} → {compressed} バイト")
+            return usable
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+
+def _building_lock(path: Path) -> threading.Lock:
+    with _building_guard:
+        lock = _building.get(path)
+        if lock is None:
+            lock = _building[path] = threading.Lock()
+        return lock
@@ -0,0 +1,356 @@
+"""プロジェクトごとのアセットメタデータ索引"""
+import bisect
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ソート可能なキー
+ASSET_SORT_KEYS = ("filename", "size", "created_at")
+
+# 索引ファイルを書き出す最短間隔（秒）。書き出し前に落ちてもハッシュを計算し直すだけで済む
+INDEX_FLUSH_INTERVAL = 5.0
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class AssetIndex:
+    """
+    アセットのメタデータ（サイズ、作成日時、SHA-256、画像の縦横サイズ）の索引
+
+    アップロード・削除時に更新し、一覧取得時はディレクトリの mtime を確認して
+    外部での追加・削除を反映する。内容は .git/mocotch/asset-index.json に
+    保存し、再起動後もハッシュを計算し直さずに済むようにする。
+
+    外部で追加・変更されたファイルの SHA-256 は索引の照合時には計算せず、一覧や
+    取得で返すときにロックの外で計算する（大量のファイルの照合で他の処理を待たせない）。
+    """
+
+    def __init__(self, project_path: Path):
+        self.project_path = project_path
+        self.assets_dir = project_path / "assets"
+        self.index_file = project_path / ".git" / "mocotch" / "asset-index.json"
+        self._types: Dict[str, Dict[str, Any]] = {}
+        self._sorted: Dict[Tuple[str, str, bool], List[str]] = {}
+        self._dirty = False
+        self._last_flush = 0.0
+        self._lock = threading.RLock()
+        self._load()
+
+    def list_assets(
+        self,
+        asset_type: str,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        prefix: Optional[str] = None,
+        sort: str = "filename",
+        descending: bool = False,
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        アセット一覧をページ単位で取得
+
+        Returns:
+            (total, page)
+        """
+        if sort not in ASSET_SORT_KEYS:
+            raise ValueError(f"無効なソートキー: {sort}")
+
+        with self._lock:
+            self._recheck(asset_type)
+            entries = self._types[asset_type]["entries"]
+            names = self._sorted_names(asset_type, sort, descending)
+
+            if prefix and sort == "filename":
+                # ファイル名順なら二分探索で範囲を絞る
+                ascending = names[::-1] if descending else names
+                lo = bisect.bisect_left(ascending, prefix)
+                hi = bisect.bisect_left(ascending, prefix + "\U0010ffff")
+                names = ascending[lo:hi]
+                if descending:
+                    names = names[::-1]
+            elif prefix:
+                names = [n for n in names if n.startswith(prefix)]
+
+            end = len(names) if limit is None else offset + limit
+            page = [self._public(entries[n]) for n in names[offset:end]]
+
+        self._fill_hashes(asset_type, page)
+        with self._lock:
+            self._maybe_flush()
+        return len(names), page
+
+    def get(self, asset_type: str, filename: str) -> Optional[Dict[str, Any]]:
+        """1ファイル分のメタデータを取得"""
+        with self._lock:
+            self._recheck(asset_type)
+            entry = self._types[asset_type]["entries"].get(filename)
+            if entry is None:
+                return None
+            file_path = self.assets_dir / asset_type / filename
+            try:
+                stat = file_path.stat()
+            except OSError:
+                return None
+            if (stat.st_size, stat.st_mtime_ns) != (entry["size"], entry["mtime_ns"]):
+                entry = self._update_entry(asset_type, filename, None)
+            if entry is None:
+                return None
+            asset = self._public(entry)
+
+        self._fill_hashes(asset_type, [asset])
+        return asset
+
+    def update(self, asset_type: str, filename: str, sha256: Optional[str] = None):
+        """
+        アップロードされたファイルのエントリを更新
+
+        ディレクトリの mtime はこの書き込みで変わっているので照合はせず（照合すると
+        書き込んだばかりのファイルを読み直すことになる）、現在の mtime を記録する
+        """
+        with self._lock:
+            self._state(asset_type)
+            self._update_entry(asset_type, filename, sha256)
+            self._types[asset_type]["dir_mtime"] = self._dir_mtime(asset_type)
+            self._maybe_flush()
+
+    def remove(self, asset_type: str, filename: str):
+        """削除されたファイルのエントリを削除（update と同じく照合はしない）"""
+        with self._lock:
+            if self._state(asset_type)["entries"].pop(filename, None) is not None:
+                self._changed(asset_type)
+            self._types[asset_type]["dir_mtime"] = self._dir_mtime(asset_type)
+            self._maybe_flush()
+
+    def flush(self):
+        """変更があれば索引ファイルに書き出す"""
+        with self._lock:
+            if not self._dirty or not self.index_file.parent.parent.is_dir():
+                return
+            try:
+                self.index_file.parent.mkdir(exist_ok=True)
+                tmp_path = self.index_file.with_name(f".{self.index_file.name}.tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"types": self._types}, f, ensure_ascii=False)
+                os.replace(tmp_path, self.index_file)
+                self._dirty = False
+                self._last_flush = time.monotonic()
+            except Exception as e:
+                logger.error(f"アセット索引の保存失敗: {e}")
+
+    def _load(self):
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                self._types = json.load(f).get("types", {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"アセット索引を読み込めないため作り直します: {e}")
+            self._types = {}
+
+    def _recheck(self, asset_type: str):
+        """ディレクトリの mtime が変わっていればファイル一覧を照合"""
+        state = self._state(asset_type)
+        dir_mtime = self._dir_mtime(asset_type)
+        if dir_mtime == state["dir_mtime"]:
+            return
+
+        entries = state["entries"]
+        current = {}
+        asset_path = self.assets_dir / asset_type
+        if asset_path.exists():
+            with os.scandir(asset_path) as it:
+                for item in it:
+                    if item.is_file() and not item.name.startswith("."):
+                        current[item.name] = item.stat()
+
+        for filename in list(entries):
+            if filename not in current:
+                del entries[filename]
+                self._changed(asset_type)
+        for filename, stat in current.items():
+            entry = entries.get(filename)
+            if entry is None or (entry["size"], entry["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+                self._update_entry(asset_type, filename, None, stat)
+
+        state["dir_mtime"] = dir_mtime
+        self._dirty = True
+
+    def _state(self, asset_type: str) -> Dict[str, Any]:
+        return self._types.setdefault(asset_type, {"dir_mtime": None, "entries": {}})
+
+    def _update_entry(
+        self, asset_type: str, filename: str, sha256: Optional[str], stat: Optional[os.stat_result] = None,
+    ) -> Optional[Dict[str, Any]]:
+        file_path = self.assets_dir / asset_type / filename
+        try:
+            if stat is None:
+                stat = file_path.stat()
+            size = _image_size(file_path) if asset_type == "images" else None
+        except OSError as e:
+            logger.error(f"アセット情報取得失敗: {filename}: {e}")
+            self._types[asset_type]["entries"].pop(filename, None)
+            self._changed(asset_type)
+            return None
+
+        entry = {
+            "filename": filename,
+            "path": str(file_path.relative_to(self.project_path)),
+            "size": stat.st_size,
+            "created_at": datetime.fromtimestamp(stat.st_ctime).isoformat(),
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": sha256,
+            "width": size[0] if size else None,
+            "height": size[1] if size else None,
+        }
+        self._types[asset_type]["entries"][filename] = entry
+        self._changed(asset_type)
+        return entry
+
+    def _fill_hashes(self, asset_type: str, assets: List[Dict[str, Any]]):
+        """
+        SHA-256 が未計算のアセットのハッシュを計算し、assets と索引に反映（ロックを保持せずに呼ぶ）
+
+        計算中にファイルが変わった場合は反映しない（次に返すときに計算し直す）
+        """
+        for asset in assets:
+            if asset["sha256"] is not None:
+                continue
+            file_path = self.assets_dir / asset_type / asset["filename"]
+            try:
+                before = file_path.stat()
+                digest = _file_sha256(file_path)
+                after = file_path.stat()
+            except OSError as e:
+                logger.error(f"アセットのハッシュ計算失敗: {asset['filename']}: {e}")
+                continue
+            if (before.st_size, before.st_mtime_ns) != (after.st_size, after.st_mtime_ns):
+                continue
+            if asset["size"] == after.st_size:
+                asset["sha256"] = digest
+
+            with self._lock:
+                entry = self._types.get(asset_type, {}).get("entries", {}).get(asset["filename"])
+                if entry is not None and entry["sha256"] is None and (
+                    (entry["size"], entry["mtime_ns"]) == (after.st_size, after.st_mtime_ns)
+                ):
+                    entry["sha256"] = digest
+                    self._dirty = True
+
+    def _sorted_names(self, asset_type: str, sort: str, descending: bool) -> List[str]:
+        key = (asset_type, sort, descending)
+        names = self._sorted.get(key)
+        if names is None:
+            entries = self._types[asset_type]["entries"]
+            names = sorted(entries, key=lambda n: (entries[n][sort], n), reverse=descending)
+            self._sorted[key] = names
+        return names
+
+    def _changed(self, asset_type: str):
+        self._dirty = True
+        for key in [k for k in self._sorted if k[0] == asset_type]:
+            del self._sorted[key]
+
+    def _maybe_flush(self):
+        if self._dirty and time.monotonic() - self._last_flush >= INDEX_FLUSH_INTERVAL:
+            self.flush()
+
+    def _dir_mtime(self, asset_type: str) -> Optional[int]:
+        try:
+            return (self.assets_dir / asset_type).stat().st_mtime_ns
+        except OSError:
+            return None
+
+    @staticmethod
+    def _public(entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in entry.items() if k != "mtime_ns"}
+
+
+# プロジェクトごとの索引（プロセス全体で共有）
+_indexes: Dict[str, AssetIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_asset_index(project_path: Path) -> AssetIndex:
+    """プロジェクトのアセット索引を取得"""
+    key = os.path.abspath(project_path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = AssetIndex(project_path)
+        return index
+
+
+def flush_all_asset_indexes():
+    """全プロジェクトの索引を書き出す"""
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        index.flush()
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _image_size(path: Path) -> Optional[Tuple[int, int]]:
+    """画像ファイルのヘッダーから縦横サイズを取得（PNG / GIF / JPEG / BMP / WebP）"""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(32)
+            if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+                return struct.unpack(">II", head[16:24])
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                return struct.unpack("<HH", head[6:10])
+            if head.startswith(b"BM") and len(head) >= 26:
+                width, height = struct.unpack("<ii", head[18:26])
+                return width, abs(height)
+            if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+                return _webp_size(head)
+            if head.startswith(b"\xff\xd8"):
+                f.seek(2)
+                return _jpeg_size(f)
+    except (OSError, struct.error):
+        pass
+    return None
+
+
+def _webp_size(head: bytes) -> Optional[Tuple[int, int]]:
+    chunk = head[12:16]
+    if chunk == b"VP8X":
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+        return width, height
+    if chunk == b"VP8L":
+        bits = int.from_bytes(head[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    return None
+
+
+def _jpeg_size(f) -> Optional[Tuple[int, int]]:
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+            continue
+        length = struct.unpack(">H", f.read(2))[0]
+        # SOF0〜SOF15（DHT / JPG / DAC を除く）に縦横サイズがある
+        if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">xHH", f.read(5))
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
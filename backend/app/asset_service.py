@@ -0,0 +1,204 @@
+"""アセットファイルを管理するサービス"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Optional
+import logging
+
+from .blob_store import blob_store
+
+logger = logging.getLogger(__name__)
+
+# アセットタイプ
+ASSET_TYPES = ("images", "sounds", "movies")
+
+# アセットタイプごとのアップロード上限（バイト）
+ASSET_SIZE_LIMITS = {
+    "images": int(os.environ.get("MOCOTCH_MAX_IMAGE_SIZE", str(20 * 1024 * 1024))),
+    "sounds": int(os.environ.get("MOCOTCH_MAX_SOUND_SIZE", str(50 * 1024 * 1024))),
+    "movies": int(os.environ.get("MOCOTCH_MAX_MOVIE_SIZE", str(1024 * 1024 * 1024))),
+}
+
+# アップロードをコピーするときの読み込み単位
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# アップロード中の一時ファイルの置き場所（プロジェクト直下。*.tmp は gitignore 対象）
+UPLOADS_DIR_NAME = ".uploads"
+
+
+class AssetError(ValueError):
+    """アセット操作のリクエストが不正"""
+
+
+class AssetTooLarge(AssetError):
+    """アップロードがサイズ上限を超えた"""
+
+
+class UploadOffsetMismatch(AssetError):
+    """再開アップロードのオフセットが受信済みサイズと一致しない"""
+
+    def __init__(self, offset: int):
+        super().__init__(f"オフセットが一致しません（受信済み: {offset} バイト）")
+        self.offset = offset
+
+
+class AssetUpload:
+    """
+    書き込み中のアップロード
+
+    一時ファイルに書き込みながら SHA-256 を計算し、commit() でアセット
+    ディレクトリへアトミックに移動する（ストアが有効ならストア経由で配置）。
+    上限を超えた時点で AssetTooLarge を送出する。
+    """
+
+    def __init__(self, tmp_path: Path, final_path: Path, limit: int, offset: int = 0):
+        self.tmp_path = tmp_path
+        self.final_path = final_path
+        self.limit = limit
+        self.size = offset
+        self._hash = hashlib.sha256()
+        if offset:
+            # 再開時は受信済み部分のハッシュを計算し直す
+            with open(tmp_path, "rb") as f:
+                for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+                    self._hash.update(chunk)
+        self._file: Optional[BinaryIO] = open(tmp_path, "ab" if offset else "wb")
+
+    @property
+    def sha256(self) -> str:
+        """受信済みデータの SHA-256"""
+        return self._hash.hexdigest()
+
+    def write(self, chunk: bytes):
+        """データを追記"""
+        if self.size + len(chunk) > self.limit:
+            raise AssetTooLarge(f"ファイルサイズが上限（{self.limit} バイト）を超えています")
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def close(self):
+        """一時ファイルを閉じる（再開アップロードでは一時ファイルを残す）"""
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def commit(self, expected_sha256: Optional[str] = None) -> int:
+        """アップロードを完了してアセットとして配置"""
+        self.close()
+        digest = self.sha256
+        if expected_sha256 and expected_sha256.lower() != digest:
+            self.abort()
+            raise AssetError("ファイルのハッシュ値が一致しません")
+
+        self.final_path.parent.mkdir(parents=True, exist_ok=True)
+        if blob_store:
+            blob_store.store(self.tmp_path, digest)
+            blob_store.link(digest, self.final_path)
+        else:
+            os.replace(self.tmp_path, self.final_path)
+        logger.info(f"アセット保存: {self.final_path.name} ({self.size} バイト)")
+        return self.size
+
+    def abort(self):
+        """アップロードを中止して一時ファイルを削除"""
+        self.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
+class AssetService:
+    """プロジェクトのアセットファイルを管理するサービス"""
+
+    def __init__(self, project_path: Path):
+        self.project_path = project_path
+        self.assets_dir = project_path / "assets"
+        self.uploads_dir = project_path / UPLOADS_DIR_NAME
+
+    @staticmethod
+    def validate(asset_type: str, filename: str):
+        """アセットタイプとファイル名を検証"""
+        if asset_type not in ASSET_TYPES:
+            raise AssetError("無効なアセットタイプ")
+        if not filename or filename != Path(filename).name or filename.startswith("."):
+            raise AssetError("無効なファイル名")
+
+    def asset_path(self, asset_type: str, filename: str) -> Path:
+        """アセットファイルのパス"""
+        self.validate(asset_type, filename)
+        return self.assets_dir / asset_type / filename
+
+    def open_upload(self, asset_type: str, filename: str) -> AssetUpload:
+        """一括アップロードを開始"""
+        final_path = self.asset_path(asset_type, filename)
+        self.uploads_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.uploads_dir, suffix=".tmp")
+        os.close(fd)
+        return AssetUpload(Path(tmp_name), final_path, ASSET_SIZE_LIMITS[asset_type])
+
+    def resume_upload(self, asset_type: str, filename: str, offset: int) -> AssetUpload:
+        """再開可能なアップロードを offset から続ける（offset 0 なら新規開始）"""
+        final_path = self.asset_path(asset_type, filename)
+        received = self.upload_offset(asset_type, filename)
+        if offset != received and offset != 0:
+            raise UploadOffsetMismatch(received)
+
+        self.uploads_dir.mkdir(parents=True, exist_ok=True)
+        return AssetUpload(
+            self._partial_path(asset_type, filename), final_path, ASSET_SIZE_LIMITS[asset_type], offset
+        )
+
+    def upload_offset(self, asset_type: str, filename: str) -> int:
+        """再開可能なアップロードの受信済みバイト数"""
+        self.validate(asset_type, filename)
+        try:
+            return self._partial_path(asset_type, filename).stat().st_size
+        except OSError:
+            return 0
+
+    def abort_upload(self, asset_type: str, filename: str):
+        """再開可能なアップロードを破棄"""
+        self.validate(asset_type, filename)
+        self._partial_path(asset_type, filename).unlink(missing_ok=True)
+
+    def link_existing(self, asset_type: str, filename: str, sha256: str) -> Optional[int]:
+        """
+        ストアに同じ内容があればアップロードせずに配置
+
+        Returns:
+            配置したファイルのサイズ（ストアにない場合は None）
+        """
+        final_path = self.asset_path(asset_type, filename)
+        sha256 = sha256.lower()
+        if not blob_store or not blob_store.has(sha256):
+            return None
+
+        size = blob_store.size(sha256)
+        if size is None or size > ASSET_SIZE_LIMITS[asset_type]:
+            return None
+        blob_store.link(sha256, final_path)
+        logger.info(f"ストアから配置: {filename} ({sha256[:12]})")
+        return size
+
+    def save_fileobj(self, asset_type: str, filename: str, fileobj: BinaryIO) -> AssetUpload:
+        """
+        ファイルオブジェクトの内容をチャンク単位でコピーして保存
+
+        Returns:
+            完了したアップロード（size / sha256 を参照できる）
+        """
+        upload = self.open_upload(asset_type, filename)
+        try:
+            while True:
+                chunk = fileobj.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                upload.write(chunk)
+            upload.commit()
+            return upload
+        except BaseException:
+            upload.abort()
+            raise
+
+    def _partial_path(self, asset_type: str, filename: str) -> Path:
+        return self.uploads_dir / f"{asset_type}-{filename}.part.tmp"
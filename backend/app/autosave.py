@@ -0,0 +1,141 @@
+"""自動保存をまとめて書き込むライトビハインドバッファ"""
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+import logging
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 最初の保存からこの秒数の間に届いた保存をまとめて1回で書き込む（0 なら即時書き込み）
+AUTOSAVE_WINDOW = float(os.environ.get("MOCOTCH_AUTOSAVE_WINDOW", "2.0"))
+
+
+class PendingSave:
+    """書き込み待ちの保存"""
+
+    def __init__(self, data: Any, base: Any, flush: Callable[[], bool]):
+        self.data = data
+        # バッファに入れた時点でディスクにあったドキュメント（差分書き込み用）
+        self.base = base
+        # 書き込み処理（呼び出し側で take() してから書き込む）
+        self.flush = flush
+        self.saved_at = time.time()
+        self.timer: Optional[threading.Timer] = None
+
+
+class AutosaveBuffer:
+    """
+    ファイルごとに最新のドキュメントだけを保持するライトビハインドバッファ
+
+    保存はメモリ上のドキュメントを置き換えるだけで受け付け、最初の保存から
+    window 秒後にまとめて書き込む。コミットやブランチ切替など、ディスクの
+    内容を前提とする処理の前には flush_project() で強制的に書き込む。
+    """
+
+    def __init__(self, window: float = AUTOSAVE_WINDOW):
+        self.window = window
+        self._pending: Dict[str, PendingSave] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def pending_count(self) -> int:
+        """書き込み待ちのファイル数"""
+        with self._lock:
+            return len(self._pending)
+
+    def has(self, path: Path) -> bool:
+        with self._lock:
+            return os.path.abspath(path) in self._pending
+
+    def get(self, path: Path) -> Optional[Any]:
+        """書き込み待ちのドキュメント（なければ None）"""
+        with self._lock:
+            entry = self._pending.get(os.path.abspath(path))
+            return entry.data if entry else None
+
+    def saved_at(self, path: Path) -> Optional[float]:
+        """書き込み待ちの最後の保存時刻"""
+        with self._lock:
+            entry = self._pending.get(os.path.abspath(path))
+            return entry.saved_at if entry else None
+
+    def put(self, path: Path, data: Any, flush: Callable[[], bool], base: Any = None, window: Optional[float] = None):
+        """
+        保存を受け付ける
+
+        既に書き込み待ちがあればドキュメントだけを置き換え、base と書き込み時刻は
+        最初の保存のものを引き継ぐ。window を指定すると、新たな書き込み待ちは
+        その秒数後に書き込む
+        """
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is not None:
+                entry.data = data
+                entry.saved_at = time.time()
+                return
+
+            entry = self._pending[key] = PendingSave(data=data, base=base, flush=flush)
+            entry.timer = threading.Timer(self.window if window is None else window, self._flush_key, (key,))
+            entry.timer.daemon = True
+            entry.timer.start()
+
+    def take(self, path: Path) -> Optional[PendingSave]:
+        """書き込み待ちを取り出す（書き込む側が呼ぶ）"""
+        with self._lock:
+            entry = self._pending.pop(os.path.abspath(path), None)
+        if entry and entry.timer:
+            entry.timer.cancel()
+        return entry
+
+    def restore(self, path: Path, entry: PendingSave):
+        """書き込みに失敗した保存を戻して再試行を予約（新しい保存があればそちらを優先）"""
+        key = os.path.abspath(path)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending[key] = entry
+            entry.timer = threading.Timer(self.window, self._flush_key, (key,))
+            entry.timer.daemon = True
+            entry.timer.start()
+
+    def flush(self, path: Path) -> bool:
+        """指定ファイルの書き込み待ちを書き込む"""
+        return self._flush_key(os.path.abspath(path))
+
+    def flush_project(self, project_path: Path) -> bool:
+        """プロジェクト配下の書き込み待ちをすべて書き込む"""
+        prefix = os.path.abspath(project_path) + os.sep
+        with self._lock:
+            keys = [key for key in self._pending if key.startswith(prefix)]
+        return all([self._flush_key(key) for key in keys])
+
+    def flush_all(self) -> bool:
+        """すべての書き込み待ちを書き込む（終了時）"""
+        with self._lock:
+            keys = list(self._pending)
+        return all([self._flush_key(key) for key in keys])
+
+    def _flush_key(self, key: str) -> bool:
+        with self._lock:
+            entry = self._pending.get(key)
+        if entry is None:
+            return True
+        try:
+            return entry.flush()
+        except Exception as e:
+            logger.error(f"自動保存の書き込み失敗: {key}: {e}")
+            return False
+
+
+# プロセス全体で共有するバッファ
+autosave_buffer = AutosaveBuffer()
+
+metrics.gauge("mocotch_autosave_pending", "自動保存の書き込み待ちのファイル数").set_function(autosave_buffer.pending_count)
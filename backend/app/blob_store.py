@@ -0,0 +1,106 @@
+"""プロジェクト間でアセットを共有するコンテンツアドレス型ストア"""
+import os
+import re
+import shutil
+import stat
+import uuid
+from pathlib import Path
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ストアの場所（未設定ならストアを使わず各プロジェクトに実体を置く）
+BLOB_STORE_DIR = os.environ.get("MOCOTCH_BLOB_STORE")
+
+_DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+# Linux の FICLONE ioctl（reflink 対応ファイルシステムでのコピーオンライト複製）
+_FICLONE = 0x40049409
+
+
+class BlobStore:
+    """
+    SHA-256 をファイル名とするアセットのストア
+
+    同じ内容のファイルは1つだけ保存し、各プロジェクトの assets/ には
+    ハードリンク（できなければ reflink、それも無理ならコピー）で配置する。
+    ストア内のファイルはリンク先から書き換えられないよう読み取り専用にする。
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.objects_dir = root / "objects"
+
+    @staticmethod
+    def is_digest(digest: str) -> bool:
+        return bool(_DIGEST_PATTERN.match(digest))
+
+    def blob_path(self, digest: str) -> Path:
+        if not self.is_digest(digest):
+            raise ValueError(f"無効なハッシュ値: {digest}")
+        return self.objects_dir / digest[:2] / digest[2:]
+
+    def has(self, digest: str) -> bool:
+        return self.is_digest(digest) and self.blob_path(digest).exists()
+
+    def size(self, digest: str) -> Optional[int]:
+        try:
+            return self.blob_path(digest).stat().st_size
+        except (OSError, ValueError):
+            return None
+
+    def store(self, src: Path, digest: str):
+        """ファイルをストアに移動（既にあれば src を削除するだけ）"""
+        blob_path = self.blob_path(digest)
+        if blob_path.exists():
+            src.unlink(missing_ok=True)
+            logger.info(f"ストアに既存のため書き込みを省略: {digest[:12]}")
+            return
+
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = blob_path.with_name(f".{blob_path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            shutil.move(str(src), str(tmp_path))
+            os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            if blob_path.exists():
+                # 同じ内容を並行して追加した場合（内容は同一なので置き換えない）
+                return
+            os.replace(tmp_path, blob_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        logger.info(f"ストアに追加: {digest[:12]}")
+
+    def link(self, digest: str, dest: Path):
+        """ストアのファイルを dest に配置（既存のファイルは置き換える）"""
+        blob_path = self.blob_path(digest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = dest.with_name(f".{dest.name}.{uuid.uuid4().hex}.link.tmp")
+        try:
+            try:
+                os.link(blob_path, tmp_path)
+            except OSError:
+                # 別ファイルシステムなどでハードリンクできない場合
+                if not self._reflink(blob_path, tmp_path):
+                    shutil.copyfile(blob_path, tmp_path)
+            os.replace(tmp_path, dest)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    @staticmethod
+    def _reflink(src: Path, dest: Path) -> bool:
+        try:
+            import fcntl
+        except ImportError:
+            return False
+
+        try:
+            with open(src, "rb") as s, open(dest, "wb") as d:
+                fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+            return True
+        except OSError:
+            dest.unlink(missing_ok=True)
+            return False
+
+
+# 設定されている場合のみ使うストア
+blob_store: Optional[BlobStore] = BlobStore(Path(BLOB_STORE_DIR)) if BLOB_STORE_DIR else None
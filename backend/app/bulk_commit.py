@@ -0,0 +1,73 @@
+"""複数プロジェクトのコミットとプッシュをまとめて実行"""
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List
+import logging
+
+from .git_service import GitService
+from .job_queue import Job, job_queue
+
+logger = logging.getLogger(__name__)
+
+# 同時に実行するプッシュの数
+BULK_PUSH_WORKERS = int(os.environ.get("MOCOTCH_BULK_PUSH_WORKERS", "8"))
+# 1プロジェクトのプッシュの制限時間（秒）。超えたら git を終了させて失敗扱いにする
+BULK_PUSH_TIMEOUT = float(os.environ.get("MOCOTCH_BULK_PUSH_TIMEOUT", "300"))
+
+
+def bulk_commit(projects_dir: Path, names: List[str], message: str, job: Job) -> Dict[str, Any]:
+    """
+    プロジェクトごとにローカルでコミットしてから、プッシュを並列に実行
+
+    コミットは順番に（ネットワークを使わないので短時間で）済ませ、プッシュは
+    スレッドプールで並列に実行する。プッシュには制限時間を設け、遅いリモートが
+    あっても他のプロジェクトのプッシュは先に終わる。
+
+    Returns:
+        プロジェクトごとの結果と成功・失敗の件数
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    to_push = []
+
+    for index, name in enumerate(names):
+        result = results[name] = {"name": name, "committed": False, "pushed": False, "error": None}
+        project_path = projects_dir / name
+        if not project_path.exists():
+            result["error"] = "プロジェクトが見つかりません"
+            continue
+
+        try:
+            with job_queue.project_lock(name):
+                if GitService(project_path).commit_all(message):
+                    result["committed"] = True
+                    to_push.append(name)
+                else:
+                    result["error"] = "コミット失敗"
+        except Exception as e:
+            result["error"] = f"コミット失敗: {e}"
+        job.update(progress={"stage": "commit", "current": index + 1, "total": len(names), "message": name})
+
+    def push(name: str) -> bool:
+        with job_queue.project_lock(name):
+            return GitService(projects_dir / name).push(timeout=BULK_PUSH_TIMEOUT)
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=BULK_PUSH_WORKERS, thread_name_prefix="mocotch-push") as executor:
+        futures = {executor.submit(push, name): name for name in to_push}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                if future.result():
+                    results[name]["pushed"] = True
+                else:
+                    results[name]["error"] = "プッシュ失敗"
+            except Exception as e:
+                results[name]["error"] = f"プッシュ失敗: {e}"
+            done += 1
+            job.update(progress={"stage": "push", "current": done, "total": len(to_push), "message": name})
+
+    report = [results[name] for name in names]
+    succeeded = sum(1 for r in report if r["error"] is None)
+    logger.info(f"一括コミット完了: 成功 {succeeded}件 / 失敗 {len(report) - succeeded}件")
+    return {"results": report, "succeeded": succeeded, "failed": len(report) - succeeded}
@@ -0,0 +1,317 @@
+"""公開用のゲームバンドル（ゲームデータとアセットをまとめたパックファイルとマニフェスト）の作成"""
+import argparse
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+from . import json_codec
+from .asset_delivery import COMPRESS_MIN_SAVING, PRECOMPRESSED_SUFFIXES
+from .asset_index import get_asset_index
+from .asset_service import ASSET_TYPES
+from .rpg_service import RPGService
+
+logger = logging.getLogger(__name__)
+
+# 圧縮を並列に実行するスレッド数（zlib は圧縮中に GIL を解放する）
+BUNDLE_WORKERS = int(os.environ.get("MOCOTCH_BUNDLE_WORKERS", str(os.cpu_count() or 1)))
+# gzip の圧縮レベル
+BUNDLE_GZIP_LEVEL = int(os.environ.get("MOCOTCH_BUNDLE_GZIP_LEVEL", "6"))
+# 圧縮してもこの割合以上小さくならなければ圧縮せずに格納する（アセット配信の圧縮版と同じ基準）
+BUNDLE_MIN_SAVING = COMPRESS_MIN_SAVING
+
+# バンドルの置き場所（プロジェクトからの相対パス。ワークツリーに含めない）
+BUNDLE_DIR = Path(".git") / "mocotch" / "bundle"
+MANIFEST_NAME = "manifest.json"
+# マニフェストの形式を変えたら上げる（古いバンドルの圧縮結果を使い回さないため）
+MANIFEST_VERSION = 1
+GAME_DATA_PATH = "game.json"
+
+ENCODING_GZIP = "gzip"
+ENCODING_IDENTITY = "identity"
+
+PACK_NAME_PATTERN = re.compile(r"^[0-9a-f]{16}\.pack$")
+
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class BundleError(Exception):
+    """バンドルを作成できない"""
+
+
+class _Source:
+    """バンドルに含める1ファイル（ゲームデータはメモリ上、アセットはファイルから読む）"""
+
+    def __init__(self, path: str, sha256: str, size: int, data: Optional[bytes] = None, file: Optional[Path] = None):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.data = data
+        self.file = file
+
+    def read(self) -> bytes:
+        if self.data is not None:
+            return self.data
+        with open(self.file, "rb") as f:
+            return f.read()
+
+    @property
+    def precompressed(self) -> bool:
+        return Path(self.path).suffix.lower() in PRECOMPRESSED_SUFFIXES
+
+
+class BundleBuilder:
+    """
+    プロジェクトのバンドル
+
+    バンドルは1つのパックファイル（各ファイルを gzip かそのままで連結したもの）と、
+    各ファイルの SHA-256・エンコーディング・パック内の位置を記録したマニフェストからなる。
+    プレイヤーはマニフェストとパックの2回のリクエスト（または Range リクエスト）で
+    ゲームを読み込める。
+
+    作り直すときは前回のマニフェストと SHA-256 が同じファイルの圧縮結果を前回のパックから
+    そのままコピーし、変更されたファイルだけをスレッドプールで圧縮し直す。
+    パックの名前は内容から決まるので、何も変わっていなければ書き直さない。
+    """
+
+    def __init__(self, project_path: Path):
+        self.project_path = project_path
+        self.bundle_dir = project_path / BUNDLE_DIR
+        self.manifest_path = self.bundle_dir / MANIFEST_NAME
+
+    def manifest(self) -> Optional[Dict[str, Any]]:
+        """前回作成したマニフェスト（なければ None）"""
+        try:
+            manifest = json_codec.read_file(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"バンドルのマニフェストを読み込めません: {e}")
+            return None
+        if manifest.get("version") != MANIFEST_VERSION or not (self.bundle_dir / manifest.get("pack", "")).is_file():
+            return None
+        return manifest
+
+    def pack_path(self, pack_name: str) -> Optional[Path]:
+        """パックファイルのパス（名前が不正か存在しなければ None）"""
+        if not PACK_NAME_PATTERN.match(pack_name):
+            return None
+        path = self.bundle_dir / pack_name
+        return path if path.is_file() else None
+
+    def build(
+        self,
+        workers: int = BUNDLE_WORKERS,
+        progress: Optional[Callable[[int, int, str], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        バンドルを作成（前回から変わったファイルだけ圧縮し直す）
+
+        Args:
+            progress: 圧縮し終えたファイル数・圧縮するファイル数・ファイルのパスを受け取る
+
+        Returns:
+            パックの名前とサイズ、圧縮し直した・使い回したファイル数などの集計
+        """
+        started = time.perf_counter()
+        sources = self._sources()
+        previous = self.manifest()
+        old_pack = self.bundle_dir / previous["pack"] if previous else None
+        reusable = {entry["sha256"]: entry for entry in previous["entries"]} if previous else {}
+
+        pack_name = self._pack_name(sources)
+        if previous and previous["pack"] == pack_name:
+            return self._summary(previous, encoded=0, reused=len(sources), unchanged=True, started=started)
+
+        # 変更されたファイルのうち、圧縮を試すものをスレッドプールで圧縮
+        to_encode = [s for s in sources if s.sha256 not in reusable and not s.precompressed]
+        encoded: Dict[str, bytes] = {}
+        if to_encode:
+            with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="mocotch-bundle") as executor:
+                futures = {executor.submit(_encode, source): source for source in to_encode}
+                for done, future in enumerate(as_completed(futures), 1):
+                    source = futures[future]
+                    encoded[source.path] = future.result()
+                    if progress:
+                        progress(done, len(to_encode), source.path)
+
+        self.bundle_dir.mkdir(parents=True, exist_ok=True)
+        tmp_pack = self.bundle_dir / f".{uuid.uuid4().hex}.pack.tmp"
+        entries: List[Dict[str, Any]] = []
+        reused = 0
+        try:
+            with open(tmp_pack, "wb") as out:
+                old = open(old_pack, "rb") if old_pack else None
+                try:
+                    for source in sources:
+                        offset = out.tell()
+                        previous_entry = reusable.get(source.sha256)
+                        if previous_entry is not None:
+                            old.seek(previous_entry["offset"])
+                            _copy(old, out, previous_entry["length"])
+                            encoding = previous_entry["encoding"]
+                            reused += 1
+                        elif source.path in encoded:
+                            data = encoded[source.path]
+                            encoding = ENCODING_GZIP if data is not None else ENCODING_IDENTITY
+                            out.write(data if data is not None else source.read())
+                        else:
+                            encoding = ENCODING_IDENTITY
+                            with open(source.file, "rb") as f:
+                                shutil.copyfileobj(f, out, _COPY_CHUNK_SIZE)
+                        entries.append({
+                            "path": source.path,
+                            "sha256": source.sha256,
+                            "size": source.size,
+                            "encoding": encoding,
+                            "offset": offset,
+                            "length": out.tell() - offset,
+                        })
+                finally:
+                    if old is not None:
+                        old.close()
+
+            manifest = {
+                "version": MANIFEST_VERSION,
+                "name": self.project_path.name,
+                "pack": pack_name,
+                "pack_size": entries[-1]["offset"] + entries[-1]["length"] if entries else 0,
+                "created_at": datetime.now().isoformat(),
+                "entries": entries,
+            }
+            os.replace(tmp_pack, self.bundle_dir / pack_name)
+            tmp_manifest = self.manifest_path.with_name(f".{MANIFEST_NAME}.{uuid.uuid4().hex}.tmp")
+            tmp_manifest.write_bytes(json_codec.dumps(manifest))
+            os.replace(tmp_manifest, self.manifest_path)
+        finally:
+            tmp_pack.unlink(missing_ok=True)
+
+        self._remove_stale(pack_name)
+        summary = self._summary(manifest, encoded=len(sources) - reused, reused=reused, unchanged=False, started=started)
+        logger.info(
+            f"バンドル作成: {self.project_path.name} {pack_name} "
+            f"(圧縮 {summary['encoded']}件 / 再利用 {reused}件, {summary['elapsed_ms']}ms)"
+        )
+        return summary
+
+    def _sources(self) -> List[_Source]:
+        """ゲームデータと全アセット（アセットの SHA-256 はアセット索引から取得）"""
+        data = RPGService(self.project_path).load_project_data()
+        if data is None:
+            raise BundleError("ゲームデータを読み込めません")
+        game = json_codec.dumps(data)
+        sources = [_Source(GAME_DATA_PATH, hashlib.sha256(game).hexdigest(), len(game), data=game)]
+
+        index = get_asset_index(self.project_path)
+        for asset_type in ASSET_TYPES:
+            _, page = index.list_assets(asset_type)
+            for listed in page:
+                # 上書きされたファイルはここでハッシュを計算し直す
+                entry = index.get(asset_type, listed["filename"])
+                if entry is None or entry["sha256"] is None:
+                    continue
+                sources.append(_Source(
+                    entry["path"].replace(os.sep, "/"), entry["sha256"], entry["size"],
+                    file=self.project_path / entry["path"],
+                ))
+        index.flush()
+        return sources
+
+    @staticmethod
+    def _pack_name(sources: List[_Source]) -> str:
+        """パックの名前（含めるファイルのパスと SHA-256、圧縮の設定から決まる）"""
+        digest = hashlib.sha256(f"{MANIFEST_VERSION}:{BUNDLE_GZIP_LEVEL}:{BUNDLE_MIN_SAVING}".encode())
+        for source in sources:
+            digest.update(f"\n{source.path}\0{source.sha256}".encode())
+        return f"{digest.hexdigest()[:16]}.pack"
+
+    def _remove_stale(self, current: str):
+        """現在のもの以外のパックを削除"""
+        for entry in self.bundle_dir.iterdir():
+            if entry.name != current and PACK_NAME_PATTERN.match(entry.name):
+                entry.unlink(missing_ok=True)
+
+    @staticmethod
+    def _summary(manifest: Dict[str, Any], encoded: int, reused: int, unchanged: bool, started: float) -> Dict[str, Any]:
+        entries = manifest["entries"]
+        return {
+            "pack": manifest["pack"],
+            "pack_size": manifest["pack_size"],
+            "entries": len(entries),
+            "size": sum(entry["size"] for entry in entries),
+            "encoded": encoded,
+            "reused": reused,
+            "unchanged": unchanged,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+
+def _encode(source: _Source) -> Optional[bytes]:
+    """gzip で圧縮（十分に小さくならなければ None）"""
+    data = source.read()
+    compressed = gzip.compress(data, compresslevel=BUNDLE_GZIP_LEVEL, mtime=0)
+    if len(compressed) > len(data) * (1 - BUNDLE_MIN_SAVING):
+        return None
+    return compressed
+
+
+def _copy(src, dst, length: int):
+    while length > 0:
+        chunk = src.read(min(length, _COPY_CHUNK_SIZE))
+        if not chunk:
+            raise BundleError("前回のパックが壊れています")
+        dst.write(chunk)
+        length -= len(chunk)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """コマンドラインからバンドルを作成"""
+    parser = argparse.ArgumentParser(prog="mocotch-bundle", description="公開用のゲームバンドルを作成")
+    parser.add_argument("projects", nargs="+", help="プロジェクト名")
+    parser.add_argument("--projects-dir", type=Path, default=Path("./projects"), help="プロジェクトのルートディレクトリ")
+    parser.add_argument("--output", type=Path, help="マニフェストとパックをコピーするディレクトリ（プロジェクトごとのサブディレクトリ）")
+    parser.add_argument("--workers", type=int, default=BUNDLE_WORKERS, help="圧縮を並列に実行するスレッド数")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for name in dict.fromkeys(args.projects):
+        project_path = args.projects_dir / name
+        if not project_path.exists():
+            print(f"{name}: プロジェクトが見つかりません", file=sys.stderr)
+            failed = True
+            continue
+        try:
+            builder = BundleBuilder(project_path)
+            summary = builder.build(workers=args.workers)
+        except Exception as e:
+            print(f"{name}: バンドル作成失敗: {e}", file=sys.stderr)
+            failed = True
+            continue
+
+        state = "変更なし" if summary["unchanged"] else f"圧縮 {summary['encoded']}件 / 再利用 {summary['reused']}件"
+        print(f"{name}: {summary['pack']} {summary['entries']}ファイル "
+              f"{summary['size']} → {summary['pack_size']} バイト（{state}、{summary['elapsed_ms']}ms）")
+
+        if args.output:
+            output_dir = args.output / name
+            output_dir.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(builder.bundle_dir / summary["pack"], output_dir / summary["pack"])
+            shutil.copy2(builder.manifest_path, output_dir / MANIFEST_NAME)
+            for entry in output_dir.iterdir():
+                if entry.name != summary["pack"] and PACK_NAME_PATTERN.match(entry.name):
+                    entry.unlink()
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+"""リアルタイム共同編集（順序付きの操作ログと、接続中のエディターへの配信）"""
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+import logging
+
+from pydantic import TypeAdapter, ValidationError
+
+from . import json_codec
+from .models import PatchOperation
+from .rpg_service import RPGService
+
+logger = logging.getLogger(__name__)
+
+# プロジェクトごとに保持する操作ログの件数（これより古い位置からは追いつけずスナップショットを送る）
+COLLAB_LOG_SIZE = int(os.environ.get("MOCOTCH_COLLAB_LOG_SIZE", "10000"))
+# 操作ログのメモリ上限（MB。超えたら古い操作から捨てる）
+COLLAB_LOG_MB = float(os.environ.get("MOCOTCH_COLLAB_LOG_MB", "16"))
+# 接続がなくなってからこの秒数が経過したセッションは破棄する（次の接続では新しい epoch になる）
+COLLAB_SESSION_IDLE_TIMEOUT = float(os.environ.get("MOCOTCH_COLLAB_SESSION_IDLE_TIMEOUT", "600"))
+# 共同編集の操作を game.json に書き込む間隔（秒）
+COLLAB_SNAPSHOT_INTERVAL = float(os.environ.get("MOCOTCH_COLLAB_SNAPSHOT_INTERVAL", "5.0"))
+# 送信待ちのメッセージがこの件数を超えたクライアントは切断する（再接続して追いつく）
+COLLAB_QUEUE_LIMIT = 1000
+
+# 1メッセージに含められる操作数
+COLLAB_MAX_OPERATIONS = 1000
+
+_OPERATIONS_ADAPTER = TypeAdapter(List[PatchOperation])
+
+
+class CollabError(Exception):
+    """共同編集のメッセージや操作が不正"""
+
+
+def parse_operations(raw: Any) -> List[Dict[str, Any]]:
+    """クライアントから受け取った操作を PATCH /data と同じ形式に検証"""
+    if not isinstance(raw, list) or not raw:
+        raise CollabError("operations は空でない配列で指定してください")
+    if len(raw) > COLLAB_MAX_OPERATIONS:
+        raise CollabError(f"操作が多すぎます（最大 {COLLAB_MAX_OPERATIONS} 件）")
+    try:
+        operations = _OPERATIONS_ADAPTER.validate_python(raw)
+    except ValidationError as e:
+        raise CollabError(f"操作が不正です: {e.errors()[0]['msg']}") from None
+    return [op.model_dump(by_alias=True, exclude_unset=True) for op in operations]
+
+
+class CollabSubscriber:
+    """
+    1つの接続への送信キュー
+
+    配信はどのスレッドからでも呼べ、イベントループ上のキューに順番どおりに積む
+    （キューへの追加は call_soon_threadsafe で呼び出し順に実行される）。
+    hold() から release() までの間に配信されたメッセージは溜めておき、release() で
+    渡したメッセージ（スナップショット）の後に積む
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, client_id: str):
+        self.loop = loop
+        self.client_id = client_id
+        self.queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        self.overflowed = False
+        self._held: Optional[List[str]] = None
+        self._send_lock = threading.Lock()
+
+    def send(self, message: str):
+        with self._send_lock:
+            if self._held is not None:
+                self._held.append(message)
+            else:
+                self._post(message)
+
+    def hold(self):
+        """以降の配信を release() まで溜める"""
+        with self._send_lock:
+            self._held = []
+
+    def release(self, first: str):
+        """first を積み、溜めていたメッセージを続けて積む"""
+        with self._send_lock:
+            held, self._held = self._held or [], None
+            for message in (first, *held):
+                self._post(message)
+
+    def _post(self, message: str):
+        try:
+            self.loop.call_soon_threadsafe(self._push, message)
+        except RuntimeError:
+            # イベントループが終了済み（切断後）
+            pass
+
+    def _push(self, message: str):
+        if self.overflowed:
+            return
+        if self.queue.qsize() >= COLLAB_QUEUE_LIMIT:
+            # 送信が追いつかない接続は切断する（None で送信側に伝える）
+            self.overflowed = True
+            self.queue.put_nowait(None)
+            return
+        self.queue.put_nowait(message)
+
+
+class CollabSession:
+    """
+    プロジェクトごとの共同編集セッション
+
+    操作は到着順に1件ずつゲームデータに適用し、連番を振ってログに残してから
+    接続中の全クライアント（送信元を含む）に配信する。適用・採番・配信を同じ
+    ロックの中で行うので、どのクライアントにも連番どおりの順序で届く。
+
+    ログはメモリ上にだけ持ち、epoch（セッションごとの ID）で区別する。再接続した
+    クライアントは epoch と受信済みの連番を渡すと、ログに残っている範囲の操作だけを
+    受け取る。ログから外れた位置やサーバー再起動後はスナップショット（全データ）を送る。
+    ログは件数（COLLAB_LOG_SIZE）とメモリ（COLLAB_LOG_MB）の上限を超えた分と、
+    reload より前の部分（追いつくのに使えない）を捨てる。
+    """
+
+    def __init__(self, project_path: Path):
+        self.project_path = project_path
+        self.epoch = uuid.uuid4().hex
+        self.seq = 0
+        # (連番, 種類, 送信する JSON)
+        self._log: Deque[Tuple[int, str, str]] = deque()
+        self._log_bytes = 0
+        self._subscribers: Set[CollabSubscriber] = set()
+        self._lock = threading.Lock()
+        self.last_active = time.monotonic()
+
+    def connect(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        client_id: str,
+        since: Optional[int] = None,
+        epoch: Optional[str] = None,
+    ) -> CollabSubscriber:
+        """
+        クライアントを登録し、最初のメッセージ（hello と、追いつくための操作かスナップショット）を積む
+        """
+        subscriber = CollabSubscriber(loop, client_id)
+        with self._lock:
+            subscriber.send(_encode({"type": "hello", "epoch": self.epoch, "seq": self.seq, "client": client_id}))
+            missed = self._since(since) if epoch == self.epoch else None
+            if missed is None:
+                data = RPGService(self.project_path).load_project_data()
+                if data is None:
+                    raise CollabError("データ読み込み失敗")
+                seq = self.seq
+                # 全データのシリアライズはロックの外で行い、その間の操作はスナップショットの後に送る
+                subscriber.hold()
+            else:
+                for message in missed:
+                    subscriber.send(message)
+            self._subscribers.add(subscriber)
+            self.last_active = time.monotonic()
+
+        if missed is None:
+            # ドキュメントは変更されない（操作の適用では新しいドキュメントを作る）のでロックなしで読める
+            try:
+                subscriber.release(_encode({"type": "snapshot", "seq": seq, "data": data}))
+            except Exception:
+                self.disconnect(subscriber)
+                raise
+        logger.info(f"共同編集に接続: {self.project_path.name} {client_id}（{len(self._subscribers)}人）")
+        return subscriber
+
+    def disconnect(self, subscriber: CollabSubscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            self.last_active = time.monotonic()
+        logger.info(f"共同編集から切断: {self.project_path.name} {subscriber.client_id}")
+
+    def apply(
+        self,
+        operations: List[Dict[str, Any]],
+        client: Optional[str] = None,
+        op_id: Any = None,
+        window: Optional[float] = None,
+    ) -> int:
+        """
+        操作をゲームデータに適用してログに追加し、全クライアントに配信
+
+        操作が不正なら PatchError をそのまま送出する（ログには残らない）
+
+        Returns:
+            振った連番
+        """
+        with self._lock:
+            if not RPGService(self.project_path).patch_project_data(operations, window):
+                raise CollabError("データ保存失敗")
+            self.seq += 1
+            self._append("op", {"type": "op", "seq": self.seq, "client": client, "id": op_id, "operations": operations})
+            self.last_active = time.monotonic()
+            return self.seq
+
+    def reload(self):
+        """
+        ゲームデータが丸ごと置き換わった（全体保存・ブランチ切替など）ことを記録
+
+        操作では表せない変更なので、受け取ったクライアントと、これより前の位置から
+        追いつこうとするクライアントには全データを取得し直させる
+        """
+        with self._lock:
+            self.seq += 1
+            # これより前の操作からは追いつけないので捨てる
+            self._log.clear()
+            self._log_bytes = 0
+            self._append("reload", {"type": "reload", "seq": self.seq})
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "epoch": self.epoch,
+                "seq": self.seq,
+                "log_start": self._log[0][0] if self._log else self.seq + 1,
+                "clients": sorted(subscriber.client_id for subscriber in self._subscribers),
+            }
+
+    def is_idle(self, deadline: float) -> bool:
+        """接続がなく、deadline より前から使われていないか"""
+        with self._lock:
+            return not self._subscribers and self.last_active <= deadline
+
+    def _append(self, kind: str, entry: Dict[str, Any]):
+        """ログに追加して配信（呼び出し側で _lock を保持）"""
+        message = _encode(entry)
+        self._log.append((entry["seq"], kind, message))
+        self._log_bytes += len(message)
+        max_bytes = COLLAB_LOG_MB * 1024 * 1024
+        while len(self._log) > 1 and (len(self._log) > COLLAB_LOG_SIZE or self._log_bytes > max_bytes):
+            self._log_bytes -= len(self._log.popleft()[2])
+        for subscriber in self._subscribers:
+            subscriber.send(message)
+
+    def _since(self, since: Optional[int]) -> Optional[List[str]]:
+        """since より後の操作（ログから追いつけなければ None。呼び出し側で _lock を保持）"""
+        if since is None or since < 0 or since > self.seq:
+            return None
+        first = self._log[0][0] if self._log else self.seq + 1
+        if since < first - 1:
+            return None
+        missed = [(kind, message) for seq, kind, message in self._log if seq > since]
+        if any(kind == "reload" for kind, _ in missed):
+            return None
+        return [message for _, message in missed]
+
+
+def _encode(message: Dict[str, Any]) -> str:
+    return json_codec.dumps(message).decode("utf-8")
+
+
+class CollabHub:
+    """プロジェクトごとの共同編集セッション（プロセス全体で共有）"""
+
+    def __init__(self):
+        self._sessions: Dict[str, CollabSession] = {}
+        self._lock = threading.Lock()
+
+    def session(self, project_path: Path) -> CollabSession:
+        """
+        セッションを取得（なければ作成）
+
+        取得したセッションは使われたものとして扱うので、取得してから
+        COLLAB_SESSION_IDLE_TIMEOUT 秒以内に接続・適用すれば破棄されない
+        """
+        key = os.path.abspath(project_path)
+        with self._lock:
+            self._evict_idle()
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = CollabSession(project_path)
+            session.last_active = time.monotonic()
+            return session
+
+    def get(self, project_path: Path) -> Optional[CollabSession]:
+        with self._lock:
+            return self._sessions.get(os.path.abspath(project_path))
+
+    def reload(self, project_path: Path):
+        """ゲームデータが丸ごと置き換わったことをセッション（あれば）に記録"""
+        session = self.get(project_path)
+        if session is not None:
+            session.reload()
+
+    def _evict_idle(self):
+        """接続がなく、アイドル時間を超えたセッションを破棄（呼び出し側で _lock を保持）"""
+        deadline = time.monotonic() - COLLAB_SESSION_IDLE_TIMEOUT
+        for key in [key for key, session in self._sessions.items() if session.is_idle(deadline)]:
+            del self._sessions[key]
+            logger.info(f"共同編集セッションを破棄: {key}")
+
+
+# プロセス全体で共有するセッション
+collab_hub = CollabHub()
@@ -0,0 +1,319 @@
+"""ゲームデータへの差分操作（JSON Patch と専用操作）"""
+import copy
+from typing import Any, Dict, List, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+from .models import RPGProjectData
+from .tile_codec import TileEncodingError, decode_map
+
+# トップレベルの各セクションを検証するためのアダプター
+_SECTION_ADAPTERS = {
+    name: TypeAdapter(field.annotation)
+    for name, field in RPGProjectData.model_fields.items()
+}
+_TILE_ROW_ADAPTER = TypeAdapter(List[int])
+_TILES_ADAPTER = TypeAdapter(List[List[int]])
+
+
+class PatchError(ValueError):
+    """差分操作が不正"""
+
+
+class PatchTestFailed(PatchError):
+    """test 操作の値が一致しない"""
+
+
+def apply_operations(doc: Dict[str, Any], operations: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], bool]:
+    """
+    ドキュメントに差分操作を適用
+
+    元のドキュメントは変更せず、変更のあった経路だけをコピーした新しい
+    ドキュメントを返す（変更のない部分は元のドキュメントと共有する）。
+    途中の操作が失敗した場合は PatchError を送出し、元のドキュメントは
+    そのまま残る。
+
+    Returns:
+        (new_doc, changed)
+    """
+    patcher = _Patcher(doc)
+    for index, operation in enumerate(operations):
+        try:
+            patcher.apply(operation)
+        except PatchError as e:
+            raise type(e)(f"操作[{index}] {operation.get('op')}: {e}") from None
+    patcher.validate()
+    return patcher.doc, patcher.changed
+
+
+def parse_pointer(pointer: str) -> List[str]:
+    """JSON Pointer (RFC 6901) をトークン列に分解"""
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise PatchError(f"無効なパス: {pointer}")
+    return [t.replace("~1", "/").replace("~0", "~") for t in pointer[1:].split("/")]
+
+
+class _Patcher:
+    """コピーオンライトで差分操作を適用する"""
+
+    def __init__(self, doc: Dict[str, Any]):
+        self.doc = dict(doc)
+        self.changed = False
+        # この適用中に作ったコピー（id -> オブジェクト）。これらは直接書き換えてよい
+        self._owned: Dict[int, Any] = {id(self.doc): self.doc}
+        self._touched: List[List[str]] = []
+
+    def apply(self, operation: Dict[str, Any]):
+        op = operation.get("op")
+        handler = getattr(self, f"_op_{op}", None) if isinstance(op, str) else None
+        if handler is None:
+            raise PatchError(f"未対応の操作: {op}")
+        handler(operation)
+
+    # --- JSON Patch (RFC 6902) ---
+
+    def _op_add(self, operation):
+        tokens = self._path(operation, "path")
+        self._add(tokens, self._value(operation))
+
+    def _op_remove(self, operation):
+        tokens = self._path(operation, "path")
+        self._remove(tokens)
+
+    def _op_replace(self, operation):
+        tokens = self._path(operation, "path")
+        value = self._value(operation)
+        if not tokens:
+            self._replace_root(value)
+            return
+        container, key = self._writable_parent(tokens)
+        key = self._existing_key(container, key)
+        container[key] = value
+        self._touch(tokens)
+
+    def _op_move(self, operation):
+        source = self._path(operation, "from")
+        tokens = self._path(operation, "path")
+        if tokens[:len(source)] == source and tokens != source:
+            raise PatchError("自身の子孫には移動できません")
+        value = self._get(source)
+        self._remove(source)
+        self._add(tokens, value)
+
+    def _op_copy(self, operation):
+        source = self._path(operation, "from")
+        tokens = self._path(operation, "path")
+        self._add(tokens, copy.deepcopy(self._get(source)))
+
+    def _op_test(self, operation):
+        tokens = self._path(operation, "path")
+        if self._get(tokens) != self._value(operation):
+            raise PatchTestFailed(f"値が一致しません: {operation.get('path')}")
+
+    # --- 専用操作 ---
+
+    def _op_set_tiles_rect(self, operation):
+        """矩形範囲のタイルを設定（tile で塗りつぶし、または tiles で2次元配列を書き込み）"""
+        x, y = self._int(operation, "x"), self._int(operation, "y")
+
+        if operation.get("tiles") is not None:
+            block = operation["tiles"]
+            if not isinstance(block, list) or not block or not all(isinstance(r, list) for r in block):
+                raise PatchError("tiles は2次元配列で指定してください")
+            width, height = len(block[0]), len(block)
+            if width == 0 or any(len(r) != width for r in block):
+                raise PatchError("tiles の各行の長さが揃っていません")
+            rows = [[self._tile(v) for v in r] for r in block]
+        elif operation.get("tile") is not None:
+            width, height = self._int(operation, "width"), self._int(operation, "height")
+            if width <= 0 or height <= 0:
+                raise PatchError("width と height は1以上で指定してください")
+            rows = [[self._tile(operation["tile"])] * width] * height
+        else:
+            raise PatchError("tile または tiles を指定してください")
+
+        map_data = self._own_child(self.doc, "map")
+        self._check_rect(map_data, x, y, width, height)
+        tiles = self._own_child(map_data, "tiles")
+        for dy, values in enumerate(rows):
+            row = self._own_child(tiles, y + dy)
+            if len(row) < x + width:
+                raise PatchError(f"タイル配列の行が短すぎます: {y + dy}")
+            row[x:x + width] = values
+        self.changed = True
+
+    def _op_move_npc(self, operation):
+        """NPCを指定座標に移動"""
+        npc_id = operation.get("id")
+        x, y = self._int(operation, "x"), self._int(operation, "y")
+        self._check_rect(self.doc.get("map") or {}, x, y, 1, 1)
+
+        npcs = self._own_child(self.doc, "npcs")
+        for index, npc in enumerate(npcs):
+            if isinstance(npc, dict) and npc.get("id") == npc_id:
+                npc = self._own_child(npcs, index)
+                npc["x"] = x
+                npc["y"] = y
+                self.changed = True
+                return
+        raise PatchError(f"NPCが見つかりません: {npc_id}")
+
+    # --- 検証 ---
+
+    def validate(self):
+        """変更された箇所だけをモデルで検証"""
+        try:
+            for tokens in self._touched:
+                if not tokens:
+                    RPGProjectData.model_validate(self.doc)
+                elif tokens[0] == "map" and len(tokens) >= 2 and tokens[1] == "tiles":
+                    self._validate_tiles(tokens)
+                elif tokens[0] in _SECTION_ADAPTERS:
+                    field = RPGProjectData.model_fields[tokens[0]]
+                    adapter = _SECTION_ADAPTERS[tokens[0]]
+                    if tokens[0] in self.doc:
+                        # PUT と同様にモデル経由で正規化した値に置き換える
+                        value = adapter.dump_python(adapter.validate_python(self.doc[tokens[0]]))
+                        if tokens[0] == "map":
+                            value = decode_map(value)
+                        self.doc[tokens[0]] = value
+                    elif field.is_required():
+                        raise PatchError(f"必須項目は削除できません: {tokens[0]}")
+        except (ValidationError, TileEncodingError) as e:
+            raise PatchError(f"データ形式が不正です: {e}") from None
+
+    def _validate_tiles(self, tokens: List[str]):
+        tiles = self.doc.get("map", {}).get("tiles")
+        if len(tokens) == 2:
+            _TILES_ADAPTER.validate_python(tiles, strict=True)
+            return
+        try:
+            row = tiles[int(tokens[2])]
+        except (IndexError, ValueError, TypeError):
+            # 行そのものが削除された場合は配列全体を確認
+            _TILES_ADAPTER.validate_python(tiles, strict=True)
+            return
+        _TILE_ROW_ADAPTER.validate_python(row, strict=True)
+
+    # --- 内部処理 ---
+
+    def _add(self, tokens: List[str], value: Any):
+        if not tokens:
+            self._replace_root(value)
+            return
+        container, key = self._writable_parent(tokens)
+        if isinstance(container, list):
+            if key == "-":
+                container.append(value)
+            else:
+                index = self._index(key, len(container) + 1)
+                container.insert(index, value)
+        else:
+            container[key] = value
+        self._touch(tokens)
+
+    def _remove(self, tokens: List[str]):
+        if not tokens:
+            raise PatchError("ルートは削除できません")
+        container, key = self._writable_parent(tokens)
+        key = self._existing_key(container, key)
+        del container[key]
+        self._touch(tokens)
+
+    def _replace_root(self, value: Any):
+        if not isinstance(value, dict):
+            raise PatchError("ルートはオブジェクトである必要があります")
+        self.doc = dict(value)
+        self._owned[id(self.doc)] = self.doc
+        self._touch([])
+
+    def _get(self, tokens: List[str]) -> Any:
+        current = self.doc
+        for token in tokens:
+            if isinstance(current, (dict, list)):
+                current = current[self._existing_key(current, token)]
+            else:
+                raise PatchError(f"パスが見つかりません: /{'/'.join(tokens)}")
+        return current
+
+    def _writable_parent(self, tokens: List[str]) -> Tuple[Any, str]:
+        """親コンテナまでの経路をコピーして書き込み可能な親とキーを返す"""
+        container = self.doc
+        for token in tokens[:-1]:
+            if not isinstance(container, (dict, list)):
+                raise PatchError(f"パスが見つかりません: /{'/'.join(tokens)}")
+            container = self._own_child(container, self._existing_key(container, token))
+        if not isinstance(container, (dict, list)):
+            raise PatchError(f"パスが見つかりません: /{'/'.join(tokens)}")
+        return container, tokens[-1]
+
+    def _own_child(self, container: Any, key: Any) -> Any:
+        """子コンテナを（未コピーなら）コピーして書き込み可能にする"""
+        try:
+            child = container[key]
+        except (KeyError, IndexError, TypeError):
+            raise PatchError(f"パスが見つかりません: {key}") from None
+        if id(child) not in self._owned:
+            if isinstance(child, dict):
+                child = dict(child)
+            elif isinstance(child, list):
+                child = list(child)
+            else:
+                raise PatchError(f"コンテナではありません: {key}")
+            container[key] = child
+            self._owned[id(child)] = child
+        return child
+
+    def _existing_key(self, container: Any, token: str) -> Any:
+        if isinstance(container, list):
+            return self._index(token, len(container))
+        if token not in container:
+            raise PatchError(f"キーが見つかりません: {token}")
+        return token
+
+    @staticmethod
+    def _index(token: str, size: int) -> int:
+        if not token.isdigit() or (token != "0" and token.startswith("0")):
+            raise PatchError(f"無効な配列インデックス: {token}")
+        index = int(token)
+        if index >= size:
+            raise PatchError(f"配列インデックスが範囲外です: {token}")
+        return index
+
+    def _touch(self, tokens: List[str]):
+        self._touched.append(tokens)
+        self.changed = True
+
+    @staticmethod
+    def _path(operation: Dict[str, Any], field: str) -> List[str]:
+        pointer = operation.get(field)
+        if not isinstance(pointer, str):
+            raise PatchError(f"{field} を指定してください")
+        return parse_pointer(pointer)
+
+    @staticmethod
+    def _value(operation: Dict[str, Any]) -> Any:
+        if "value" not in operation:
+            raise PatchError("value を指定してください")
+        return operation["value"]
+
+    @staticmethod
+    def _int(operation: Dict[str, Any], field: str) -> int:
+        value = operation.get(field)
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise PatchError(f"{field} は整数で指定してください")
+        return value
+
+    @staticmethod
+    def _tile(value: Any) -> int:
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise PatchError(f"無効なタイル値: {value}")
+        return value
+
+    @staticmethod
+    def _check_rect(map_data: Dict[str, Any], x: int, y: int, width: int, height: int):
+        map_width, map_height = map_data.get("width", 0), map_data.get("height", 0)
+        if x < 0 or y < 0 or x + width > map_width or y + height > map_height:
+            raise PatchError(f"マップ範囲外です: ({x}, {y}, {width}, {height})")
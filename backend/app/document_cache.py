@@ -0,0 +1,122 @@
+"""パース済みゲームデータのキャッシュ"""
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Any, Callable, Dict, Tuple, Sequence
+
+from .metrics import cache_counters
+
+# キャッシュするドキュメント数の上限
+DOCUMENT_CACHE_MAX_ENTRIES = int(os.environ.get("MOCOTCH_DOCUMENT_CACHE_SIZE", "32"))
+
+# ファイル状態のキー（パスごとの (mtime_ns, size)。存在しなければ None）
+FileKey = Tuple[Optional[Tuple[int, int]], ...]
+
+_DOCUMENT_HITS, _DOCUMENT_MISSES = cache_counters("document")
+_DERIVED_HITS, _DERIVED_MISSES = cache_counters("derived")
+
+
+class DocumentCache:
+    """
+    パース済みドキュメントの LRU キャッシュ
+
+    ファイル（と watch で指定した追加のパス）の mtime とサイズをキーとして
+    検証し、外部で書き換えられた場合はミスとして扱う。キャッシュした
+    ドキュメントは共有されるため、呼び出し側で直接変更してはいけない。
+    ドキュメントから作った派生値（シリアライズ結果など）も同じエントリに保持する。
+    """
+
+    def __init__(self, max_entries: int = DOCUMENT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[FileKey, Any, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: Path, watch: Sequence[Path] = ()) -> Optional[Any]:
+        """キャッシュ済みドキュメントを取得（ファイルが変わっていれば None）"""
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            _DOCUMENT_MISSES.inc()
+            return None
+
+        if entry[0] != self.file_key(path, watch):
+            self.invalidate(path)
+            _DOCUMENT_MISSES.inc()
+            return None
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        _DOCUMENT_HITS.inc()
+        return entry[1]
+
+    def put(self, path: Path, doc: Any, file_key: Optional[FileKey] = None, watch: Sequence[Path] = ()):
+        """
+        ドキュメントを登録
+
+        file_key を省略した場合は現在のファイル状態を使う（書き込み直後に呼ぶ）。
+        読み込みの場合は読み込み前に file_key() で取得した値を渡す。
+        """
+        if file_key is None:
+            file_key = self.file_key(path, watch)
+        if file_key[0] is None:
+            return
+
+        key = os.path.abspath(path)
+        with self._lock:
+            self._entries[key] = (file_key, doc, {})
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def derive(self, path: Path, doc: Any, name: str, factory: Callable[[Any], Any]) -> Any:
+        """
+        ドキュメントの派生値を取得（未計算なら factory(doc) で計算して保持）
+
+        doc がキャッシュ中のドキュメントと同じ場合だけ保持する
+        """
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+            if entry is not None and entry[1] is doc and name in entry[2]:
+                _DERIVED_HITS.inc()
+                return entry[2][name]
+
+        _DERIVED_MISSES.inc()
+        value = factory(doc)
+
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+            if entry is not None and entry[1] is doc:
+                entry[2][name] = value
+        return value
+
+    def derived(self, path: Path, doc: Any, name: str) -> Optional[Any]:
+        """計算済みの派生値を取得（なければ None）"""
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+            if entry is not None and entry[1] is doc:
+                return entry[2].get(name)
+        return None
+
+    def invalidate(self, path: Path):
+        """指定ファイルのキャッシュを破棄"""
+        with self._lock:
+            self._entries.pop(os.path.abspath(path), None)
+
+    @staticmethod
+    def file_key(path: Path, watch: Sequence[Path] = ()) -> FileKey:
+        """ファイル状態のキーを取得"""
+        key = []
+        for p in (path, *watch):
+            try:
+                stat = p.stat()
+                key.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                key.append(None)
+        return tuple(key)
+
+
+# プロセス全体で共有するキャッシュ
+document_cache = DocumentCache()
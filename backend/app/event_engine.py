@@ -0,0 +1,261 @@
+"""イベントの発動判定（座標ごとの索引と、事前にコンパイルした条件式）"""
+import ast
+import functools
+import operator
+import re
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+# トリガーの種類（talk: 話しかける / step: 踏む / auto: 条件を満たしたら自動）
+TRIGGER_TYPES = ("talk", "step", "auto")
+# 条件式の長さの上限（文字数）
+MAX_CONDITION_LENGTH = 1000
+
+# 条件式（状態を受け取って真偽を返す）
+Condition = Callable[[Mapping[str, Any]], bool]
+
+
+class ConditionError(ValueError):
+    """条件式が不正"""
+
+
+_COMPARE_OPS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+}
+
+
+def _safe_mul(a: Any, b: Any) -> Any:
+    """文字列・リストの繰り返しで巨大な値を作らせない"""
+    for seq, count in ((a, b), (b, a)):
+        if isinstance(seq, (str, list)) and isinstance(count, int) and len(seq) * count > MAX_CONDITION_LENGTH:
+            raise ConditionError("値が大きすぎます")
+    return operator.mul(a, b)
+
+
+_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: _safe_mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+}
+_UNARY_OPS = {
+    ast.Not: operator.not_,
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+# フロントエンド（TypeScript）風の書き方を Python の式に置き換える
+_JS_SYNTAX = [
+    (re.compile(r"==="), "=="),
+    (re.compile(r"!=="), "!="),
+    (re.compile(r"&&"), " and "),
+    (re.compile(r"\|\|"), " or "),
+    (re.compile(r"!(?!=)"), " not "),
+    (re.compile(r"\btrue\b"), "True"),
+    (re.compile(r"\bfalse\b"), "False"),
+    (re.compile(r"\bnull\b"), "None"),
+]
+_STRING_LITERAL = re.compile(r"""("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')""")
+
+
+def _normalize(source: str) -> str:
+    """文字列リテラル以外の部分だけ TypeScript 風の演算子を置き換える"""
+    parts = _STRING_LITERAL.split(source)
+    for i in range(0, len(parts), 2):
+        for pattern, replacement in _JS_SYNTAX:
+            parts[i] = pattern.sub(replacement, parts[i])
+    return "".join(parts)
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_condition(source: str) -> Condition:
+    """
+    条件式をコンパイル
+
+    Python の式（and / or / not、比較、四則演算、flags.key や flags["key"] の参照）と
+    TypeScript 風の &&・||・!・=== を受け付ける。eval は使わず、許可した構文だけを
+    クロージャに変換するので、属性アクセスや関数呼び出しで外に出ることはできない。
+    名前は状態の辞書から引き、未定義なら None になる。
+
+    Raises:
+        ConditionError: 構文エラーや許可していない構文を含む
+    """
+    if len(source) > MAX_CONDITION_LENGTH:
+        raise ConditionError("条件式が長すぎます")
+    try:
+        tree = ast.parse(_normalize(source).strip(), mode="eval")
+    except SyntaxError as e:
+        raise ConditionError(f"条件式の構文エラー: {e.msg}") from None
+
+    evaluate = _compile_node(tree.body)
+
+    def condition(state: Mapping[str, Any]) -> bool:
+        try:
+            return bool(evaluate(state))
+        except Exception:
+            # 型の合わない比較などは不成立として扱う
+            return False
+
+    return condition
+
+
+def _lookup(value: Any, key: Any) -> Any:
+    if isinstance(value, Mapping):
+        return value.get(key)
+    if isinstance(value, (list, tuple, str)) and isinstance(key, int):
+        return value[key] if -len(value) <= key < len(value) else None
+    return None
+
+
+def _compile_node(node: ast.AST) -> Callable[[Mapping[str, Any]], Any]:
+    """式の構文木を状態を受け取る関数に変換"""
+    if isinstance(node, ast.Constant):
+        if not isinstance(node.value, (int, float, str, bool, type(None))):
+            raise ConditionError(f"使用できない値です: {node.value!r}")
+        value = node.value
+        return lambda state: value
+
+    if isinstance(node, ast.Name):
+        name = node.id
+        return lambda state: state.get(name)
+
+    if isinstance(node, ast.Attribute):
+        target = _compile_node(node.value)
+        attr = node.attr
+        if attr.startswith("_"):
+            raise ConditionError(f"使用できない名前です: {attr}")
+        return lambda state: _lookup(target(state), attr)
+
+    if isinstance(node, ast.Subscript):
+        target = _compile_node(node.value)
+        key = _compile_node(node.slice)
+        return lambda state: _lookup(target(state), key(state))
+
+    if isinstance(node, ast.BoolOp):
+        operands = [_compile_node(value) for value in node.values]
+        if isinstance(node.op, ast.And):
+            return lambda state: all(operand(state) for operand in operands)
+        return lambda state: any(operand(state) for operand in operands)
+
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+        op = _UNARY_OPS[type(node.op)]
+        operand = _compile_node(node.operand)
+        return lambda state: op(operand(state))
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+        op = _BINARY_OPS[type(node.op)]
+        left, right = _compile_node(node.left), _compile_node(node.right)
+        return lambda state: op(left(state), right(state))
+
+    if isinstance(node, ast.Compare) and all(type(op) in _COMPARE_OPS for op in node.ops):
+        first = _compile_node(node.left)
+        rest = [(_COMPARE_OPS[type(op)], _compile_node(value)) for op, value in zip(node.ops, node.comparators)]
+
+        def compare(state: Mapping[str, Any]) -> bool:
+            left = first(state)
+            for op, operand in rest:
+                right = operand(state)
+                if not op(left, right):
+                    return False
+                left = right
+            return True
+
+        return compare
+
+    if isinstance(node, (ast.List, ast.Tuple)):
+        items = [_compile_node(item) for item in node.elts]
+        return lambda state: [item(state) for item in items]
+
+    raise ConditionError(f"使用できない構文です: {type(node).__name__}")
+
+
+class CompiledEvent:
+    """条件式をコンパイル済みのイベント"""
+
+    def __init__(self, event: Dict[str, Any], order: int):
+        self.event = event
+        self.order = order
+        self.id = event.get("id")
+        self.trigger_type = event.get("trigger_type")
+        self.error: Optional[str] = None
+        self.condition: Optional[Condition] = None
+
+        source = event.get("condition")
+        if source and source.strip():
+            try:
+                self.condition = compile_condition(source)
+            except ConditionError as e:
+                self.error = str(e)
+
+    def matches(self, state: Mapping[str, Any]) -> bool:
+        if self.error is not None:
+            # 不正な条件式のイベントは発動しない
+            return False
+        return self.condition is None or self.condition(state)
+
+
+class EventEngine:
+    """
+    ゲームデータのイベントの発動判定
+
+    座標を持つイベントはトリガーの種類ごとに (x, y) をキーとした辞書に、
+    座標を持たないイベントはトリガーの種類ごとのリストにまとめる。
+    ある座標で発動するイベントの検索は辞書を1回引くだけで済む。
+    """
+
+    def __init__(self, events: List[Dict[str, Any]]):
+        self.events = [CompiledEvent(event, order) for order, event in enumerate(events)]
+        self._positional: Dict[str, Dict[Tuple[int, int], List[CompiledEvent]]] = defaultdict(dict)
+        self._global: Dict[str, List[CompiledEvent]] = defaultdict(list)
+
+        for compiled in self.events:
+            x, y = compiled.event.get("x"), compiled.event.get("y")
+            if x is not None and y is not None:
+                self._positional[compiled.trigger_type].setdefault((x, y), []).append(compiled)
+            else:
+                self._global[compiled.trigger_type].append(compiled)
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any]) -> "EventEngine":
+        return cls(doc.get("events") or [])
+
+    @property
+    def errors(self) -> Dict[str, str]:
+        """条件式が不正なイベント（ID → エラーメッセージ）"""
+        return {compiled.id: compiled.error for compiled in self.events if compiled.error is not None}
+
+    def candidates(self, trigger_type: str, x: Optional[int] = None, y: Optional[int] = None) -> List[CompiledEvent]:
+        """条件を評価する前の候補（ゲームデータでの定義順）"""
+        positional = self._positional.get(trigger_type)
+        at = positional.get((x, y), []) if positional and x is not None and y is not None else []
+        anywhere = self._global.get(trigger_type, [])
+        if at and anywhere:
+            return sorted(at + anywhere, key=lambda compiled: compiled.order)
+        return at or anywhere
+
+    def fire(
+        self,
+        trigger_type: str,
+        x: Optional[int] = None,
+        y: Optional[int] = None,
+        state: Optional[Mapping[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        発動するイベント
+
+        Args:
+            trigger_type: talk / step / auto
+            x, y: talk なら話しかけた先、step なら踏んだタイル（auto では省略）
+            state: 条件式から参照する状態（フラグや変数）
+        """
+        state = state or {}
+        return [compiled.event for compiled in self.candidates(trigger_type, x, y) if compiled.matches(state)]
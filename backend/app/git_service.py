@@ -1,57 +1,217 @@
 """Git操作を管理するサービス"""
+import functools
 import os
+import shutil
+import time
 from pathlib import Path
-from git import Repo, GitCommandError
-from typing import Optional, List, Tuple
+from git import Repo, GitCommandError, RemoteProgress, SymbolicReference
+from typing import Optional, List, Tuple, Dict, Any
 import logging
 
+from .autosave import autosave_buffer
+from .git_status import parse_porcelain_v2, status_cache
+from .metrics import metrics
+from .repo_pool import repo_pool
+
 logger = logging.getLogger(__name__)
 
+# 自動保存で書き込みを遅らせるゲームデータのファイル
+DATA_FILE = "game.json"
+
+GIT_OPERATION_SECONDS = metrics.histogram(
+    "mocotch_git_operation_duration_seconds", "Git操作の所要時間（秒）", ("operation", "result")
+)
+GIT_OPERATIONS_IN_FLIGHT = metrics.gauge(
+    "mocotch_git_operations_in_flight", "実行中のGit操作の数", ("operation",)
+)
+
+
+def _timed(operation: str):
+    """Git操作の所要時間と実行中の数をメトリクスに記録（False を返すか例外なら result="error"）"""
+    def decorator(method):
+        in_flight = GIT_OPERATIONS_IN_FLIGHT.labels(operation)
+        succeeded = GIT_OPERATION_SECONDS.labels(operation, "ok")
+        failed = GIT_OPERATION_SECONDS.labels(operation, "error")
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            in_flight.inc()
+            start = time.perf_counter()
+            result = False
+            try:
+                result = method(self, *args, **kwargs)
+                return result
+            finally:
+                in_flight.dec()
+                (failed if result is False else succeeded).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def _invalidates_status(method):
+    """Git状態を変える操作の後に状態キャッシュを破棄する"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            status_cache.invalidate(self.project_path)
+    return wrapper
+
+
+def _leased(method):
+    """プールの Repo を借りて実行（同じ Repo を使う他のスレッドの操作とは直列化される）"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        previous = self.repo
+        with repo_pool.lease(self.project_path) as repo:
+            self.repo = repo
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.repo = previous
+    return wrapper
+
 
 class GitService:
     """Git操作を管理するサービス（プロジェクトごと）"""
 
     def __init__(self, project_path: Path, branch: str = "develop"):
         self.project_path = project_path
+        # 公開メソッドの実行中だけ、プールから借りた Repo が入る
         self.repo: Optional[Repo] = None
         self.branch = branch
 
+    @_invalidates_status
+    @_leased
+    @_timed("init")
     def init_repo(self) -> bool:
         """新規リポジトリを初期化"""
         try:
             if self.project_path.exists() and (self.project_path / ".git").exists():
                 logger.info(f"既存のリポジトリを使用: {self.project_path}")
-                self.repo = Repo(self.project_path)
                 self._checkout_branch()
                 return True
 
             logger.info(f"新規リポジトリを初期化: {self.project_path}")
             self.project_path.mkdir(parents=True, exist_ok=True)
-            self.repo = Repo.init(self.project_path)
-            self._set_anonymous_user()
-            self._create_initial_commit()
-            self._checkout_branch()
+            repo_pool.put(self.project_path, Repo.init(self.project_path))
+            with repo_pool.lease(self.project_path) as self.repo:
+                self._set_anonymous_user()
+                self._create_initial_commit()
+                self._checkout_branch()
             return True
         except Exception as e:
             logger.error(f"リポジトリ初期化失敗: {e}")
             return False
 
-    def clone_repo(self, remote_url: str) -> bool:
-        """既存リポジトリをクローン"""
+    @_invalidates_status
+    @_leased
+    @_timed("clone")
+    def clone_repo(
+        self,
+        remote_url: str,
+        progress: Optional[RemoteProgress] = None,
+        depth: Optional[int] = None,
+        filter: Optional[str] = None,
+        sparse_paths: Optional[List[str]] = None,
+    ) -> bool:
+        """
+        既存リポジトリをクローン
+
+        depth で浅いクローン、filter（blob:none など）で部分クローン、
+        sparse_paths で sparse-checkout（パターンに一致するファイルだけ展開）にする
+        """
         try:
             if self.project_path.exists():
                 logger.error(f"プロジェクトディレクトリが既に存在: {self.project_path}")
                 return False
 
-            logger.info(f"リポジトリをクローン: {remote_url}")
-            self.repo = Repo.clone_from(remote_url, self.project_path)
-            self._set_anonymous_user()
-            self._checkout_branch()
+            options: Dict[str, Any] = {}
+            if depth:
+                # 浅いクローンでも全ブランチを取得して、指定ブランチに切り替えられるようにする
+                options.update(depth=depth, no_single_branch=True)
+            if filter:
+                options["filter"] = filter
+            if sparse_paths:
+                # 最初はルート直下だけを展開し、パターンを設定してから残りを展開する
+                options["sparse"] = True
+
+            logger.info(f"リポジトリをクローン: {remote_url} {options or ''}")
+            repo_pool.put(
+                self.project_path, Repo.clone_from(remote_url, self.project_path, progress=progress, **options)
+            )
+            with repo_pool.lease(self.project_path) as self.repo:
+                if sparse_paths:
+                    self.repo.git.sparse_checkout("set", "--no-cone", *sparse_paths)
+                self._set_anonymous_user()
+                self._checkout_branch()
             return True
         except Exception as e:
             logger.error(f"リポジトリクローン失敗: {e}")
             return False
 
+    @_invalidates_status
+    @_leased
+    @_timed("clone_template")
+    def clone_template(self, template_path: Path) -> bool:
+        """
+        テンプレートリポジトリからローカルクローン（オブジェクトはハードリンクで共有）
+
+        テンプレートのブランチをローカルブランチとして取り込み、origin は削除する。
+        続けて commit_template() でプロジェクト名を含むファイルをコミットする。
+        """
+        try:
+            if self.project_path.exists():
+                logger.error(f"プロジェクトディレクトリが既に存在: {self.project_path}")
+                return False
+
+            repo = Repo.clone_from(str(template_path), self.project_path, local=True)
+            for ref in repo.remotes.origin.refs:
+                if ref.remote_head != "HEAD" and ref.remote_head not in repo.heads:
+                    repo.create_head(ref.remote_head, ref.commit)
+            repo.delete_remote(repo.remotes.origin)
+            repo_pool.put(self.project_path, repo)
+            with repo_pool.lease(self.project_path) as self.repo:
+                self._set_anonymous_user()
+            return True
+        except Exception as e:
+            logger.error(f"テンプレートからのクローン失敗: {e}")
+            return False
+
+    @_invalidates_status
+    @_leased
+    @_timed("commit_template")
+    def commit_template(self, paths: List[str], message: str) -> bool:
+        """
+        テンプレートのコミットを書き換えたファイルで置き換え、指定ブランチにする
+
+        テンプレートの最終コミットと同じ親を持つコミットを作り、git add -A や
+        ワークツリーの走査をせずに（書き換えたファイルだけをステージして）コミットする
+        """
+        try:
+            if not self.repo:
+                raise ValueError("リポジトリが初期化されていません")
+
+            template_head = self.repo.head.reference
+            self.repo.index.add(paths)
+            commit = self.repo.index.commit(message, parent_commits=template_head.commit.parents, head=False)
+
+            if self.branch in self.repo.heads:
+                head = self.repo.heads[self.branch]
+                head.set_commit(commit)
+            else:
+                head = self.repo.create_head(self.branch, commit)
+            self.repo.head.set_reference(head)
+            if template_head.name != self.branch:
+                SymbolicReference.delete(self.repo, template_head.path)
+
+            logger.info(f"テンプレートからプロジェクトを作成: {commit.hexsha[:7]} (ブランチ: {self.branch})")
+            return True
+        except Exception as e:
+            logger.error(f"テンプレートのコミット失敗: {e}")
+            return False
+
     def _set_anonymous_user(self):
         """匿名のユーザー名とメールアドレスを設定"""
         if not self.repo:
@@ -96,24 +256,35 @@ class GitService:
             logger.error(f"ブランチチェックアウト失敗: {e}")
             raise
 
-    def pull(self) -> bool:
+    @_invalidates_status
+    @_leased
+    @_timed("pull")
+    def pull(self, progress: Optional[RemoteProgress] = None) -> bool:
         """最新の変更を取得"""
         try:
+            autosave_buffer.flush_project(self.project_path)
             if self.repo and self.repo.remotes:
                 origin = self.repo.remotes.origin
-                origin.pull(self.branch)
+                origin.pull(self.branch, progress=progress)
                 logger.info(f"git pull 成功 (ブランチ: {self.branch})")
                 return True
         except GitCommandError as e:
             logger.error(f"git pull 失敗: {e}")
         return False
 
+    @_invalidates_status
+    @_leased
+    @_timed("commit")
     def commit_all(self, message: str) -> bool:
         """全ての変更をコミット"""
         try:
             if not self.repo:
                 raise ValueError("リポジトリが初期化されていません")
 
+            # 書き込み待ちの自動保存を含めてコミットする
+            if not autosave_buffer.flush_project(self.project_path):
+                raise ValueError("自動保存の書き込みに失敗しました")
+
             # 全てのファイルをステージング
             self.repo.git.add(A=True)
 
@@ -131,21 +302,118 @@ class GitService:
             logger.error(f"git commit 失敗: {e}")
             return False
 
-    def push(self) -> bool:
-        """変更をリモートにプッシュ"""
+    @_invalidates_status
+    @_leased
+    @_timed("push")
+    def push(self, progress: Optional[RemoteProgress] = None, timeout: Optional[float] = None) -> bool:
+        """変更をリモートにプッシュ（timeout 秒を超えたら git を終了させて失敗扱い）"""
         try:
             if not self.repo or not self.repo.remotes:
                 logger.info("リモートリポジトリが設定されていません")
                 return True
 
             origin = self.repo.remotes.origin
-            origin.push(refspec=f"{self.branch}:{self.branch}", set_upstream=True)
+            origin.push(
+                refspec=f"{self.branch}:{self.branch}",
+                set_upstream=True,
+                progress=progress,
+                kill_after_timeout=timeout,
+            )
             logger.info(f"git push 成功 (ブランチ: {self.branch})")
             return True
         except GitCommandError as e:
             logger.error(f"git push 失敗: {e}")
             return False
 
+    @_invalidates_status
+    @_leased
+    @_timed("unshallow")
+    def unshallow(self, progress: Optional[RemoteProgress] = None) -> bool:
+        """浅いクローンの履歴をすべて取得"""
+        try:
+            if not self.repo or not self.repo.remotes:
+                return False
+            if self.repo.git.rev_parse("--is-shallow-repository") != "true":
+                logger.info("浅いクローンではありません")
+                return True
+
+            self.repo.remotes.origin.fetch(unshallow=True, progress=progress)
+            logger.info("履歴をすべて取得")
+            return True
+        except GitCommandError as e:
+            logger.error(f"git fetch --unshallow 失敗: {e}")
+            return False
+
+    @_invalidates_status
+    @_leased
+    @_timed("hydrate")
+    def hydrate(self, progress: Optional[RemoteProgress] = None) -> bool:
+        """
+        部分クローン・sparse-checkout を通常のクローンと同じ状態にする
+
+        sparse-checkout を解除して全ファイルを展開し、部分クローンなら
+        フィルターを外して取得していないオブジェクトをまとめて取得する
+        """
+        try:
+            if not self.repo:
+                return False
+
+            if self.repo.config_reader().get_value("core", "sparseCheckout", False):
+                self.repo.git.sparse_checkout("disable")
+                logger.info("sparse-checkout を解除")
+
+            if self.repo.remotes and self.repo.config_reader().has_option('remote "origin"', "partialclonefilter"):
+                with self.repo.config_writer() as config:
+                    config.remove_option('remote "origin"', "partialclonefilter")
+                self.repo.remotes.origin.fetch(refetch=True, progress=progress)
+                logger.info("部分クローンのオブジェクトをすべて取得")
+
+            shutil.rmtree(self._lazy_blob_dir(), ignore_errors=True)
+            return True
+        except GitCommandError as e:
+            logger.error(f"ハイドレート失敗: {e}")
+            return False
+
+    @_leased
+    def materialize_blob(self, rel_path: str) -> Optional[Path]:
+        """
+        ワークツリーにない（sparse-checkout で除外された）ファイルの内容を取得
+
+        部分クローンで未取得の場合はこの時点でリモートから取得する。
+        内容は .git/mocotch/lazy/ に blob のハッシュ名で保存し、次回からは再利用する。
+
+        Returns:
+            内容を書き出したファイルのパス（HEAD に存在しない場合は None）
+        """
+        if not self.repo or not self.repo.head.is_valid():
+            return None
+
+        try:
+            blob_sha = self.repo.git.rev_parse(f"HEAD:{rel_path}")
+        except GitCommandError:
+            return None
+
+        path = self._lazy_blob_dir() / blob_sha
+        if path.exists():
+            return path
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{blob_sha}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                self.repo.git.cat_file("blob", blob_sha, output_stream=f)
+            os.replace(tmp_path, path)
+        except GitCommandError as e:
+            tmp_path.unlink(missing_ok=True)
+            logger.error(f"ファイル内容の取得失敗: {rel_path}: {e}")
+            return None
+
+        logger.info(f"未展開のファイルを取得: {rel_path}")
+        return path
+
+    def _lazy_blob_dir(self) -> Path:
+        return self.project_path / ".git" / "mocotch" / "lazy"
+
     def get_status(self) -> Tuple[bool, List[str], List[str]]:
         """
         Git状態を取得
@@ -153,25 +421,87 @@ class GitService:
         Returns:
             (has_changes, modified_files, untracked_files)
         """
-        if not self.repo:
-            return False, [], []
+        status = self.status()
+        return status["has_uncommitted_changes"], status["modified_files"], status["untracked_files"]
 
-        try:
-            modified = [item.a_path for item in self.repo.index.diff(None)]
-            untracked = self.repo.untracked_files
-            has_changes = len(modified) > 0 or len(untracked) > 0
+    def status(self) -> Dict[str, Any]:
+        """
+        `git status --porcelain=v2 --branch` 1回でブランチと変更ファイルを取得
+
+        ワークツリーに変化がなければキャッシュした結果を返す。自動保存の書き込み待ちは
+        書き込まずに（まとめて書き込めるよう）game.json の変更として報告する
+
+        Returns:
+            GitStatus と同じキーの辞書
+        """
+        if not (self.project_path / ".git").exists():
+            return self._status_dict(False, [], [])
 
-            return has_changes, modified, untracked
+        try:
+            if autosave_buffer.has(self.project_path / DATA_FILE):
+                # ディスクとは内容が違うのでキャッシュは使わない
+                status = self._run_status()
+                if status is None:
+                    return self._status_dict(False, [], [])
+                return self._with_pending_data(status)
+
+            stamp = status_cache.stamp(self.project_path)
+            cached = status_cache.get(self.project_path, stamp)
+            if cached is not None:
+                return cached
+
+            generation = status_cache.generation(self.project_path)
+            status = self._run_status()
+            if status is None:
+                return self._status_dict(False, [], [])
+            if status["branch"] is None:
+                status["branch"] = self.branch
+            status_cache.put(self.project_path, stamp, status, generation)
+            return status
         except Exception as e:
             logger.error(f"Git状態取得失敗: {e}")
-            return False, [], []
+            return self._status_dict(False, [], [])
 
+    @_leased
+    @_timed("status")
+    def _run_status(self) -> Optional[Dict[str, Any]]:
+        """`git status` を実行して解析（キャッシュを使わない。リポジトリがなければ None）"""
+        if not self.repo:
+            return None
+        output = self.repo.git.status(porcelain="v2", branch=True, z=True, untracked_files="all")
+        return parse_porcelain_v2(output)
+
+    def _with_pending_data(self, status: Dict[str, Any]) -> Dict[str, Any]:
+        """書き込み待ちのゲームデータを変更ファイルに加えた状態"""
+        status = {**status, "has_uncommitted_changes": True}
+        if status["branch"] is None:
+            status["branch"] = self.branch
+        if DATA_FILE not in status["modified_files"] and DATA_FILE not in status["untracked_files"]:
+            status["modified_files"] = [*status["modified_files"], DATA_FILE]
+        return status
+
+    def _status_dict(self, has_changes: bool, modified: List[str], untracked: List[str]) -> Dict[str, Any]:
+        return {
+            "has_uncommitted_changes": has_changes,
+            "branch": self.branch,
+            "modified_files": modified,
+            "untracked_files": untracked,
+            "ahead": None,
+            "behind": None,
+        }
+
+    @_invalidates_status
+    @_leased
+    @_timed("discard")
     def discard_changes(self) -> bool:
         """未コミットの変更を破棄"""
         try:
             if not self.repo:
                 return False
 
+            # 書き込み待ちの自動保存が破棄後に書き込まれないよう先に書き込む
+            autosave_buffer.flush_project(self.project_path)
+
             # 変更されたファイルを元に戻す
             self.repo.git.checkout('.')
 
@@ -188,12 +518,17 @@ class GitService:
             logger.error(f"Failed to discard changes: {e}")
             return False
 
+    @_invalidates_status
+    @_leased
+    @_timed("checkout")
     def switch_branch(self, branch: str) -> bool:
         """ブランチを切り替え"""
         try:
             if not self.repo:
                 return False
 
+            autosave_buffer.flush_project(self.project_path)
+
             # 未コミットの変更がある場合はエラー
             if self.repo.is_dirty():
                 logger.error("未コミットの変更があります。先にコミットまたは破棄してください")
@@ -206,6 +541,7 @@ class GitService:
             logger.error(f"ブランチ切替失敗: {e}")
             return False
 
+    @_leased
     def get_current_branch(self) -> str:
         """現在のブランチ名を取得"""
         if self.repo and self.repo.active_branch:
@@ -0,0 +1,140 @@
+"""`git status --porcelain=v2` の解析とプロジェクトごとのキャッシュ"""
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+from .metrics import cache_counters
+
+logger = logging.getLogger(__name__)
+
+# キーで検出しない変更（アセットなどの外部での変更）を拾うため、この秒数が経てば取り直す
+STATUS_CACHE_TTL = float(os.environ.get("MOCOTCH_STATUS_CACHE_TTL", "30"))
+
+# キーに含めるパス（.git/index・HEAD と、ゲームデータのファイル・ディレクトリ）
+STAMP_PATHS = (".git/index", ".git/HEAD", "game.json", ".mocotch.json", "map")
+
+# ワークツリーの状態のキー（STAMP_PATHS の mtime_ns とサイズ）
+StatusStamp = Tuple[Tuple[int, int], ...]
+
+_STATUS_HITS, _STATUS_MISSES = cache_counters("git_status")
+
+
+def parse_porcelain_v2(output: str) -> Dict[str, Any]:
+    """
+    `git status --porcelain=v2 --branch -z` の出力を解析
+
+    Returns:
+        GitStatus と同じキーの辞書（branch は detached の場合 None）
+    """
+    branch = None
+    ahead = behind = None
+    modified = []
+    untracked = []
+
+    fields = output.split("\0")
+    i = 0
+    while i < len(fields):
+        entry = fields[i]
+        i += 1
+        if not entry:
+            continue
+
+        kind = entry[0]
+        if kind == "#":
+            key, _, value = entry[2:].partition(" ")
+            if key == "branch.head" and value != "(detached)":
+                branch = value
+            elif key == "branch.ab":
+                a, b = value.split()
+                ahead, behind = int(a), -int(b)
+        elif kind == "1":
+            # 1 XY sub mH mI mW hH hI path
+            modified.append(entry.split(" ", 8)[8])
+        elif kind == "2":
+            # 2 XY sub mH mI mW hH hI Xscore path（-z では続くフィールドが元のパス）
+            modified.append(entry.split(" ", 9)[9])
+            i += 1
+        elif kind == "u":
+            # u XY sub m1 m2 m3 mW h1 h2 h3 path
+            modified.append(entry.split(" ", 10)[10])
+        elif kind == "?":
+            untracked.append(entry[2:])
+
+    return {
+        "has_uncommitted_changes": bool(modified or untracked),
+        "branch": branch,
+        "modified_files": modified,
+        "untracked_files": untracked,
+        "ahead": ahead,
+        "behind": behind,
+    }
+
+
+class StatusCache:
+    """
+    プロジェクトごとの Git 状態のキャッシュ
+
+    .git/index・HEAD とゲームデータ（game.json・.mocotch.json・map/）の stat をキーとして検証する。
+    ワークツリー全体は走査しない（アセットのディレクトリはファイル数が多い）。
+    自前の書き込みでは invalidate() で明示的に破棄し、それ以外の変更は TTL で取り直す。
+    """
+
+    def __init__(self, ttl: float = STATUS_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[StatusStamp, float, Dict[str, Any]]] = {}
+        # invalidate() のたびに増える番号（実行中に破棄された結果を登録しないため）
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, project_path: Path, stamp: StatusStamp) -> Optional[Dict[str, Any]]:
+        """キャッシュ済みの状態を取得（変化があれば None）"""
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(project_path))
+        if entry is None or entry[0] != stamp or time.monotonic() - entry[1] > self.ttl:
+            _STATUS_MISSES.inc()
+            return None
+        _STATUS_HITS.inc()
+        return entry[2]
+
+    def generation(self, project_path: Path) -> int:
+        """git status の実行前に取得し、put() に渡す"""
+        with self._lock:
+            return self._generations.get(os.path.abspath(project_path), 0)
+
+    def put(self, project_path: Path, stamp: StatusStamp, status: Dict[str, Any], generation: int):
+        """
+        状態を登録
+
+        stamp は git status の実行前に取得したものを渡す（実行中の変更を含むキーで
+        古い結果を登録しないため）。実行中に invalidate() された場合は登録しない。
+        """
+        key = os.path.abspath(project_path)
+        with self._lock:
+            if self._generations.get(key, 0) == generation:
+                self._entries[key] = (stamp, time.monotonic(), status)
+
+    def invalidate(self, project_path: Path):
+        """プロジェクトのキャッシュを破棄"""
+        key = os.path.abspath(project_path)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    @staticmethod
+    def stamp(project_path: Path) -> StatusStamp:
+        """ワークツリーの状態のキーを取得"""
+        stamp = []
+        for rel_path in STAMP_PATHS:
+            try:
+                stat = os.stat(project_path / rel_path)
+                stamp.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamp.append((0, -1))
+        return tuple(stamp)
+
+
+# プロセス全体で共有するキャッシュ
+status_cache = StatusCache()
@@ -0,0 +1,309 @@
+"""ゲームデータのコミット履歴と、コミット間の構造的な差分"""
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import logging
+
+import numpy as np
+from git import BadName, Commit, Repo
+
+from . import json_codec
+from .map_chunks import all_chunks, chunk_bounds, chunk_filename, is_chunked
+from .map_grid import tile_array
+from .metrics import cache_counters
+from .repo_pool import repo_pool
+from .tile_codec import decode_document, decode_map, encode_document
+
+logger = logging.getLogger(__name__)
+
+# コミットごとのドキュメント・差分のキャッシュのメモリ上限（MB）
+HISTORY_CACHE_MB = float(os.environ.get("MOCOTCH_HISTORY_CACHE_MB", "256"))
+# タイルの差分で返す矩形の上限（超えたら truncated にして矩形は返さない）
+MAX_DIFF_RECTS = 10000
+
+# ゲームデータを構成するパス（履歴の絞り込みに使う）
+DATA_PATHS = ("game.json", "map")
+
+# ID で対応付けて比較するリスト
+_KEYED_SECTIONS = ("npcs", "events")
+
+_HISTORY_HITS, _HISTORY_MISSES = cache_counters("history")
+
+
+class HistoryError(Exception):
+    """コミットやゲームデータが見つからない"""
+
+
+class _Snapshot:
+    """
+    あるコミットのゲームデータ
+
+    タイルは NumPy 配列で持ち（巨大なマップでも差分をベクトル演算で求められる）、
+    それ以外は header にそのまま持つ
+    """
+
+    def __init__(self, doc: Dict[str, Any]):
+        map_data = doc.get("map") or {}
+        self.tiles = tile_array(map_data)
+        self.header = {**doc, "map": {k: v for k, v in map_data.items() if k != "tiles"}}
+        self.nbytes = self.tiles.nbytes + len(json_codec.dumps(self.header))
+
+    def document(self) -> Dict[str, Any]:
+        return {**self.header, "map": {**self.header["map"], "tiles": self.tiles.tolist()}}
+
+
+class HistoryCache:
+    """
+    コミットの SHA をキーとしたキャッシュ（容量はバイト数で制限する LRU）
+
+    コミットは変更されないので、パース済みのドキュメント・レスポンス・差分を
+    検証なしで使い回せる
+    """
+
+    def __init__(self, max_bytes: int = int(HISTORY_CACHE_MB * 1024 * 1024)):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, Tuple[Any, int]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Tuple, compute: Callable[[], Any], size: Callable[[Any], int]) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                _HISTORY_HITS.inc()
+                return entry[0]
+
+        _HISTORY_MISSES.inc()
+        value = compute()
+        nbytes = size(value)
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (value, nbytes)
+                self._size += nbytes
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+# プロセス全体で共有するキャッシュ（SHA はリポジトリをまたいでも内容が同じ）
+history_cache = HistoryCache()
+
+class HistoryService:
+    """プロジェクトのゲームデータの履歴"""
+
+    def __init__(self, project_path: Path):
+        self.project_path = project_path
+
+    def list_commits(self, ref: Optional[str] = None, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """ゲームデータ（game.json とマップのチャンク）を変更したコミット（新しい順）"""
+        with self._lease() as repo:
+            if ref is None and not repo.head.is_valid():
+                return []
+
+            sha = self._resolve(repo, ref or "HEAD")
+            commits = repo.iter_commits(sha, paths=list(DATA_PATHS), max_count=limit, skip=offset)
+            # コミットの内容は遅延読み込みなので、Repo を借りている間に辞書にする
+            return [_commit_info(c) for c in commits]
+
+    def resolve(self, ref: str) -> str:
+        """ブランチ名・タグ・短縮 SHA などをコミットの SHA に解決"""
+        with self._lease() as repo:
+            return self._resolve(repo, ref)
+
+    def document_body(self, sha: str, tiles_encoding: Optional[str] = None) -> bytes:
+        """コミット時点のゲームデータ（API と同じ形式のシリアライズ結果）"""
+        def render() -> bytes:
+            doc = self._snapshot(sha).document()
+            return json_codec.dumps(encode_document(doc, tiles_encoding) if tiles_encoding else doc)
+
+        return history_cache.get_or_compute(("document", sha, tiles_encoding or ""), render, len)
+
+    def diff(self, base: str, target: str) -> Dict[str, Any]:
+        """2つのコミットのゲームデータの差分（SHA で指定）"""
+        def compute() -> Dict[str, Any]:
+            return diff_snapshots(self._snapshot(base), self._snapshot(target))
+
+        return history_cache.get_or_compute(("diff", base, target), compute, lambda d: len(json_codec.dumps(d)))
+
+    def _snapshot(self, sha: str) -> _Snapshot:
+        return history_cache.get_or_compute(("snapshot", sha), lambda: self._read_snapshot(sha), lambda s: s.nbytes)
+
+    def _read_snapshot(self, sha: str) -> _Snapshot:
+        """コミットのツリーから game.json（とチャンク）を読み込む"""
+        with self._lease() as repo:
+            tree = repo.commit(sha).tree
+            try:
+                stored = json_codec.loads(tree["game.json"].data_stream.read())
+            except KeyError:
+                raise HistoryError(f"このコミットにはゲームデータがありません: {sha[:7]}") from None
+
+            doc = decode_document(stored)
+            map_data = doc.get("map")
+            if is_chunked(map_data) and "tiles" not in map_data:
+                doc["map"] = {**map_data, "tiles": self._read_chunk_tiles(tree, map_data)}
+        try:
+            return _Snapshot(doc)
+        except (KeyError, TypeError, ValueError) as e:
+            raise HistoryError(f"ゲームデータを読み込めません: {sha[:7]}: {e}") from None
+
+    @contextmanager
+    def _lease(self) -> Iterator[Repo]:
+        """プールの Repo を借りる（GitPython の cat-file プロセスはスレッドセーフでないので直列化される）"""
+        with repo_pool.lease(self.project_path) as repo:
+            if repo is None:
+                raise HistoryError("Gitリポジトリがありません")
+            yield repo
+
+    @staticmethod
+    def _resolve(repo: Repo, ref: str) -> str:
+        try:
+            return repo.commit(ref).hexsha
+        except (BadName, ValueError):
+            raise HistoryError(f"コミットが見つかりません: {ref}") from None
+
+    @staticmethod
+    def _read_chunk_tiles(tree, map_data: Dict[str, Any]) -> np.ndarray:
+        """ツリー内のチャンクからマップ全体のタイル配列を組み立て（存在しないチャンクは0）"""
+        chunk_size, width, height = map_data["chunk_size"], map_data["width"], map_data["height"]
+        tiles = np.zeros((height, width), dtype=np.int32)
+        try:
+            chunks_tree = tree["map"]
+        except KeyError:
+            return tiles
+        for cx, cy in all_chunks(chunk_size, width, height):
+            try:
+                blob = chunks_tree[chunk_filename(cx, cy)]
+            except KeyError:
+                continue
+            chunk = decode_map(json_codec.loads(blob.data_stream.read()))
+            x, y, w, h = chunk_bounds(cx, cy, chunk_size, width, height)
+            tiles[y:y + h, x:x + w] = np.asarray(chunk["tiles"], dtype=np.int32).reshape(h, w)
+        return tiles
+
+
+def _commit_info(commit: Commit) -> Dict[str, Any]:
+    return {
+        "sha": commit.hexsha,
+        "short_sha": commit.hexsha[:7],
+        "message": commit.message.strip(),
+        "author": commit.author.name,
+        "committed_at": datetime.fromtimestamp(commit.committed_date).isoformat(),
+        "parents": [parent.hexsha for parent in commit.parents],
+    }
+
+
+def diff_snapshots(base: _Snapshot, target: _Snapshot) -> Dict[str, Any]:
+    """
+    ゲームデータの構造的な差分
+
+    タイルは変わったセルを矩形（set_tiles_rect の tiles と同じ形の新しい値付き）にまとめ、
+    NPC とイベントは ID で対応付けて追加・削除・変更に分ける。それ以外のセクション
+    （player やマップの設定など）は変わったものの前後の値を返す。
+    """
+    return {
+        "tiles": _diff_tiles(base.tiles, target.tiles),
+        **{section: _diff_keyed(base.header.get(section) or [], target.header.get(section) or [])
+           for section in _KEYED_SECTIONS},
+        "fields": _diff_fields(base.header, target.header),
+    }
+
+
+def _diff_tiles(before: np.ndarray, after: np.ndarray) -> Dict[str, Any]:
+    if before.shape != after.shape:
+        # サイズが変わった場合は矩形では表せない（ドキュメントを取得し直す）
+        return {"resized": True, "changed": None, "rects": [], "truncated": True}
+
+    changed = before != after
+    count = int(changed.sum())
+    rects = tile_rects(changed) if count else []
+    truncated = len(rects) > MAX_DIFF_RECTS
+    if truncated:
+        rects = []
+    return {
+        "resized": False,
+        "changed": count,
+        "rects": [
+            {"x": x, "y": y, "width": w, "height": h, "tiles": after[y:y + h, x:x + w].tolist()}
+            for x, y, w, h in rects
+        ],
+        "truncated": truncated,
+    }
+
+
+def tile_rects(mask: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """
+    True のセルをちょうど覆う矩形 (x, y, width, height) の一覧
+
+    行ごとの連続区間（ラン）をベクトル演算で求め、直前の行と同じ区間のランは
+    同じ矩形として下に伸ばす
+    """
+    height, width = mask.shape
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    start_rows, start_cols = np.nonzero(edges == 1)
+    _, end_cols = np.nonzero(edges == -1)
+
+    rects: List[List[int]] = []
+    # (開始列, 終了列) → 直前の行で伸ばしている矩形
+    open_rects: Dict[Tuple[int, int], List[int]] = {}
+    current_row = -1
+    row_rects: Dict[Tuple[int, int], List[int]] = {}
+    for y, x0, x1 in zip(start_rows.tolist(), start_cols.tolist(), end_cols.tolist()):
+        if y != current_row:
+            # 1行より前の矩形はもう伸びない
+            open_rects = row_rects if y == current_row + 1 else {}
+            row_rects = {}
+            current_row = y
+        rect = open_rects.get((x0, x1))
+        if rect is not None:
+            rect[3] += 1
+        else:
+            rect = [x0, y, x1 - x0, 1]
+            rects.append(rect)
+        row_rects[(x0, x1)] = rect
+    return [tuple(rect) for rect in rects]
+
+
+def _diff_keyed(before: List[Dict[str, Any]], after: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """ID で対応付けたリストの差分"""
+    before_by_id = {item.get("id"): item for item in before}
+    after_by_id = {item.get("id"): item for item in after}
+    changed = []
+    for item_id, item in after_by_id.items():
+        previous = before_by_id.get(item_id)
+        if previous is None or previous == item:
+            continue
+        fields = sorted(key for key in previous.keys() | item.keys() if previous.get(key) != item.get(key))
+        changed.append({"id": item_id, "fields": fields, "before": previous, "after": item})
+    return {
+        "added": [item for item_id, item in after_by_id.items() if item_id not in before_by_id],
+        "removed": [item for item_id, item in before_by_id.items() if item_id not in after_by_id],
+        "changed": changed,
+    }
+
+
+def _diff_fields(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """タイル・NPC・イベント以外で変わった値（マップの設定は map.<キー>）"""
+    def flatten(doc: Dict[str, Any]) -> Dict[str, Any]:
+        fields = {key: value for key, value in doc.items() if key not in _KEYED_SECTIONS and key != "map"}
+        fields.update({f"map.{key}": value for key, value in (doc.get("map") or {}).items()})
+        return fields
+
+    before_fields, after_fields = flatten(before), flatten(after)
+    return {
+        key: {"before": before_fields.get(key), "after": after_fields.get(key)}
+        for key in sorted(before_fields.keys() | after_fields.keys())
+        if before_fields.get(key) != after_fields.get(key)
+    }
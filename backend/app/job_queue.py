@@ -0,0 +1,248 @@
+"""時間のかかる Git 操作（clone / pull / push）をバックグラウンドで実行するジョブキュー"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Set
+import logging
+
+from git import RemoteProgress
+
+logger = logging.getLogger(__name__)
+
+# 同時に実行するジョブ数の上限（全プロジェクト合計）
+JOB_MAX_WORKERS = int(os.environ.get("MOCOTCH_JOB_WORKERS", "4"))
+# 完了したジョブを保持しておく件数
+JOB_HISTORY_SIZE = int(os.environ.get("MOCOTCH_JOB_HISTORY", "256"))
+# リクエスト内の Git 操作が実行中のジョブの完了を待つ最長時間（秒）
+PROJECT_LOCK_TIMEOUT = float(os.environ.get("MOCOTCH_PROJECT_LOCK_TIMEOUT", "5"))
+
+# ジョブの状態
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class JobError(Exception):
+    """ジョブの処理が失敗した（メッセージをジョブのエラーとして記録する）"""
+
+
+class ProjectBusyError(Exception):
+    """プロジェクトのジョブが実行中で、時間内にロックを取れなかった"""
+
+
+class Job:
+    """キューに投入された1件のジョブ"""
+
+    def __init__(self, kind: str, project: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.project = project
+        self.status = JOB_QUEUED
+        self.progress: Optional[Dict[str, Any]] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        # 状態が変わるたびに増える番号（購読側が変化を検出するのに使う）
+        self.version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "project": self.project,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    def update(self, **fields):
+        """状態を更新"""
+        with self._lock:
+            for key, value in fields.items():
+                setattr(self, key, value)
+            self.version += 1
+
+
+class JobProgress(RemoteProgress):
+    """GitPython の進捗通知をジョブの progress に反映"""
+
+    # 通知の間引き間隔（秒）
+    MIN_INTERVAL = 0.2
+
+    _STAGES = {
+        RemoteProgress.COUNTING: "counting",
+        RemoteProgress.COMPRESSING: "compressing",
+        RemoteProgress.WRITING: "writing",
+        RemoteProgress.RECEIVING: "receiving",
+        RemoteProgress.RESOLVING: "resolving",
+        RemoteProgress.FINDING_SOURCES: "finding_sources",
+        RemoteProgress.CHECKING_OUT: "checking_out",
+    }
+
+    def __init__(self, job: Job):
+        super().__init__()
+        self.job = job
+        self._last = 0.0
+
+    def update(self, op_code, cur_count, max_count=None, message=""):
+        stage_end = bool(op_code & RemoteProgress.END)
+        now = time.monotonic()
+        if not stage_end and now - self._last < self.MIN_INTERVAL:
+            return
+        self._last = now
+        self.job.update(progress={
+            "stage": self._STAGES.get(op_code & RemoteProgress.OP_MASK, "unknown"),
+            "current": cur_count,
+            "total": max_count,
+            "message": message or "",
+        })
+
+
+class JobQueue:
+    """
+    プロジェクト単位で直列化するジョブキュー
+
+    同じプロジェクトのジョブは投入順に1件ずつ実行し、全体の同時実行数は
+    ワーカー数で制限する。待機中のジョブはワーカーを占有しない。
+    """
+
+    def __init__(self, max_workers: int = JOB_MAX_WORKERS, history_size: int = JOB_HISTORY_SIZE):
+        self.history_size = history_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mocotch-job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._pending: Dict[str, Deque[Callable[[], None]]] = {}
+        self._active: Set[str] = set()
+        self._project_locks: Dict[str, threading.RLock] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, project: str, func: Callable[[Job], Optional[Dict[str, Any]]]) -> Job:
+        """
+        ジョブを投入
+
+        func(job) の戻り値がジョブの結果になる。JobError（その他の例外も）を
+        送出した場合は失敗として記録する。
+        """
+        job = Job(kind, project)
+
+        def run():
+            self._run(job, func)
+
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim_history()
+            if project in self._active:
+                self._pending.setdefault(project, deque()).append(run)
+                logger.info(f"ジョブを待機列に追加: {kind} ({project}) {job.id}")
+                return job
+            self._active.add(project)
+
+        self._executor.submit(run)
+        logger.info(f"ジョブを開始: {kind} ({project}) {job.id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self, project: Optional[str] = None) -> List[Job]:
+        """ジョブ一覧（新しい順）"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        if project is not None:
+            jobs = [job for job in jobs if job.project == project]
+        return jobs[::-1]
+
+    def project_lock(self, project: str) -> threading.RLock:
+        """
+        プロジェクトの Git 操作を直列化するロック
+
+        ジョブの実行中は保持されるので、リクエスト内で Git 操作を行う処理も
+        このロックを取ってから実行する
+        """
+        with self._lock:
+            lock = self._project_locks.get(project)
+            if lock is None:
+                lock = self._project_locks[project] = threading.RLock()
+            return lock
+
+    @contextmanager
+    def acquire_project(self, project: str, timeout: float = PROJECT_LOCK_TIMEOUT) -> Iterator[None]:
+        """
+        リクエスト内で Git 操作を行うためにプロジェクトのロックを取る
+
+        実行中のジョブが timeout 秒以内に終わらなければ ProjectBusyError
+        （リクエストのスレッドが長いジョブの完了を待ち続けないようにする）
+        """
+        lock = self.project_lock(project)
+        if not lock.acquire(timeout=timeout):
+            raise ProjectBusyError(f"ジョブ実行中: {project}")
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def shutdown(self):
+        """待機中のジョブを破棄し、実行中のジョブの完了を待つ"""
+        with self._lock:
+            self._pending.clear()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _run(self, job: Job, func: Callable[[Job], Optional[Dict[str, Any]]]):
+        try:
+            with self.project_lock(job.project):
+                job.update(status=JOB_RUNNING, started_at=datetime.now().isoformat())
+                try:
+                    result = func(job)
+                    job.update(
+                        status=JOB_SUCCEEDED, result=result, finished_at=datetime.now().isoformat()
+                    )
+                    logger.info(f"ジョブ成功: {job.kind} ({job.project}) {job.id}")
+                except Exception as e:
+                    job.update(status=JOB_FAILED, error=str(e), finished_at=datetime.now().isoformat())
+                    logger.error(f"ジョブ失敗: {job.kind} ({job.project}) {job.id}: {e}")
+        finally:
+            self._start_next(job.project)
+
+    def _start_next(self, project: str):
+        with self._lock:
+            pending = self._pending.get(project)
+            if not pending:
+                self._pending.pop(project, None)
+                self._active.discard(project)
+                return
+            run = pending.popleft()
+        try:
+            self._executor.submit(run)
+        except RuntimeError:
+            # シャットダウン中
+            with self._lock:
+                self._active.discard(project)
+
+    def _trim_history(self):
+        """完了したジョブを古いものから捨てる（呼び出し側で _lock を保持）"""
+        excess = len(self._jobs) - self.history_size
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done][:excess]:
+            del self._jobs[job_id]
+
+
+# プロセス全体で共有するジョブキュー
+job_queue = JobQueue()
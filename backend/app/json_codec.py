@@ -0,0 +1,41 @@
+"""JSON の読み書き（orjson がインストールされていれば高速な実装を使う）"""
+import json
+import os
+from pathlib import Path
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    # orjson は任意の依存（なければ標準の json を使う）
+    orjson = None
+
+# プロジェクトファイルをインデントなしで保存する（差分は読みにくくなるがファイルが小さくなる）
+COMPACT_JSON = os.environ.get("MOCOTCH_COMPACT_JSON", "0").lower() in ("1", "true", "yes")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """JSON をパース"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """JSON を UTF-8 のバイト列にシリアライズ（indent=True なら2スペースでインデント）"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def read_file(path: Path) -> Any:
+    """JSON ファイルを読み込み"""
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def dump_file_bytes(obj: Any) -> bytes:
+    """プロジェクトファイルとして保存する形式にシリアライズ"""
+    return dumps(obj, indent=not COMPACT_JSON)
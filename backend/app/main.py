@@ -1,9 +1,16 @@
 """FastAPI メインアプリケーション - RPG制作・実行ツールバックエンド"""
+import asyncio
+import json
 import logging
+import mimetypes
+import uuid
+from contextlib import asynccontextmanager
+from email.utils import formatdate, parsedate_to_datetime
 from pathlib import Path
-from typing import List
-from fastapi import FastAPI, HTTPException, UploadFile, File
-from fastapi.responses import FileResponse
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
 from .models import (
@@ -12,13 +19,58 @@ from .models import (
     ProjectInfo,
     RPGProjectData,
     RPGProjectUpdate,
+    RPGProjectPatch,
     CommitRequest,
+    BulkCommitRequest,
     GitStatus,
+    CommitInfo,
     AssetInfo,
     SwitchBranch,
+    JobInfo,
+    PathBatchRequest,
+    PathResult,
+    LintReport,
+    EventFireRequest,
+    EventData,
+    PlaytestRequest,
 )
 from .git_service import GitService
-from .rpg_service import RPGService
+from .repo_pool import repo_pool
+from .rpg_service import RPGService, on_data_committed
+from .data_patch import PatchError, PatchTestFailed
+from .asset_service import (
+    ASSET_SIZE_LIMITS,
+    ASSET_TYPES,
+    AssetError,
+    AssetService,
+    AssetTooLarge,
+    UploadOffsetMismatch,
+)
+from .tile_codec import TILE_ENCODINGS, TileEncodingError, decode_document, encode_map
+from .project_registry import ProjectRegistry, SORT_KEYS
+from .project_template import ProjectTemplateCache
+from .autosave import autosave_buffer
+from .git_status import status_cache
+from .bulk_commit import bulk_commit
+from .job_queue import Job, JobError, JobProgress, ProjectBusyError, job_queue
+from .asset_index import ASSET_SORT_KEYS, flush_all_asset_indexes, get_asset_index
+from .asset_delivery import (
+    IMMUTABLE_CACHE_CONTROL,
+    AssetVariants,
+    accepted_encodings,
+    asset_etag,
+    asset_url,
+    asset_version,
+    is_compressible,
+)
+from .map_grid import MapGrid
+from .map_lint import LINT_ON_SAVE
+from .pathfinding import find_path, find_paths
+from .playtest import load_world, run_playtests, validate_route
+from .bundle import BundleBuilder, BundleError
+from .history import HistoryError, HistoryService
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, metrics
+from .collab import COLLAB_SNAPSHOT_INTERVAL, CollabError, collab_hub, parse_operations
 
 # ロギング設定
 logging.basicConfig(
@@ -27,7 +79,41 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Mocotch API", version="1.0.0")
+# プロジェクトのルートディレクトリ
+PROJECTS_DIR = Path("./projects")
+PROJECTS_DIR.mkdir(parents=True, exist_ok=True)
+
+# ジョブ購読（SSE）で状態の変化を確認する間隔と、変化がないときの keepalive 間隔（秒）
+JOB_EVENTS_POLL_INTERVAL = 0.25
+JOB_EVENTS_KEEPALIVE = 15.0
+
+# プロジェクト一覧レジストリ（起動時に構築）
+project_registry = ProjectRegistry(PROJECTS_DIR)
+
+
+def _refresh_registry(project_path: Path):
+    """ゲームデータの書き込み（自動保存を含む）で変わった更新日時を一覧に反映"""
+    if project_path.parent == PROJECTS_DIR:
+        project_registry.refresh(project_path.name)
+
+
+on_data_committed(_refresh_registry)
+# 新規プロジェクトの作成元になるテンプレートリポジトリ
+project_templates = ProjectTemplateCache(PROJECTS_DIR)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """起動・終了時の処理"""
+    project_registry.scan()
+    yield
+    autosave_buffer.flush_all()
+    job_queue.shutdown()
+    flush_all_asset_indexes()
+    repo_pool.close_all()
+
+
+app = FastAPI(title="Mocotch API", version="1.0.0", lifespan=lifespan)
 
 # CORS設定
 app.add_middleware(
@@ -36,11 +122,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "ETag", "Last-Modified"],
 )
+# リクエストの所要時間の計測（CORS の処理を含めるため最後に追加して一番外側にする）
+app.add_middleware(MetricsMiddleware)
 
-# プロジェクトのルートディレクトリ
-PROJECTS_DIR = Path("./projects")
-PROJECTS_DIR.mkdir(parents=True, exist_ok=True)
+
+def _is_not_modified(request: Request, etag: str, last_modified: Optional[float]) -> bool:
+    """If-None-Match / If-Modified-Since を確認して 304 を返せるか判定"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
 
 
 @app.get("/")
@@ -49,26 +152,38 @@ def read_root():
     return {"message": "Mocotch API is running", "version": "1.0.0"}
 
 
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus 形式のメトリクス（ルートごとのリクエスト時間、Git操作・ゲームデータの読み書きの時間、キャッシュのヒット数など）"""
+    return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.get("/api/projects", response_model=List[ProjectInfo])
-def list_projects():
-    """プロジェクト一覧を取得"""
-    try:
-        projects = []
-        for project_dir in PROJECTS_DIR.iterdir():
-            if project_dir.is_dir() and (project_dir / ".git").exists():
-                rpg_service = RPGService(project_dir)
-                meta = rpg_service.load_meta_data()
-
-                if meta:
-                    projects.append(ProjectInfo(**meta))
-                else:
-                    # メタデータがない場合はディレクトリ名から推測
-                    projects.append(ProjectInfo(
-                        name=project_dir.name,
-                        branch="unknown"
-                    ))
+def list_projects(
+    response: Response,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    sort: str = "updated_at",
+    order: str = "desc",
+):
+    """プロジェクト一覧を取得（総件数は X-Total-Count ヘッダーで返す）"""
+    try:
+        if sort not in SORT_KEYS:
+            raise HTTPException(status_code=400, detail="無効なソートキー")
+        if order not in ["asc", "desc"]:
+            raise HTTPException(status_code=400, detail="無効なソート順")
+
+        total, projects = project_registry.list_projects(
+            offset=offset,
+            limit=limit,
+            sort=sort,
+            descending=(order == "desc"),
+        )
+        response.headers["X-Total-Count"] = str(total)
 
-        return projects
+        return [ProjectInfo(**project) for project in projects]
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"プロジェクト一覧取得失敗: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -83,18 +198,23 @@ def init_project(req: ProjectInit):
         if project_path.exists():
             raise HTTPException(status_code=400, detail="プロジェクトが既に存在します")
 
-        # RPGプロジェクトデータを作成
-        rpg_service = RPGService(project_path)
-        if not rpg_service.create_default_project(req.name):
-            raise HTTPException(status_code=500, detail="プロジェクト作成失敗")
+        # テンプレートリポジトリから作成（失敗したら1から作成）
+        if not project_templates.create_project(project_path, req.name, req.branch):
+            logger.warning(f"テンプレートを使わずにプロジェクトを作成: {req.name}")
+
+            # RPGプロジェクトデータを作成
+            rpg_service = RPGService(project_path)
+            if not rpg_service.create_default_project(req.name):
+                raise HTTPException(status_code=500, detail="プロジェクト作成失敗")
 
-        # Git初期化
-        git_service = GitService(project_path, req.branch)
-        if not git_service.init_repo():
-            raise HTTPException(status_code=500, detail="Git初期化失敗")
+            # Git初期化
+            git_service = GitService(project_path, req.branch)
+            if not git_service.init_repo():
+                raise HTTPException(status_code=500, detail="Git初期化失敗")
 
-        # 初期コミット
-        git_service.commit_all("初期コミット: プロジェクト作成")
+            # 初期コミット
+            git_service.commit_all("初期コミット: プロジェクト作成")
+        project_registry.refresh(req.name)
 
         return {"message": "プロジェクト作成成功", "name": req.name}
     except HTTPException:
@@ -104,21 +224,34 @@ def init_project(req: ProjectInit):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/projects/clone")
+@app.post("/api/projects/clone", status_code=202)
 def clone_project(req: ProjectClone):
-    """既存プロジェクトをクローン"""
+    """既存プロジェクトをクローン（バックグラウンドジョブとして実行し、ジョブIDを返す）"""
     try:
         project_path = PROJECTS_DIR / req.name
 
-        if project_path.exists():
+        if project_path.exists() or any(
+            job.kind == "clone" and not job.done for job in job_queue.list_jobs(req.name)
+        ):
             raise HTTPException(status_code=400, detail="プロジェクトが既に存在します")
 
-        # Git クローン
-        git_service = GitService(project_path, req.branch)
-        if not git_service.clone_repo(req.repo_url):
-            raise HTTPException(status_code=500, detail="クローン失敗")
-
-        return {"message": "クローン成功", "name": req.name}
+        def run(job: Job):
+            # Git クローン
+            git_service = GitService(project_path, req.branch)
+            if not git_service.clone_repo(
+                req.repo_url,
+                progress=JobProgress(job),
+                depth=req.depth,
+                filter=req.filter,
+                sparse_paths=req.sparse_paths,
+            ):
+                raise JobError("クローン失敗")
+            project_registry.refresh(req.name)
+            return {"message": "クローン成功", "name": req.name}
+
+        job = job_queue.submit("clone", req.name, run)
+
+        return {"message": "クローン開始", "name": req.name, "job_id": job.id}
     except HTTPException:
         raise
     except Exception as e:
@@ -126,20 +259,26 @@ def clone_project(req: ProjectClone):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/projects/{name}/sync")
+@app.post("/api/projects/{name}/sync", status_code=202)
 def sync_project(name: str):
-    """プロジェクトを同期（git pull）"""
+    """プロジェクトを同期（git pull をバックグラウンドジョブとして実行し、ジョブIDを返す）"""
     try:
         project_path = PROJECTS_DIR / name
 
         if not project_path.exists():
             raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
 
-        git_service = GitService(project_path)
-        if not git_service.pull():
-            raise HTTPException(status_code=500, detail="同期失敗")
+        def run(job: Job):
+            git_service = GitService(project_path)
+            if not git_service.pull(progress=JobProgress(job)):
+                raise JobError("同期失敗")
+            collab_hub.reload(project_path)
+            project_registry.refresh(name)
+            return {"message": "同期成功"}
 
-        return {"message": "同期成功"}
+        job = job_queue.submit("pull", name, run)
+
+        return {"message": "同期開始", "job_id": job.id}
     except HTTPException:
         raise
     except Exception as e:
@@ -147,10 +286,68 @@ def sync_project(name: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/projects/{name}/unshallow", status_code=202)
+def unshallow_project(name: str):
+    """浅いクローンの履歴をすべて取得（バックグラウンドジョブとして実行し、ジョブIDを返す）"""
+    try:
+        project_path = PROJECTS_DIR / name
+
+        if not project_path.exists():
+            raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
+
+        def run(job: Job):
+            if not GitService(project_path).unshallow(progress=JobProgress(job)):
+                raise JobError("履歴の取得失敗")
+            return {"message": "履歴の取得成功"}
+
+        job = job_queue.submit("unshallow", name, run)
+
+        return {"message": "履歴の取得開始", "job_id": job.id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"履歴の取得失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/projects/{name}/hydrate", status_code=202)
+def hydrate_project(name: str):
+    """
+    部分クローン・sparse-checkout のプロジェクトの全ファイルを取得・展開
+    （バックグラウンドジョブとして実行し、ジョブIDを返す）
+    """
+    try:
+        project_path = PROJECTS_DIR / name
+
+        if not project_path.exists():
+            raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
+
+        def run(job: Job):
+            if not GitService(project_path).hydrate(progress=JobProgress(job)):
+                raise JobError("ハイドレート失敗")
+            return {"message": "ハイドレート成功"}
+
+        job = job_queue.submit("hydrate", name, run)
+
+        return {"message": "ハイドレート開始", "job_id": job.id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"ハイドレート失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/projects/{name}/data")
-def get_project_data(name: str):
-    """プロジェクトのゲームデータを取得"""
+def get_project_data(request: Request, name: str, tiles_encoding: Optional[str] = None):
+    """
+    プロジェクトのゲームデータを取得（tiles_encoding 指定時はタイルをエンコードして返す）
+
+    ETag / Last-Modified を付与し、変更がなければ 304 を返す
+    """
     try:
+        if tiles_encoding is not None and tiles_encoding not in TILE_ENCODINGS:
+            raise HTTPException(status_code=400, detail="無効なタイルエンコーディング")
+
         project_path = PROJECTS_DIR / name
 
         if not project_path.exists():
@@ -162,7 +359,15 @@ def get_project_data(name: str):
         if data is None:
             raise HTTPException(status_code=500, detail="データ読み込み失敗")
 
-        return data
+        body, etag = rpg_service.render_project_data(data, tiles_encoding)
+        last_modified = rpg_service.data_last_modified()
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if last_modified is not None:
+            headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+
+        if _is_not_modified(request, etag, last_modified):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
     except HTTPException:
         raise
     except Exception as e:
@@ -170,6 +375,165 @@ def get_project_data(name: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/projects/{name}/map/chunks")
+def get_map_chunks(
+    name: str,
+    x: int = 0,
+    y: int = 0,
+    width: int = Query(..., ge=1, le=4096),
+    height: int = Query(..., ge=1, le=4096),
+    tiles_encoding: Optional[str] = None,
+):
+    """指定した矩形範囲と重なるマップチャンクだけを取得"""
+    try:
+        if tiles_encoding is not None and tiles_encoding not in TILE_ENCODINGS:
+            raise HTTPException(status_code=400, detail="無効なタイルエンコーディング")
+
+        project_path = PROJECTS_DIR / name
+
+        if not project_path.exists():
+            raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
+
+        rpg_service = RPGService(project_path)
+        region = rpg_service.load_map_region(x, y, width, height)
+
+        if region is None:
+            raise HTTPException(status_code=500, detail="データ読み込み失敗")
+
+        if tiles_encoding:
+            region["chunks"] = [encode_map(chunk, tiles_encoding) for chunk in region["chunks"]]
+        return region
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"マップチャンク取得失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _load_map_grid(name: str, avoid_npcs: bool) -> MapGrid:
+    """経路探索用のグリッドを取得"""
+    project_path = PROJECTS_DIR / name
+
+    if not project_path.exists():
+        raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
+
+    rpg_service = RPGService(project_path)
+    data = rpg_service.load_project_data()
+
+    if data is None:
+        raise HTTPException(status_code=500, detail="データ読み込み失敗")
+
+    return rpg_service.map_grid(data, avoid_npcs)
+
+
+def _path_result(path: Optional[List[Tuple[int, int]]]) -> Dict[str, Any]:
+    if path is None:
+        return {"path": None, "length": None}
+    return {"path": [{"x": x, "y": y} for x, y in path], "length": len(path)}
+
+
+@app.get("/api/projects/{name}/map/path", response_model=PathResult)
+def get_map_path(
+    name: str,
+    start_x: int,
+    start_y: int,
+    goal_x: int,
+    goal_y: int,
+    avoid_npcs: bool = True,
+):
+    """2点間の最短経路を探索（上下左右の移動、木と水は通行不可）"""
+    try:
+        grid = _load_map_grid(name, avoid_npcs)
+        return _path_result(find_path(grid, (start_x, start_y), (goal_x, goal_y)))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"経路探索失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/projects/{name}/map/paths", response_model=List[PathResult])
+def get_map_paths(name: str, req: PathBatchRequest):
+    """
+    複数の経路をまとめて探索（結果はリクエストと同じ順）
+
+    同じ目的地への探索は目的地からの距離場を1回だけ計算して答える
+    """
+    try:
+        grid = _load_map_grid(name, req.avoid_npcs)
+        queries = [((q.start.x, q.start.y), (q.goal.x, q.goal.y)) for q in req.queries]
+        return [_path_result(path) for path in find_paths(grid, queries)]
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"経路探索失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/projects/{name}/events/fire", response_model=List[EventData])
+def fire_events(name: str, req: EventFireRequest):
+    """指定した座標・状態で発動するイベントを取得（ゲームデータでの定義順）"""
+    try:
+        project_path = PROJECTS_DIR / name
+
+        if not project_path.exists():
+            raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
+
+        rpg_service = RPGService(project_path)
+        data = rpg_service.load_project_data()
+
+        if data is None:
+            raise HTTPException(status_code=500, detail="データ読み込み失敗")
+
+        return rpg_service.event_engine(data).fire(req.trigger_type, req.x, req.y, req.state)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"イベント判定失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _lint_after_save(rpg_service: RPGService) -> Dict[str, Any]:
+    """保存したデータの検査結果（MOCOTCH_LINT_ON_SAVE が無効なら空）"""
+    if not LINT_ON_SAVE:
+        return {}
+    try:
+        data = rpg_service.load_project_data()
+        return {"lint": rpg_service.lint_project_data(data)} if data is not None else {}
+    except Exception as e:
+        # 検査に失敗しても保存は成功として返す
+        logger.error(f"マップ検査失敗: {e}")
+        return {}
+
+
+@app.get("/api/projects/{name}/lint", response_model=LintReport)
+def lint_project(name: str):
+    """
+    ゲームデータを検査
+
+    プレイヤーの開始位置・NPC・イベントの位置と到達可能性、到達できない領域、
+    ID の重複などを診断として返す
+    """
+    try:
+        project_path = PROJECTS_DIR / name
+
+        if not project_path.exists():
+            raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
+
+        rpg_service = RPGService(project_path)
+        data = rpg_service.load_project_data()
+
+        if data is None:
+            raise HTTPException(status_code=500, detail="データ読み込み失敗")
+
+        return rpg_service.lint_project_data(data)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"マップ検査失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.put("/api/projects/{name}/data")
 def update_project_data(name: str, req: RPGProjectUpdate):
     """プロジェクトのゲームデータを保存（自動保存）"""
@@ -179,11 +543,18 @@ def update_project_data(name: str, req: RPGProjectUpdate):
         if not project_path.exists():
             raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
 
+        try:
+            data = decode_document(req.data.model_dump())
+        except TileEncodingError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
         rpg_service = RPGService(project_path)
-        if not rpg_service.save_project_data(req.data.model_dump()):
+        if not rpg_service.save_project_data(data):
             raise HTTPException(status_code=500, detail="データ保存失敗")
+        # 共同編集中のエディターには全データを取得し直させる
+        collab_hub.reload(project_path)
 
-        return {"message": "データ保存成功"}
+        return {"message": "データ保存成功", **_lint_after_save(rpg_service)}
     except HTTPException:
         raise
     except Exception as e:
@@ -191,6 +562,130 @@ def update_project_data(name: str, req: RPGProjectUpdate):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.patch("/api/projects/{name}/data")
+def patch_project_data(name: str, req: RPGProjectPatch):
+    """プロジェクトのゲームデータを差分更新（自動保存）"""
+    try:
+        project_path = PROJECTS_DIR / name
+
+        if not project_path.exists():
+            raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
+
+        operations = [op.model_dump(by_alias=True, exclude_unset=True) for op in req.operations]
+
+        # 共同編集の操作ログに載せて、接続中のエディターにも配信する
+        try:
+            seq = collab_hub.session(project_path).apply(operations, client="http")
+        except CollabError:
+            raise HTTPException(status_code=500, detail="データ保存失敗")
+
+        return {"message": "データ保存成功", "applied": len(operations), "seq": seq}
+    except HTTPException:
+        raise
+    except PatchTestFailed as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except PatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"データ差分保存失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.websocket("/api/projects/{name}/collab")
+async def collab_socket(
+    websocket: WebSocket,
+    name: str,
+    since: Optional[int] = None,
+    epoch: Optional[str] = None,
+    client: Optional[str] = None,
+):
+    """
+    共同編集の WebSocket
+
+    接続すると hello（epoch・現在の連番・クライアントID）の後に、epoch と since（受信済みの連番）が
+    ログに残っている範囲なら抜けている操作を、そうでなければスナップショット（全データ）を送る。
+    クライアントは {"type": "op", "id", "operations": [...]}（PATCH /data と同じ操作）を送り、
+    サーバーは適用した操作に連番を振って送信元を含む全員に配信する。
+    """
+    project_path = PROJECTS_DIR / name
+    if not project_path.exists():
+        await websocket.close(code=4404, reason="プロジェクトが見つかりません")
+        return
+
+    await websocket.accept()
+    session = collab_hub.session(project_path)
+    client_id = client or uuid.uuid4().hex[:8]
+    try:
+        subscriber = await run_in_threadpool(
+            session.connect, asyncio.get_running_loop(), client_id, since, epoch,
+        )
+    except Exception as e:
+        logger.error(f"共同編集の接続失敗: {e}")
+        await websocket.close(code=1011)
+        return
+
+    async def send_messages():
+        try:
+            while True:
+                message = await subscriber.queue.get()
+                if message is None:
+                    # 送信が追いつかないので切断する（クライアントは since を付けて再接続）
+                    await websocket.close(code=1013, reason="送信待ちが多すぎます")
+                    return
+                await websocket.send_text(message)
+        except Exception:
+            # 切断済み（受信側のループで後始末する）
+            pass
+
+    sender = asyncio.create_task(send_messages())
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except json.JSONDecodeError:
+                subscriber.send(json.dumps({"type": "error", "message": "JSON ではありません"}, ensure_ascii=False))
+                continue
+            if not isinstance(message, dict):
+                continue
+
+            if message.get("type") == "ping":
+                subscriber.send(json.dumps({"type": "pong", "seq": session.seq}))
+            elif message.get("type") == "op":
+                try:
+                    operations = parse_operations(message.get("operations"))
+                    await run_in_threadpool(
+                        session.apply, operations, client_id, message.get("id"), COLLAB_SNAPSHOT_INTERVAL,
+                    )
+                except (CollabError, PatchError) as e:
+                    subscriber.send(json.dumps(
+                        {"type": "error", "id": message.get("id"), "message": str(e)}, ensure_ascii=False,
+                    ))
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"共同編集の処理失敗: {e}")
+    finally:
+        session.disconnect(subscriber)
+        sender.cancel()
+
+
+@app.get("/api/projects/{name}/collab")
+def get_collab_info(name: str):
+    """共同編集セッションの状態（epoch・現在の連番・ログの先頭・接続中のクライアント）"""
+    try:
+        project_path = PROJECTS_DIR / name
+
+        if not project_path.exists():
+            raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
+
+        return collab_hub.session(project_path).info()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"共同編集の状態取得失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/projects/{name}/status", response_model=GitStatus)
 def get_git_status(name: str):
     """Git状態を確認"""
@@ -201,15 +696,8 @@ def get_git_status(name: str):
             raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
 
         git_service = GitService(project_path)
-        has_changes, modified, untracked = git_service.get_status()
-        branch = git_service.get_current_branch()
-
-        return GitStatus(
-            has_uncommitted_changes=has_changes,
-            branch=branch,
-            modified_files=modified,
-            untracked_files=untracked
-        )
+
+        return GitStatus(**git_service.status())
     except HTTPException:
         raise
     except Exception as e:
@@ -217,26 +705,31 @@ def get_git_status(name: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/projects/{name}/commit")
+@app.post("/api/projects/{name}/commit", status_code=202)
 def commit_project(name: str, req: CommitRequest):
-    """変更をコミット・プッシュ"""
+    """変更をコミット・プッシュ（バックグラウンドジョブとして実行し、ジョブIDを返す）"""
     try:
         project_path = PROJECTS_DIR / name
 
         if not project_path.exists():
             raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
 
-        git_service = GitService(project_path)
+        def run(job: Job):
+            git_service = GitService(project_path)
+
+            # コミット
+            if not git_service.commit_all(req.message):
+                raise JobError("コミット失敗")
 
-        # コミット
-        if not git_service.commit_all(req.message):
-            raise HTTPException(status_code=500, detail="コミット失敗")
+            # プッシュ
+            if not git_service.push(progress=JobProgress(job)):
+                raise JobError("プッシュ失敗")
 
-        # プッシュ
-        if not git_service.push():
-            raise HTTPException(status_code=500, detail="プッシュ失敗")
+            return {"message": "コミット・プッシュ成功"}
 
-        return {"message": "コミット・プッシュ成功"}
+        job = job_queue.submit("push", name, run)
+
+        return {"message": "コミット・プッシュ開始", "job_id": job.id}
     except HTTPException:
         raise
     except Exception as e:
@@ -244,6 +737,249 @@ def commit_project(name: str, req: CommitRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/projects/bulk-commit", status_code=202)
+def bulk_commit_projects(req: BulkCommitRequest):
+    """
+    複数プロジェクトをまとめてコミット・プッシュ（バックグラウンドジョブとして実行し、ジョブIDを返す）
+
+    ジョブの結果にプロジェクトごとの成否を返す
+    """
+    try:
+        names = list(dict.fromkeys(req.projects))
+
+        def run(job: Job):
+            return bulk_commit(PROJECTS_DIR, names, req.message, job)
+
+        # 一括コミット同士は順番に実行する
+        job = job_queue.submit("bulk_commit", "*", run)
+
+        return {"message": "一括コミット開始", "projects": len(names), "job_id": job.id}
+    except Exception as e:
+        logger.error(f"一括コミット失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/projects/playtest", status_code=202)
+def playtest_projects(req: PlaytestRequest):
+    """
+    複数プロジェクトをテストプレイ（バックグラウンドジョブとして実行し、ジョブIDを返す）
+
+    シードごとのプレイはプロセスプールで並列に実行し、ジョブの結果にプロジェクトごとの
+    網羅率（訪れたタイル・話しかけた NPC・発動したイベント）と処理速度を返す
+    """
+    try:
+        if req.route is not None:
+            try:
+                validate_route(req.route)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        names = list(dict.fromkeys(req.projects))
+        missing = [name for name in names if not (PROJECTS_DIR / name).exists()]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"プロジェクトが見つかりません: {', '.join(missing)}")
+
+        def run(job: Job):
+            worlds, errors = [], {}
+            for name in names:
+                try:
+                    worlds.append(load_world(PROJECTS_DIR, name))
+                except Exception as e:
+                    errors[name] = str(e)
+            if not worlds:
+                raise JobError(f"読み込めるプロジェクトがありません: {errors}")
+
+            def progress(current: int, total: int, project: str):
+                job.update(progress={"stage": "playtest", "current": current, "total": total, "message": project})
+
+            seeds = range(req.seed, req.seed + req.runs)
+            report = run_playtests(worlds, seeds, req.steps, req.route, progress=progress)
+            report["errors"] = errors
+            return report
+
+        # テストプレイ同士は順番に実行する（プロセスプールを取り合わないように）
+        job = job_queue.submit("playtest", "*playtest", run)
+
+        return {"message": "テストプレイ開始", "projects": len(names), "job_id": job.id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"テストプレイ失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/projects/{name}/bundle", status_code=202)
+def build_bundle(name: str):
+    """
+    公開用のバンドルを作成（バックグラウンドジョブとして実行し、ジョブIDを返す）
+
+    前回のバンドルから変わったファイルだけを圧縮し直す
+    """
+    try:
+        project_path = PROJECTS_DIR / name
+
+        if not project_path.exists():
+            raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
+
+        def run(job: Job):
+            def progress(current: int, total: int, path: str):
+                job.update(progress={"stage": "encoding", "current": current, "total": total, "message": path})
+
+            try:
+                return BundleBuilder(project_path).build(progress=progress)
+            except BundleError as e:
+                raise JobError(str(e))
+
+        job = job_queue.submit("bundle", name, run)
+
+        return {"message": "バンドル作成開始", "job_id": job.id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"バンドル作成失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/projects/{name}/bundle")
+def get_bundle_manifest(request: Request, name: str):
+    """
+    バンドルのマニフェストを取得
+
+    各ファイルのパス・SHA-256・エンコーディング（gzip / identity）とパック内の位置（offset / length）を返す。
+    ETag はパックの名前で、作り直されていなければ 304 を返す
+    """
+    try:
+        project_path = PROJECTS_DIR / name
+
+        if not project_path.exists():
+            raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
+
+        manifest = BundleBuilder(project_path).manifest()
+        if manifest is None:
+            raise HTTPException(status_code=404, detail="バンドルが作成されていません")
+
+        etag = f'"{manifest["pack"]}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _is_not_modified(request, etag, None):
+            return Response(status_code=304, headers=headers)
+        return Response(content=json.dumps(manifest, ensure_ascii=False), media_type="application/json", headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"マニフェスト取得失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/projects/{name}/bundle/{pack}")
+def get_bundle_pack(name: str, pack: str):
+    """バンドルのパックファイルを取得（名前が内容で決まるので変更されない。Range リクエスト可）"""
+    try:
+        pack_path = BundleBuilder(PROJECTS_DIR / name).pack_path(pack)
+        if pack_path is None:
+            raise HTTPException(status_code=404, detail="パックが見つかりません")
+
+        return FileResponse(
+            pack_path,
+            media_type="application/octet-stream",
+            headers={"Cache-Control": "public, max-age=31536000, immutable"},
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"パック取得失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/projects/{name}/history", response_model=List[CommitInfo])
+def get_history(
+    name: str,
+    ref: Optional[str] = None,
+    limit: int = Query(default=50, ge=1, le=1000),
+    offset: int = Query(default=0, ge=0),
+):
+    """ゲームデータ（game.json とマップのチャンク）を変更したコミットの一覧（新しい順）"""
+    try:
+        project_path = PROJECTS_DIR / name
+
+        if not project_path.exists():
+            raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
+
+        return HistoryService(project_path).list_commits(ref, limit, offset)
+    except HistoryError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"履歴取得失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/projects/{name}/history/diff")
+def get_history_diff(name: str, base: str, target: str = "HEAD"):
+    """
+    2つのコミットのゲームデータの構造的な差分
+
+    タイルは変わったセルを矩形（set_tiles_rect と同じ形）にまとめ、NPC とイベントは
+    ID ごとに追加・削除・変更を返す。結果はコミットの SHA の組でキャッシュする
+    """
+    try:
+        project_path = PROJECTS_DIR / name
+
+        if not project_path.exists():
+            raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
+
+        history = HistoryService(project_path)
+        base_sha = history.resolve(base)
+        target_sha = history.resolve(target)
+
+        return {"base": base_sha, "target": target_sha, **history.diff(base_sha, target_sha)}
+    except HistoryError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"差分取得失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/projects/{name}/history/{ref}/data")
+def get_history_data(request: Request, name: str, ref: str, tiles_encoding: Optional[str] = None):
+    """
+    コミット時点のゲームデータを取得（形式は GET /data と同じ）
+
+    SHA で指定した場合は内容が変わらないので、長期間キャッシュさせる
+    """
+    try:
+        if tiles_encoding is not None and tiles_encoding not in TILE_ENCODINGS:
+            raise HTTPException(status_code=400, detail="無効なタイルエンコーディング")
+
+        project_path = PROJECTS_DIR / name
+
+        if not project_path.exists():
+            raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
+
+        history = HistoryService(project_path)
+        sha = history.resolve(ref)
+        body = history.document_body(sha, tiles_encoding)
+
+        etag = f'"{sha}-{tiles_encoding or "json"}"'
+        immutable = ref == sha
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "public, max-age=31536000, immutable" if immutable else "no-cache",
+        }
+        if _is_not_modified(request, etag, None):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+    except HistoryError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"履歴データ取得失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/api/projects/{name}/discard")
 def discard_changes(name: str):
     """未コミットの変更を破棄"""
@@ -253,11 +989,15 @@ def discard_changes(name: str):
         if not project_path.exists():
             raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
 
-        git_service = GitService(project_path)
-        if not git_service.discard_changes():
-            raise HTTPException(status_code=500, detail="変更破棄失敗")
+        with job_queue.acquire_project(name):
+            git_service = GitService(project_path)
+            if not git_service.discard_changes():
+                raise HTTPException(status_code=500, detail="変更破棄失敗")
+            collab_hub.reload(project_path)
 
         return {"message": "変更破棄成功"}
+    except ProjectBusyError:
+        raise HTTPException(status_code=409, detail="ジョブ実行中")
     except HTTPException:
         raise
     except Exception as e:
@@ -274,11 +1014,15 @@ def switch_branch(name: str, req: SwitchBranch):
         if not project_path.exists():
             raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
 
-        git_service = GitService(project_path)
-        if not git_service.switch_branch(req.branch):
-            raise HTTPException(status_code=500, detail="ブランチ切替失敗")
+        with job_queue.acquire_project(name):
+            git_service = GitService(project_path)
+            if not git_service.switch_branch(req.branch):
+                raise HTTPException(status_code=500, detail="ブランチ切替失敗")
+            collab_hub.reload(project_path)
 
         return {"message": "ブランチ切替成功", "branch": req.branch}
+    except ProjectBusyError:
+        raise HTTPException(status_code=409, detail="ジョブ実行中")
     except HTTPException:
         raise
     except Exception as e:
@@ -286,22 +1030,93 @@ def switch_branch(name: str, req: SwitchBranch):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/jobs", response_model=List[JobInfo])
+def list_jobs(project: Optional[str] = None):
+    """ジョブ一覧を取得（新しい順）"""
+    return [JobInfo(**job.to_dict()) for job in job_queue.list_jobs(project)]
+
+
+@app.get("/api/jobs/{job_id}", response_model=JobInfo)
+def get_job(job_id: str):
+    """ジョブの状態・進捗・結果を取得"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    return JobInfo(**job.to_dict())
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def subscribe_job(job_id: str):
+    """ジョブの状態が変わるたびに Server-Sent Events で通知（完了したら終了）"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+
+    async def events():
+        version = -1
+        idle = 0.0
+        while True:
+            if job.version != version:
+                version = job.version
+                idle = 0.0
+                yield f"data: {json.dumps(job.to_dict(), ensure_ascii=False)}\n\n"
+                if job.done:
+                    return
+            elif idle >= JOB_EVENTS_KEEPALIVE:
+                idle = 0.0
+                yield ": keepalive\n\n"
+            await asyncio.sleep(JOB_EVENTS_POLL_INTERVAL)
+            idle += JOB_EVENTS_POLL_INTERVAL
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
 @app.get("/api/projects/{name}/assets/{asset_type}", response_model=List[AssetInfo])
-def list_assets(name: str, asset_type: str):
-    """アセット一覧を取得"""
+def list_assets(
+    name: str,
+    asset_type: str,
+    response: Response,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    prefix: Optional[str] = None,
+    sort: str = "filename",
+    order: str = "asc",
+):
+    """
+    アセット一覧を取得（総件数は X-Total-Count ヘッダーで返す）
+
+    url は内容のハッシュを含むダウンロード用の URL（長期間キャッシュできる）
+    """
     try:
-        if asset_type not in ["images", "sounds", "movies"]:
+        if asset_type not in ASSET_TYPES:
             raise HTTPException(status_code=400, detail="無効なアセットタイプ")
+        if sort not in ASSET_SORT_KEYS:
+            raise HTTPException(status_code=400, detail="無効なソートキー")
+        if order not in ["asc", "desc"]:
+            raise HTTPException(status_code=400, detail="無効なソート順")
 
         project_path = PROJECTS_DIR / name
 
         if not project_path.exists():
             raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
 
-        rpg_service = RPGService(project_path)
-        assets = rpg_service.get_assets(asset_type)
-
-        return [AssetInfo(**asset) for asset in assets]
+        total, assets = get_asset_index(project_path).list_assets(
+            asset_type,
+            offset=offset,
+            limit=limit,
+            prefix=prefix,
+            sort=sort,
+            descending=(order == "desc"),
+        )
+        response.headers["X-Total-Count"] = str(total)
+
+        return [
+            AssetInfo(
+                **asset,
+                url=asset_url(name, asset_type, asset["filename"], asset["sha256"]) if asset["sha256"] else None,
+            )
+            for asset in assets
+        ]
     except HTTPException:
         raise
     except Exception as e:
@@ -310,10 +1125,10 @@ def list_assets(name: str, asset_type: str):
 
 
 @app.post("/api/projects/{name}/assets/{asset_type}")
-async def upload_asset(name: str, asset_type: str, file: UploadFile = File(...)):
-    """アセットをアップロード"""
+def upload_asset(name: str, asset_type: str, file: UploadFile = File(...)):
+    """アセットをアップロード（一時ファイルへチャンク単位でコピーしてから配置）"""
     try:
-        if asset_type not in ["images", "sounds", "movies"]:
+        if asset_type not in ASSET_TYPES:
             raise HTTPException(status_code=400, detail="無効なアセットタイプ")
 
         project_path = PROJECTS_DIR / name
@@ -321,39 +1136,200 @@ async def upload_asset(name: str, asset_type: str, file: UploadFile = File(...))
         if not project_path.exists():
             raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
 
-        # アセットを保存
-        asset_dir = project_path / "assets" / asset_type
-        asset_dir.mkdir(parents=True, exist_ok=True)
+        if file.size is not None and file.size > ASSET_SIZE_LIMITS[asset_type]:
+            raise HTTPException(status_code=413, detail="ファイルサイズが上限を超えています")
 
-        file_path = asset_dir / file.filename
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        asset_service = AssetService(project_path)
+        upload = asset_service.save_fileobj(asset_type, file.filename, file.file)
+        get_asset_index(project_path).update(asset_type, file.filename, upload.sha256)
+        status_cache.invalidate(project_path)
 
         return {"message": "アップロード成功", "filename": file.filename}
     except HTTPException:
         raise
+    except AssetTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except AssetError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"アップロード失敗: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.put("/api/projects/{name}/assets/{asset_type}/{filename}")
+async def put_asset(
+    request: Request,
+    name: str,
+    asset_type: str,
+    filename: str,
+    offset: int = Query(0, ge=0),
+    complete: bool = True,
+):
+    """
+    リクエストボディをそのままアセットとしてストリーミング保存
+
+    offset と complete を指定すると分割・再開アップロードになる
+    （complete=false の間は受信済みのバイト数を返し、最後に complete=true で配置）。
+    X-Content-SHA256 ヘッダーを付けると、ストアに同じ内容がある場合は
+    ボディを受信せずに配置し、ない場合は受信した内容のハッシュを検証する。
+    """
+    try:
+        project_path = PROJECTS_DIR / name
+
+        if not project_path.exists():
+            raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
+
+        asset_service = AssetService(project_path)
+        asset_service.validate(asset_type, filename)
+
+        content_length = request.headers.get("content-length")
+        if content_length and offset + int(content_length) > ASSET_SIZE_LIMITS[asset_type]:
+            raise HTTPException(status_code=413, detail="ファイルサイズが上限を超えています")
+
+        expected_sha256 = request.headers.get("x-content-sha256")
+        resumable = offset > 0 or not complete
+        if expected_sha256 and not resumable:
+            size = await run_in_threadpool(asset_service.link_existing, asset_type, filename, expected_sha256)
+            if size is not None:
+                await run_in_threadpool(
+                    get_asset_index(project_path).update, asset_type, filename, expected_sha256.lower()
+                )
+                status_cache.invalidate(project_path)
+                return {"message": "アップロード成功", "filename": filename, "size": size, "deduplicated": True}
+
+        if resumable:
+            upload = await run_in_threadpool(asset_service.resume_upload, asset_type, filename, offset)
+        else:
+            upload = await run_in_threadpool(asset_service.open_upload, asset_type, filename)
+
+        try:
+            async for chunk in request.stream():
+                if chunk:
+                    await run_in_threadpool(upload.write, chunk)
+            if not complete:
+                await run_in_threadpool(upload.close)
+                return {"message": "受信中", "filename": filename, "offset": upload.size}
+            size = await run_in_threadpool(upload.commit, expected_sha256)
+        except BaseException:
+            # 上限超過や切断時、再開アップロードは受信済み分を残す
+            if resumable:
+                await run_in_threadpool(upload.close)
+            else:
+                await run_in_threadpool(upload.abort)
+            raise
+
+        await run_in_threadpool(get_asset_index(project_path).update, asset_type, filename, upload.sha256)
+        status_cache.invalidate(project_path)
+        return {"message": "アップロード成功", "filename": filename, "size": size}
+    except HTTPException:
+        raise
+    except UploadOffsetMismatch as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "offset": e.offset})
+    except AssetTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except AssetError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"アップロード失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/projects/{name}/assets/{asset_type}/{filename}/upload")
+def get_upload_offset(name: str, asset_type: str, filename: str):
+    """再開アップロードの受信済みバイト数を取得"""
+    try:
+        project_path = PROJECTS_DIR / name
+
+        if not project_path.exists():
+            raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
+
+        offset = AssetService(project_path).upload_offset(asset_type, filename)
+        return {"filename": filename, "offset": offset}
+    except HTTPException:
+        raise
+    except AssetError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"アップロード状態取得失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.delete("/api/projects/{name}/assets/{asset_type}/{filename}/upload")
+def abort_upload(name: str, asset_type: str, filename: str):
+    """再開アップロードを破棄"""
+    try:
+        project_path = PROJECTS_DIR / name
+
+        if not project_path.exists():
+            raise HTTPException(status_code=404, detail="プロジェクトが見つかりません")
+
+        AssetService(project_path).abort_upload(asset_type, filename)
+        return {"message": "アップロード破棄成功", "filename": filename}
+    except HTTPException:
+        raise
+    except AssetError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"アップロード破棄失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/projects/{name}/assets/{asset_type}/{filename}")
-def download_asset(name: str, asset_type: str, filename: str):
-    """アセットをダウンロード"""
+def download_asset(request: Request, name: str, asset_type: str, filename: str, v: Optional[str] = None):
+    """
+    アセットをダウンロード
+
+    ETag は内容の SHA-256 で、変わっていなければ 304 を返す。v（一覧の url に含まれる
+    内容のハッシュ）を指定した場合は immutable でキャッシュさせ、内容が変わっていれば
+    現在の URL へリダイレクトする。圧縮済みでない形式は Accept-Encoding に応じて
+    brotli / gzip 版を返す（Range リクエストには元のファイルを返す）
+    """
     try:
-        if asset_type not in ["images", "sounds", "movies"]:
+        if asset_type not in ASSET_TYPES:
             raise HTTPException(status_code=400, detail="無効なアセットタイプ")
 
         project_path = PROJECTS_DIR / name
-        file_path = project_path / "assets" / asset_type / filename
+        file_path = AssetService(project_path).asset_path(asset_type, filename)
 
         if not file_path.exists():
-            raise HTTPException(status_code=404, detail="ファイルが見つかりません")
-
-        return FileResponse(file_path)
+            # sparse-checkout で展開していないファイルはリポジトリから取得する
+            blob_path = None
+            if project_path.exists():
+                rel_path = file_path.relative_to(project_path).as_posix()
+                blob_path = GitService(project_path).materialize_blob(rel_path)
+            if blob_path is None:
+                raise HTTPException(status_code=404, detail="ファイルが見つかりません")
+            return FileResponse(blob_path, filename=filename, content_disposition_type="inline")
+
+        asset = get_asset_index(project_path).get(asset_type, filename)
+        if asset is None or not asset["sha256"]:
+            return FileResponse(file_path)
+
+        sha256 = asset["sha256"]
+        if v is not None and v != asset_version(sha256):
+            return RedirectResponse(
+                asset_url(name, asset_type, filename, sha256), status_code=302, headers={"Cache-Control": "no-cache"}
+            )
+
+        headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL if v is not None else "no-cache"}
+        path, encoding = file_path, None
+        if is_compressible(filename):
+            headers["Vary"] = "Accept-Encoding"
+            if "range" not in request.headers:
+                path, encoding = AssetVariants(project_path).select(
+                    file_path, sha256, asset["size"], accepted_encodings(request.headers.get("accept-encoding"))
+                )
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        headers["ETag"] = asset_etag(sha256, encoding)
+
+        if _is_not_modified(request, headers["ETag"], None):
+            return Response(status_code=304, headers=headers)
+        return FileResponse(path, headers=headers, media_type=mimetypes.guess_type(filename)[0] or "application/octet-stream")
     except HTTPException:
         raise
+    except AssetError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"ダウンロード失敗: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -363,20 +1339,24 @@ def download_asset(name: str, asset_type: str, filename: str):
 def delete_asset(name: str, asset_type: str, filename: str):
     """アセットを削除"""
     try:
-        if asset_type not in ["images", "sounds", "movies"]:
+        if asset_type not in ASSET_TYPES:
             raise HTTPException(status_code=400, detail="無効なアセットタイプ")
 
         project_path = PROJECTS_DIR / name
-        file_path = project_path / "assets" / asset_type / filename
+        file_path = AssetService(project_path).asset_path(asset_type, filename)
 
         if not file_path.exists():
             raise HTTPException(status_code=404, detail="ファイルが見つかりません")
 
         file_path.unlink()
+        get_asset_index(project_path).remove(asset_type, filename)
+        status_cache.invalidate(project_path)
 
         return {"message": "削除成功", "filename": filename}
     except HTTPException:
         raise
+    except AssetError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"削除失敗: {e}")
         raise HTTPException(status_code=500, detail=str(e))
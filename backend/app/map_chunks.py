@@ -0,0 +1,92 @@
+"""マップのチャンク分割"""
+import os
+import re
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+# チャンク1辺のタイル数（デフォルト）
+DEFAULT_CHUNK_SIZE = int(os.environ.get("MOCOTCH_CHUNK_SIZE", "32"))
+# このタイル数を超えるマップは保存時に自動でチャンク形式にする（未設定なら chunk_size を指定したマップだけ）
+# game.json からタイルが map/ に移り、game.json だけを読むツールでは読めなくなるため既定では無効
+_CHUNK_THRESHOLD = os.environ.get("MOCOTCH_CHUNK_THRESHOLD")
+CHUNK_THRESHOLD_TILES: Optional[int] = int(_CHUNK_THRESHOLD) if _CHUNK_THRESHOLD else None
+
+_CHUNK_FILE_PATTERN = re.compile(r"^(\d+)_(\d+)\.json$")
+
+
+def is_chunked(map_data: Optional[Dict[str, Any]]) -> bool:
+    """チャンク形式で保存するマップかどうか"""
+    return bool(map_data and map_data.get("chunk_size"))
+
+
+def with_auto_chunking(map_data: Dict[str, Any]) -> Dict[str, Any]:
+    """大きなマップにはデフォルトのチャンクサイズを設定（MOCOTCH_CHUNK_THRESHOLD を設定した場合のみ）"""
+    if is_chunked(map_data) or CHUNK_THRESHOLD_TILES is None:
+        return map_data
+    if map_data.get("width", 0) * map_data.get("height", 0) > CHUNK_THRESHOLD_TILES:
+        return {**map_data, "chunk_size": DEFAULT_CHUNK_SIZE}
+    return map_data
+
+
+def chunk_filename(cx: int, cy: int) -> str:
+    """チャンクのファイル名"""
+    return f"{cx}_{cy}.json"
+
+
+def parse_chunk_filename(filename: str) -> Optional[Tuple[int, int]]:
+    """チャンクのファイル名からチャンク座標を取得"""
+    match = _CHUNK_FILE_PATTERN.match(filename)
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def chunk_bounds(cx: int, cy: int, chunk_size: int, width: int, height: int) -> Tuple[int, int, int, int]:
+    """チャンクのタイル範囲 (x, y, width, height)。マップ端のチャンクは小さくなる"""
+    x, y = cx * chunk_size, cy * chunk_size
+    return x, y, min(chunk_size, width - x), min(chunk_size, height - y)
+
+
+def all_chunks(chunk_size: int, width: int, height: int) -> Iterator[Tuple[int, int]]:
+    """マップ全体を覆うチャンク座標"""
+    return chunks_in_rect(0, 0, width, height, chunk_size, width, height)
+
+
+def chunks_in_rect(
+    x: int, y: int, rect_width: int, rect_height: int,
+    chunk_size: int, width: int, height: int,
+) -> Iterator[Tuple[int, int]]:
+    """矩形範囲（マップ範囲でクリップ）と重なるチャンク座標"""
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + rect_width, width), min(y + rect_height, height)
+    if x0 >= x1 or y0 >= y1:
+        return iter(())
+    return (
+        (cx, cy)
+        for cy in range(y0 // chunk_size, (y1 - 1) // chunk_size + 1)
+        for cx in range(x0 // chunk_size, (x1 - 1) // chunk_size + 1)
+    )
+
+
+def slice_chunk(tiles: List[List[int]], cx: int, cy: int, chunk_size: int, width: int, height: int) -> List[List[int]]:
+    """タイル配列からチャンク部分を切り出し"""
+    x, y, w, h = chunk_bounds(cx, cy, chunk_size, width, height)
+    return [row[x:x + w] for row in tiles[y:y + h]]
+
+
+def changed_chunks(
+    tiles: List[List[int]], previous: List[List[int]], chunk_size: int, width: int, height: int,
+) -> Set[Tuple[int, int]]:
+    """前回のタイル配列と比べて内容が変わったチャンク座標"""
+    changed = set()
+    columns = range(0, width, chunk_size)
+    for y in range(height):
+        row, previous_row = tiles[y], previous[y]
+        # 差分操作で変更されていない行は同じオブジェクトを共有している
+        if row is previous_row or row == previous_row:
+            continue
+        cy = y // chunk_size
+        for x in columns:
+            cx = x // chunk_size
+            if (cx, cy) not in changed and row[x:x + chunk_size] != previous_row[x:x + chunk_size]:
+                changed.add((cx, cy))
+    return changed
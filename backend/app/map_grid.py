@@ -0,0 +1,183 @@
+"""マップのタイルを NumPy 配列として扱う通行判定・連結成分・距離場"""
+import hashlib
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+# 通行できないタイル（TileType の TREE / WATER。フロントエンドの canMoveTo と同じ）
+BLOCKED_TILES = (2, 3)
+
+# 到達できないセルの距離
+UNREACHABLE = -1
+
+
+def tile_array(map_data: Dict[str, Any]) -> np.ndarray:
+    """マップのタイルを (height, width) の配列に変換"""
+    tiles = np.asarray(map_data["tiles"], dtype=np.int32)
+    if tiles.shape != (map_data["height"], map_data["width"]):
+        raise ValueError(f"タイル配列のサイズが不正です: {tiles.shape}")
+    return tiles
+
+
+class MapGrid:
+    """
+    通行判定用のグリッド
+
+    周囲を通行不可のセルで1マス囲んだ (height + 2) x (width + 2) の配列を1次元で持ち、
+    隣接セルを添字の加算（上下 ±stride、左右 ±1）だけで求められるようにする。
+    blocked に指定した座標（NPC の位置など）も通行不可として扱う。
+    """
+
+    def __init__(self, tiles: np.ndarray, blocked: Iterable[Tuple[int, int]] = ()):
+        self.height, self.width = tiles.shape
+        self.stride = self.width + 2
+        # 上・下・左・右（フロントエンドの探索順と同じ）
+        self.offsets = np.array([-self.stride, self.stride, -1, 1], dtype=np.int64)
+
+        self.tiles = tiles
+
+        walkable = np.zeros((self.height + 2, self.width + 2), dtype=bool)
+        walkable[1:-1, 1:-1] = ~np.isin(tiles, BLOCKED_TILES)
+        # 地形だけで見た通行可否（blocked を反映する前）
+        self.terrain = walkable.ravel().copy()
+        for x, y in blocked:
+            if self.in_bounds(x, y):
+                walkable[y + 1, x + 1] = False
+        self.walkable = walkable.ravel()
+        # Python のループから参照する用（NumPy の要素アクセスより速い）
+        self.cells = self.walkable.tobytes()
+        # 通行可否が同じグリッドは同じキーになる（距離場のキャッシュキー）
+        self.key = hashlib.blake2b(
+            f"{self.width}x{self.height}".encode() + self.cells, digest_size=16
+        ).hexdigest()
+        self._components: Optional[np.ndarray] = None
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def index(self, x: int, y: int) -> int:
+        """座標を1次元の添字に変換"""
+        return (y + 1) * self.stride + x + 1
+
+    def position(self, index: int) -> Tuple[int, int]:
+        """1次元の添字を座標に変換"""
+        y, x = divmod(index, self.stride)
+        return x - 1, y - 1
+
+    def positions(self, indices: List[int]) -> List[Tuple[int, int]]:
+        """1次元の添字の列をまとめて座標に変換"""
+        y, x = np.divmod(np.asarray(indices, dtype=np.int64), self.stride)
+        return list(zip((x - 1).tolist(), (y - 1).tolist()))
+
+    def is_walkable(self, x: int, y: int) -> bool:
+        return self.in_bounds(x, y) and bool(self.cells[self.index(x, y)])
+
+    def interior(self, values: np.ndarray) -> np.ndarray:
+        """1次元の配列から周囲の枠を除いた (height, width) の配列を取り出す"""
+        return values.reshape(self.height + 2, self.stride)[1:-1, 1:-1]
+
+    def components(self) -> np.ndarray:
+        """
+        通行可能なセルの連結成分のラベル（1次元、通行不可は -1）
+
+        各行の連続した通行可能セル（ラン）に番号を付け、上下に接するランの組を
+        ベクトル演算でまとめて併合する（最小ラベルの伝播とポインタジャンプ）
+        """
+        if self._components is not None:
+            return self._components
+
+        walkable = self.walkable
+        # 左隣が通行不可のセルがランの先頭（枠があるので行をまたがない）
+        starts = walkable & ~np.roll(walkable, 1)
+        run_ids = np.cumsum(starts, dtype=np.int64) - 1
+        run_count = int(starts.sum())
+
+        # 上下に接するランの組
+        below = np.flatnonzero(walkable[:-self.stride] & walkable[self.stride:])
+        pairs = np.unique(run_ids[below] * run_count + run_ids[below + self.stride])
+        upper, lower = np.divmod(pairs, max(run_count, 1))
+
+        labels = np.arange(run_count, dtype=np.int64)
+        while upper.size:
+            a, b = labels[upper], labels[lower]
+            pending = a != b
+            if not pending.any():
+                break
+            a, b = a[pending], b[pending]
+            upper, lower = upper[pending], lower[pending]
+            low = np.minimum(a, b)
+            np.minimum.at(labels, a, low)
+            np.minimum.at(labels, b, low)
+            while True:
+                jumped = labels[labels]
+                if np.array_equal(jumped, labels):
+                    break
+                labels = jumped
+
+        # 成分ごとに 0 からの番号を振り直す
+        _, labels = np.unique(labels, return_inverse=True)
+        components = np.full(walkable.size, -1, dtype=np.int32)
+        components[walkable] = labels[run_ids[walkable]]
+        self._components = components
+        return components
+
+    def components_from(self, index: int) -> Set[int]:
+        """セルから入れる連結成分（通行不可のセルは隣接セルの成分）"""
+        components = self.components()
+        if components[index] >= 0:
+            return {int(components[index])}
+        return {int(label) for label in components[index + self.offsets] if label >= 0}
+
+    def distance_field(self, target: int) -> np.ndarray:
+        """
+        target までの歩数（1次元、到達できなければ UNREACHABLE）
+
+        幅優先探索の各段をベクトル演算でまとめて展開する
+        """
+        distances = np.full(self.walkable.size, UNREACHABLE, dtype=np.int32)
+        if not self.walkable[target]:
+            return distances
+
+        unvisited = self.walkable.copy()
+        unvisited[target] = False
+        distances[target] = 0
+        frontier = np.array([target], dtype=np.int64)
+        step = 0
+        while frontier.size:
+            step += 1
+            neighbors = (frontier[:, None] + self.offsets).ravel()
+            neighbors = np.unique(neighbors[unvisited[neighbors]])
+            unvisited[neighbors] = False
+            distances[neighbors] = step
+            frontier = neighbors
+        return distances
+
+    def path_from_field(self, distances: np.ndarray, start: int) -> Optional[List[int]]:
+        """
+        距離場を下りて start から target までの経路を求める
+
+        Returns:
+            経路のセル（start を含まず target を含む）。到達できなければ None
+        """
+        # NumPy の要素アクセスは遅いので memoryview 経由で Python の int として読む
+        values = memoryview(distances)
+        offsets = [int(offset) for offset in self.offsets]
+        current = start
+        remaining = values[start]
+        if remaining == UNREACHABLE:
+            # 通行不可のセル（NPC 自身の位置など）からは隣接セルの距離を使う
+            reachable = [values[start + offset] for offset in offsets]
+            reachable = [d for d in reachable if d != UNREACHABLE]
+            if not reachable:
+                return None
+            remaining = min(reachable) + 1
+
+        path = []
+        while remaining > 0:
+            for offset in offsets:
+                if values[current + offset] == remaining - 1:
+                    current += offset
+                    break
+            path.append(current)
+            remaining -= 1
+        return path
@@ -0,0 +1,255 @@
+"""ゲームデータのマップ検査（到達可能性・範囲外・重複など）"""
+import os
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from .event_engine import TRIGGER_TYPES, ConditionError, compile_condition
+from .map_grid import MapGrid
+
+# PUT での保存のたびに検査して結果をレスポンスに含める（既定は無効。GET /lint は結果をキャッシュする）
+LINT_ON_SAVE = os.environ.get("MOCOTCH_LINT_ON_SAVE", "0").lower() in ("1", "true", "yes")
+
+# タイルの種類（TileType の GRASS / ROAD / TREE / WATER）
+TILE_TYPES = (0, 1, 2, 3)
+# 到達できない領域を個別に報告する件数（大きい順）
+MAX_REGION_DIAGNOSTICS = 20
+
+SEVERITY_ERROR = "error"
+SEVERITY_WARNING = "warning"
+SEVERITY_INFO = "info"
+
+
+def _diagnostic(severity: str, code: str, message: str, **fields) -> Dict[str, Any]:
+    return {"severity": severity, "code": code, "message": message, **fields}
+
+
+def lint_document(doc: Dict[str, Any], grid_factory: Callable[[], MapGrid]) -> Dict[str, Any]:
+    """
+    ゲームデータを検査して診断結果を返す
+
+    grid_factory は NPC の位置を通行不可にしたグリッドを返す（到達可能性は
+    実際の移動と同じく NPC を避けて判定する）。NPC やイベントは隣接するタイルに
+    到達できれば話しかけられる・調べられるものとして扱う。
+
+    Returns:
+        ok（エラーがない）・errors・warnings・diagnostics・stats を持つ辞書
+    """
+    started = time.perf_counter()
+    diagnostics: List[Dict[str, Any]] = []
+    stats: Dict[str, Any] = {}
+
+    npcs = doc.get("npcs") or []
+    events = doc.get("events") or []
+    diagnostics += _duplicate_ids(npcs, "npcs", "NPC")
+    diagnostics += _duplicate_ids(events, "events", "イベント")
+    diagnostics += _check_events(events)
+
+    try:
+        grid = grid_factory()
+    except (KeyError, TypeError, ValueError) as e:
+        diagnostics.append(_diagnostic(SEVERITY_ERROR, "invalid_map", f"マップを読み込めません: {e}"))
+        grid = None
+
+    if grid is not None:
+        diagnostics += _check_tiles(grid.tiles)
+        diagnostics += _check_positions(grid, doc.get("player") or {}, npcs, events, stats)
+
+    stats["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    errors = sum(1 for d in diagnostics if d["severity"] == SEVERITY_ERROR)
+    warnings = sum(1 for d in diagnostics if d["severity"] == SEVERITY_WARNING)
+    return {
+        "ok": errors == 0,
+        "errors": errors,
+        "warnings": warnings,
+        "diagnostics": diagnostics,
+        "stats": stats,
+    }
+
+
+def _duplicate_ids(items: List[Dict[str, Any]], target: str, label: str) -> List[Dict[str, Any]]:
+    counts = Counter(item.get("id") for item in items)
+    return [
+        _diagnostic(SEVERITY_ERROR, f"duplicate_{target[:-1]}_id", f"{label}の ID が重複しています: {item_id}",
+                    target=f"{target}/{item_id}")
+        for item_id, count in counts.items() if count > 1
+    ]
+
+
+def _check_events(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """トリガーの種類と条件式"""
+    diagnostics = []
+    for event in events:
+        target = f"events/{event.get('id')}"
+        if event.get("trigger_type") not in TRIGGER_TYPES:
+            diagnostics.append(_diagnostic(
+                SEVERITY_WARNING, "unknown_trigger_type", f"未知のトリガーの種類です: {event.get('trigger_type')}",
+                target=target,
+            ))
+        source = event.get("condition")
+        if source and source.strip():
+            try:
+                compile_condition(source)
+            except ConditionError as e:
+                diagnostics.append(_diagnostic(SEVERITY_ERROR, "invalid_event_condition", str(e), target=target))
+    return diagnostics
+
+
+def _check_tiles(tiles: np.ndarray) -> List[Dict[str, Any]]:
+    """未知のタイル番号"""
+    unknown = ~np.isin(tiles, TILE_TYPES)
+    count = int(unknown.sum())
+    if not count:
+        return []
+    y, x = (int(v) for v in np.argwhere(unknown)[0])
+    return [_diagnostic(
+        SEVERITY_WARNING, "unknown_tile", f"未知のタイル番号が {count} 個あります（最初は {int(tiles[y, x])}）",
+        x=x, y=y, count=count,
+    )]
+
+
+def _check_positions(
+    grid: MapGrid,
+    player: Dict[str, Any],
+    npcs: List[Dict[str, Any]],
+    events: List[Dict[str, Any]],
+    stats: Dict[str, Any],
+) -> List[Dict[str, Any]]:
+    """プレイヤー・NPC・イベントの位置と、プレイヤーから到達できない領域"""
+    diagnostics: List[Dict[str, Any]] = []
+    components = grid.components()
+    npc_cells = {(npc["x"], npc["y"]) for npc in npcs}
+
+    # プレイヤーの開始位置
+    reachable: set = set()
+    px, py = player.get("x"), player.get("y")
+    if px is None or py is None or not grid.in_bounds(px, py):
+        diagnostics.append(_diagnostic(
+            SEVERITY_ERROR, "player_out_of_bounds", f"プレイヤーの開始位置がマップの外です: ({px}, {py})",
+            target="player", x=px, y=py,
+        ))
+    else:
+        start = grid.index(px, py)
+        if not grid.terrain[start]:
+            diagnostics.append(_diagnostic(
+                SEVERITY_ERROR, "player_on_blocked_tile", f"プレイヤーの開始位置が通行できないタイルです: ({px}, {py})",
+                target="player", x=px, y=py,
+            ))
+        elif (px, py) in npc_cells:
+            diagnostics.append(_diagnostic(
+                SEVERITY_WARNING, "player_on_npc", f"プレイヤーの開始位置に NPC がいます: ({px}, {py})",
+                target="player", x=px, y=py,
+            ))
+        reachable = grid.components_from(start)
+    reachable_labels = np.array(sorted(reachable), dtype=np.int32)
+
+    # NPC とイベントの位置（隣接するタイルに到達できればよい）
+    diagnostics += _check_targets(grid, components, reachable_labels, npcs, "npcs", "NPC", check_blocked=True)
+    positional = [event for event in events if event.get("x") is not None or event.get("y") is not None]
+    for event in positional:
+        if event.get("x") is None or event.get("y") is None:
+            diagnostics.append(_diagnostic(
+                SEVERITY_ERROR, "event_position_incomplete", f"イベントの座標が片方しかありません: {event.get('id')}",
+                target=f"events/{event.get('id')}", x=event.get("x"), y=event.get("y"),
+            ))
+    positional = [event for event in positional if event.get("x") is not None and event.get("y") is not None]
+    # 調べる対象のイベントは木などの通行できないタイルに置いてもよい
+    diagnostics += _check_targets(grid, components, reachable_labels, positional, "events", "イベント", check_blocked=False)
+
+    overlaps = Counter((npc["x"], npc["y"]) for npc in npcs)
+    for (x, y), count in overlaps.items():
+        if count > 1:
+            diagnostics.append(_diagnostic(
+                SEVERITY_WARNING, "npc_overlap", f"{count} 体の NPC が同じタイルにいます: ({x}, {y})", x=x, y=y,
+            ))
+
+    diagnostics += _unreachable_regions(grid, components, reachable_labels, stats)
+    return diagnostics
+
+
+def _check_targets(
+    grid: MapGrid,
+    components: np.ndarray,
+    reachable_labels: np.ndarray,
+    items: List[Dict[str, Any]],
+    target: str,
+    label: str,
+    check_blocked: bool,
+) -> List[Dict[str, Any]]:
+    """NPC・イベントの範囲外・通行不可タイル・到達不可をまとめて判定"""
+    if not items:
+        return []
+
+    xs = np.array([item["x"] for item in items], dtype=np.int64)
+    ys = np.array([item["y"] for item in items], dtype=np.int64)
+    inside = (xs >= 0) & (xs < grid.width) & (ys >= 0) & (ys < grid.height)
+    cells = np.where(inside, (ys + 1) * grid.stride + xs + 1, 0)
+    on_blocked = inside & ~grid.terrain[cells] if check_blocked else np.zeros_like(inside)
+    # 自身のタイルか隣接するタイルがプレイヤーと同じ連結成分にあれば到達できる
+    around = components[cells[:, None] + np.append(grid.offsets, 0)]
+    reached = inside & np.isin(around, reachable_labels).any(axis=1)
+
+    diagnostics = []
+    code = target[:-1]
+    for i in np.flatnonzero(~inside | on_blocked | ~reached):
+        item = items[i]
+        fields = {"target": f"{target}/{item.get('id')}", "x": int(xs[i]), "y": int(ys[i])}
+        name = item.get("name") or item.get("id")
+        if not inside[i]:
+            diagnostics.append(_diagnostic(
+                SEVERITY_ERROR, f"{code}_out_of_bounds", f"{label}がマップの外にいます: {name}", **fields,
+            ))
+            continue
+        if on_blocked[i]:
+            diagnostics.append(_diagnostic(
+                SEVERITY_WARNING, f"{code}_on_blocked_tile", f"{label}が通行できないタイルの上にいます: {name}", **fields,
+            ))
+        if not reached[i] and reachable_labels.size:
+            diagnostics.append(_diagnostic(
+                SEVERITY_WARNING, f"{code}_unreachable", f"{label}にプレイヤーが到達できません: {name}", **fields,
+            ))
+    return diagnostics
+
+
+def _unreachable_regions(
+    grid: MapGrid,
+    components: np.ndarray,
+    reachable_labels: np.ndarray,
+    stats: Dict[str, Any],
+) -> List[Dict[str, Any]]:
+    """プレイヤーから到達できない通行可能な領域（大きい順に MAX_REGION_DIAGNOSTICS 件）"""
+    labels = grid.interior(components)
+    sizes = np.bincount(labels[labels >= 0])
+    walkable_tiles = int(sizes.sum())
+    reachable_tiles = int(sizes[reachable_labels].sum()) if reachable_labels.size else 0
+    unreachable = np.setdiff1d(np.flatnonzero(sizes), reachable_labels)
+
+    stats.update({
+        "width": grid.width,
+        "height": grid.height,
+        "walkable_tiles": walkable_tiles,
+        "reachable_tiles": reachable_tiles,
+        "regions": int(sizes.size),
+        "unreachable_regions": int(unreachable.size),
+    })
+    if not reachable_labels.size or not unreachable.size:
+        return []
+
+    diagnostics = [_diagnostic(
+        SEVERITY_WARNING, "unreachable_tiles",
+        f"プレイヤーが到達できない通行可能なタイルが {walkable_tiles - reachable_tiles} 個"
+        f"（{unreachable.size} 領域）あります",
+        count=walkable_tiles - reachable_tiles,
+    )]
+    largest = unreachable[np.argsort(-sizes[unreachable], kind="stable")[:MAX_REGION_DIAGNOSTICS]]
+    for label in largest:
+        ys, xs = np.nonzero(labels == label)
+        diagnostics.append(_diagnostic(
+            SEVERITY_INFO, "unreachable_region",
+            f"到達できない領域: {int(sizes[label])} タイル",
+            x=int(xs[0]), y=int(ys[0]), count=int(sizes[label]),
+            bounds=[int(xs.min()), int(ys.min()), int(xs.max()), int(ys.max())],
+        ))
+    return diagnostics
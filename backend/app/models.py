@@ -1,5 +1,5 @@
 """Pydantic models for API requests and responses"""
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 from typing import Optional, List, Dict, Any
 
 
@@ -11,10 +11,27 @@ class ProjectInit(BaseModel):
 
 
 class ProjectClone(BaseModel):
-    """既存プロジェクトクローンリクエスト"""
+    """
+    既存プロジェクトクローンリクエスト
+
+    depth を指定すると履歴を浅く、filter（例: blob:none）を指定すると
+    ファイル内容を必要になるまで取得しない部分クローンになる。
+    sparse_paths に sparse-checkout のパターン（gitignore 形式、例:
+    ["/*", "!/assets/movies/"]）を指定すると一致するファイルだけを展開する。
+    """
     name: str
     repo_url: str
     branch: str = "develop"
+    depth: Optional[int] = Field(default=None, gt=0)
+    filter: Optional[str] = Field(default=None, pattern=r"^(blob:none|blob:limit=\d+[kmg]?|tree:\d+)$")
+    sparse_paths: Optional[List[str]] = None
+
+    @field_validator("sparse_paths")
+    @classmethod
+    def check_sparse_paths(cls, value: Optional[List[str]]) -> Optional[List[str]]:
+        if value is not None and any(not p or p.startswith("-") or "\n" in p for p in value):
+            raise ValueError("無効な sparse-checkout パターン")
+        return value
 
 
 class ProjectInfo(BaseModel):
@@ -33,11 +50,26 @@ class SwitchBranch(BaseModel):
 
 # RPGデータ関連
 class TileData(BaseModel):
-    """タイルデータ"""
+    """
+    タイルデータ
+
+    tiles（2次元配列）か、tiles_encoding と tiles_data（base64 でエンコード
+    したタイル配列）のどちらかを指定する。chunk_size を指定するとマップを
+    チャンクごとのファイルに分けて保存する
+    """
     width: int
     height: int
     tile_size: int
-    tiles: List[List[int]]
+    chunk_size: Optional[int] = Field(default=None, gt=0)
+    tiles: Optional[List[List[int]]] = None
+    tiles_encoding: Optional[str] = None
+    tiles_data: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_tiles(self):
+        if self.tiles is None and (self.tiles_encoding is None or self.tiles_data is None):
+            raise ValueError("tiles または tiles_encoding と tiles_data を指定してください")
+        return self
 
 
 class NPCData(BaseModel):
@@ -74,6 +106,19 @@ class EventData(BaseModel):
     actions: List[EventAction]
 
 
+class EventFireRequest(BaseModel):
+    """
+    イベントの発動判定リクエスト
+
+    x / y は talk なら話しかけた先、step なら踏んだタイル。
+    state は条件式から参照する状態（フラグや変数）
+    """
+    trigger_type: str = Field(..., pattern=r"^(talk|step|auto)$")
+    x: Optional[int] = None
+    y: Optional[int] = None
+    state: Dict[str, Any] = Field(default_factory=dict)
+
+
 class RPGProjectData(BaseModel):
     """RPGプロジェクトデータ"""
     name: str
@@ -90,18 +135,129 @@ class RPGProjectUpdate(BaseModel):
     message: str = "RPGデータ更新"
 
 
+class PatchOperation(BaseModel):
+    """
+    データ差分操作
+
+    JSON Patch (add / remove / replace / move / copy / test) に加えて、
+    専用操作 set_tiles_rect（矩形のタイル設定）と move_npc（NPC移動）に対応
+    """
+    model_config = ConfigDict(populate_by_name=True)
+
+    op: str
+    path: Optional[str] = None
+    from_: Optional[str] = Field(default=None, alias="from")
+    value: Optional[Any] = None
+    # 専用操作のパラメータ
+    id: Optional[str] = None
+    x: Optional[int] = None
+    y: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    tile: Optional[int] = None
+    tiles: Optional[List[List[int]]] = None
+
+
+class RPGProjectPatch(BaseModel):
+    """RPGデータ差分更新リクエスト"""
+    operations: List[PatchOperation]
+
+
+# 経路探索関連
+class MapPoint(BaseModel):
+    """マップ上の座標（グリッド）"""
+    x: int
+    y: int
+
+
+class PathQuery(BaseModel):
+    """経路探索の1件"""
+    start: MapPoint
+    goal: MapPoint
+
+
+class PathBatchRequest(BaseModel):
+    """
+    経路探索の一括リクエスト
+
+    avoid_npcs が true なら NPC のいるタイルを通行不可として扱う（プレイヤーの移動と同じ）
+    """
+    queries: List[PathQuery] = Field(..., min_length=1, max_length=10000)
+    avoid_npcs: bool = True
+
+
+class PathResult(BaseModel):
+    """経路探索の結果（path は出発地を含まず目的地を含む。到達できなければ null）"""
+    path: Optional[List[MapPoint]] = None
+    length: Optional[int] = None
+
+
+# マップ検査関連
+class LintDiagnostic(BaseModel):
+    """マップ検査の診断（severity は error / warning / info）"""
+    severity: str
+    code: str
+    message: str
+    target: Optional[str] = None
+    x: Optional[int] = None
+    y: Optional[int] = None
+    count: Optional[int] = None
+    bounds: Optional[List[int]] = None
+
+
+class LintReport(BaseModel):
+    """マップ検査の結果"""
+    ok: bool
+    errors: int
+    warnings: int
+    diagnostics: List[LintDiagnostic]
+    stats: Dict[str, Any]
+
+
+class PlaytestRequest(BaseModel):
+    """
+    テストプレイのリクエスト
+
+    route を指定すると各プロジェクトでそのルートを1回だけ実行し、省略すると
+    seed から runs 個のシードでランダムに歩き回る
+    """
+    projects: List[str] = Field(..., min_length=1)
+    runs: int = Field(default=16, ge=1, le=10000)
+    seed: int = 0
+    steps: int = Field(default=1000, ge=1, le=1000000)
+    route: Optional[List[str]] = Field(default=None, min_length=1)
+
+
 # Git関連
 class CommitRequest(BaseModel):
     """コミットリクエスト"""
     message: str
 
 
+class BulkCommitRequest(BaseModel):
+    """複数プロジェクトの一括コミットリクエスト"""
+    projects: List[str] = Field(..., min_length=1)
+    message: str
+
+
 class GitStatus(BaseModel):
     """Git状態レスポンス"""
     has_uncommitted_changes: bool
     branch: str
     modified_files: List[str]
     untracked_files: List[str]
+    ahead: Optional[int] = None
+    behind: Optional[int] = None
+
+
+class CommitInfo(BaseModel):
+    """ゲームデータの履歴のコミット"""
+    sha: str
+    short_sha: str
+    message: str
+    author: str
+    committed_at: str
+    parents: List[str]
 
 
 # アセット関連
@@ -111,3 +267,22 @@ class AssetInfo(BaseModel):
     path: str
     size: int
     created_at: str
+    sha256: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    url: Optional[str] = None
+
+
+# ジョブ関連
+class JobInfo(BaseModel):
+    """バックグラウンドジョブの状態"""
+    id: str
+    kind: str
+    project: str
+    status: str
+    progress: Optional[Dict[str, Any]] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
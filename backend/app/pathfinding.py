@@ -0,0 +1,155 @@
+"""マップ上の経路探索（単発は A*、同じ目的地への複数の探索は距離場）"""
+import heapq
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .map_grid import MapGrid
+from .metrics import cache_counters
+
+# 距離場キャッシュのメモリ上限（MB）。1024x1024 のマップで1件約 4MB
+PATH_CACHE_MB = float(os.environ.get("MOCOTCH_PATH_CACHE_MB", "64"))
+# バッチで同じ目的地への探索がこの件数以上あれば、A* ではなく距離場を作って答える
+PATH_FIELD_MIN_QUERIES = 2
+
+_FIELD_HITS, _FIELD_MISSES = cache_counters("distance_field")
+
+# 座標 (x, y)
+Point = Tuple[int, int]
+
+
+class DistanceFieldCache:
+    """
+    目的地ごとの距離場の LRU キャッシュ
+
+    キーはグリッドの通行可否から作ったハッシュと目的地なので、ゲームデータが
+    保存し直されても通行可否が変わらなければ再利用できる
+    """
+
+    def __init__(self, max_bytes: int = int(PATH_CACHE_MB * 1024 * 1024)):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, int], np.ndarray]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, grid: MapGrid, target: int) -> Optional[np.ndarray]:
+        key = (grid.key, target)
+        with self._lock:
+            field = self._entries.get(key)
+            if field is not None:
+                self._entries.move_to_end(key)
+        (_FIELD_HITS if field is not None else _FIELD_MISSES).inc()
+        return field
+
+    def get_or_compute(self, grid: MapGrid, target: int) -> np.ndarray:
+        field = self.get(grid, target)
+        if field is not None:
+            return field
+
+        field = grid.distance_field(target)
+        field.setflags(write=False)
+        key = (grid.key, target)
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = field
+                self._size += field.nbytes
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+        return field
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+# プロセス全体で共有するキャッシュ
+distance_fields = DistanceFieldCache()
+
+
+def find_path(grid: MapGrid, start: Point, goal: Point) -> Optional[List[Point]]:
+    """
+    start から goal までの最短経路
+
+    目的地への距離場がキャッシュにあればそれを使い、なければ A* で探索する。
+    start は通行不可でもよい（NPC 自身の位置など）が、goal は通行可能でなければならない。
+
+    Returns:
+        経路の座標（start を含まず goal を含む）。到達できなければ None
+    """
+    if not grid.in_bounds(*start) or not grid.is_walkable(*goal):
+        return None
+
+    source, target = grid.index(*start), grid.index(*goal)
+    if source == target:
+        return []
+    # 連結成分が違えば探索しない（到達できない場合に全域を探索するのを避ける）
+    if int(grid.components()[target]) not in grid.components_from(source):
+        return None
+
+    field = distance_fields.get(grid, target)
+    if field is not None:
+        cells = grid.path_from_field(field, source)
+    else:
+        cells = _astar(grid, source, target)
+    return None if cells is None else grid.positions(cells)
+
+
+def find_paths(grid: MapGrid, queries: Sequence[Tuple[Point, Point]]) -> List[Optional[List[Point]]]:
+    """
+    複数の経路をまとめて探索
+
+    同じ目的地への探索が PATH_FIELD_MIN_QUERIES 件以上あれば、目的地の距離場を
+    1回だけ作り（キャッシュし）、各出発地からは距離場を下りるだけで答える
+    """
+    by_goal: Dict[Point, int] = defaultdict(int)
+    for start, goal in queries:
+        by_goal[goal] += 1
+    for goal, count in by_goal.items():
+        if count >= PATH_FIELD_MIN_QUERIES and grid.is_walkable(*goal):
+            distance_fields.get_or_compute(grid, grid.index(*goal))
+
+    return [find_path(grid, start, goal) for start, goal in queries]
+
+
+def _astar(grid: MapGrid, source: int, target: int) -> Optional[List[int]]:
+    """1次元の添字上の A*（マンハッタン距離をヒューリスティックに使う）"""
+    cells = grid.cells
+    stride = grid.stride
+    offsets = [int(offset) for offset in grid.offsets]
+    target_y, target_x = divmod(target, stride)
+
+    came_from: Dict[int, int] = {source: source}
+    cost: Dict[int, int] = {source: 0}
+    sy, sx = divmod(source, stride)
+    h = abs(sx - target_x) + abs(sy - target_y)
+    # (推定コスト, ヒューリスティック, 添字)。同じ推定コストなら目的地に近い方を先に展開する
+    heap = [(h, h, source)]
+    while heap:
+        estimate, h, current = heapq.heappop(heap)
+        if estimate - h > cost[current]:
+            # より短い経路で展開済み
+            continue
+        if current == target:
+            path = []
+            while current != source:
+                path.append(current)
+                current = came_from[current]
+            path.reverse()
+            return path
+
+        next_cost = cost[current] + 1
+        for offset in offsets:
+            neighbor = current + offset
+            if not cells[neighbor] or cost.get(neighbor, next_cost + 1) <= next_cost:
+                continue
+            cost[neighbor] = next_cost
+            came_from[neighbor] = current
+            ny, nx = divmod(neighbor, stride)
+            h = abs(nx - target_x) + abs(ny - target_y)
+            heapq.heappush(heap, (next_cost + h, h, neighbor))
+    return None
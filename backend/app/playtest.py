@@ -0,0 +1,517 @@
+"""ブラウザを使わないテストプレイ（ランダム・指定ルートの移動、NPC への話しかけ、イベントの発動）"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .event_engine import EventEngine
+from .map_grid import MapGrid, tile_array
+from .models import NPCData, PlayerData, RPGProjectData
+from .pathfinding import find_path
+from .rpg_service import RPGService
+
+# 同時に実行するプロセス数
+PLAYTEST_WORKERS = int(os.environ.get("MOCOTCH_PLAYTEST_WORKERS", str(os.cpu_count() or 1)))
+# 1ワーカーあたりのタスク数の目安（シードをこの数 x ワーカー数のタスクに分ける）
+PLAYTEST_TASKS_PER_WORKER = 4
+
+# ランダムに歩くとき、未達成の目標（NPC・イベント）へ向かう確率
+TARGET_BIAS = 0.5
+# ランダムに歩くときの経由地の範囲（マンハッタン距離）
+WANDER_RADIUS = 12
+# 経由地を探す試行回数（見つからなければ1歩だけランダムに動く）
+WANDER_ATTEMPTS = 8
+
+# 方向と移動量（フロントエンドの movePlayer と同じ）
+DIRECTIONS = {"up": (0, -1), "down": (0, 1), "left": (-1, 0), "right": (1, 0)}
+# 指定ルートのコマンド（方向・talk・"x,y" への移動）
+ROUTE_TALK = "talk"
+
+# 座標 (x, y)
+Point = Tuple[int, int]
+
+
+class PlaytestWorld:
+    """
+    テストプレイの対象（プロセスプールに渡せるよう、タイルは NumPy 配列で持つ）
+
+    ゲームデータは RPGProjectData で検証する。タイル配列の検証は tile_array に任せ、
+    巨大なマップでも Pydantic で1要素ずつ検証しない。
+    """
+
+    def __init__(self, name: str, doc: Dict[str, Any]):
+        project = RPGProjectData.model_validate({**doc, "map": {**doc["map"], "tiles": [], "tiles_data": None}})
+        self.name = name
+        self.tiles = tile_array(doc["map"])
+        self.player: PlayerData = project.player
+        self.npcs: List[NPCData] = project.npcs
+        self.events: List[Dict[str, Any]] = [event.model_dump() for event in project.events or []]
+
+    def grid(self) -> MapGrid:
+        """NPC のいるタイルを通行不可にしたグリッド（フロントエンドの canMoveTo と同じ）"""
+        return MapGrid(self.tiles, [(npc.x, npc.y) for npc in self.npcs])
+
+
+def load_world(projects_dir: Path, name: str) -> PlaytestWorld:
+    """プロジェクトのゲームデータを読み込む（書き込み待ちの自動保存があればそれを使う）"""
+    project_path = projects_dir / name
+    if not project_path.exists():
+        raise FileNotFoundError("プロジェクトが見つかりません")
+    data = RPGService(project_path).load_project_data()
+    if data is None:
+        raise ValueError("データ読み込み失敗")
+    return PlaytestWorld(name, data)
+
+
+class Playtest:
+    """
+    1回分のテストプレイ
+
+    入力（移動・話しかける）はフロントエンドと同じ規則で処理する。通行できない方向への
+    移動は向きだけ変わり、話しかけると向いている先のタイルの NPC と talk イベントが反応する。
+    step イベントは移動して踏んだときに、auto イベントは状態が変わるたびに条件を確認して
+    1回のプレイで1回だけ発動する。アクションは flag（params の name と value）と
+    teleport（params の x と y）を状態に反映し、message は数えるだけにする。
+    """
+
+    def __init__(self, world: PlaytestWorld, grid: MapGrid, engine: EventEngine, seed: int):
+        self.world = world
+        self.grid = grid
+        self.engine = engine
+        self.rng = random.Random(seed)
+        self.seed = seed
+
+        self.x, self.y = world.player.x, world.player.y
+        self.direction = world.player.direction
+        self.state: Dict[str, Any] = {"flags": {}}
+        self.npcs_at = {(npc.x, npc.y): npc.id for npc in world.npcs}
+
+        self.visited = bytearray(grid.walkable.size)
+        self.npcs_reached: set = set()
+        self.events_fired: Counter = Counter()
+        self.actions: Counter = Counter()
+        self.auto_fired: set = set()
+        self.steps = 0
+        self.moves = 0
+        self.talks = 0
+
+        self._visit()
+        self._run_auto()
+
+    def move(self, direction: str):
+        """1マス移動（通行できなければ向きだけ変える）"""
+        self.steps += 1
+        self.direction = direction
+        dx, dy = DIRECTIONS[direction]
+        if not self.grid.is_walkable(self.x + dx, self.y + dy):
+            return
+        self.x += dx
+        self.y += dy
+        self.moves += 1
+        self._visit()
+        for event in self.engine.fire("step", self.x, self.y, self.state):
+            self._apply(event)
+        self._run_auto()
+
+    def talk(self):
+        """向いている先のタイルに話しかける"""
+        self.steps += 1
+        self.talks += 1
+        dx, dy = DIRECTIONS.get(self.direction, (0, 0))
+        x, y = self.x + dx, self.y + dy
+        npc_id = self.npcs_at.get((x, y))
+        if npc_id is not None:
+            self.npcs_reached.add(npc_id)
+        for event in self.engine.fire("talk", x, y, self.state):
+            self._apply(event)
+        self._run_auto()
+
+    def walk(self, path: List[Point], max_steps: int) -> bool:
+        """経路に沿って移動（テレポートなどで経路から外れたら False）"""
+        for x, y in path:
+            if self.steps >= max_steps:
+                return False
+            self.move(_direction(x - self.x, y - self.y))
+            if (self.x, self.y) != (x, y):
+                return False
+        return True
+
+    def play_route(self, route: Sequence[str], max_steps: int):
+        """指定ルートを実行（"up" などの方向、"talk"、"x,y" はその座標まで経路探索して移動）"""
+        for command in route:
+            if self.steps >= max_steps:
+                return
+            if command in DIRECTIONS:
+                self.move(command)
+            elif command == ROUTE_TALK:
+                self.talk()
+            else:
+                goal = parse_point(command)
+                path = find_path(self.grid, (self.x, self.y), goal)
+                if path is not None:
+                    self.walk(path, max_steps)
+
+    def wander(self, max_steps: int):
+        """
+        ランダムに歩き回る
+
+        TARGET_BIAS の確率でまだ話しかけていない NPC・発動していないイベントへ向かい、
+        それ以外は WANDER_RADIUS 以内の通行可能なタイルを経由地にして歩く
+        """
+        targets = self._targets()
+        while self.steps < max_steps:
+            if targets and self.rng.random() < TARGET_BIAS:
+                target = self.rng.choice(targets)
+                if not self._visit_target(target, max_steps):
+                    targets.remove(target)
+                elif self._target_done(target):
+                    targets.remove(target)
+                continue
+
+            goal = self._wander_goal()
+            path = find_path(self.grid, (self.x, self.y), goal) if goal is not None else None
+            if path:
+                self.walk(path, max_steps)
+            else:
+                self.move(self.rng.choice(list(DIRECTIONS)))
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "seed": self.seed,
+            "steps": self.steps,
+            "moves": self.moves,
+            "talks": self.talks,
+            "tiles_visited": self.visited.count(1),
+            "npcs_reached": len(self.npcs_reached),
+            "events_fired": sum(self.events_fired.values()),
+            "position": [self.x, self.y],
+        }
+
+    def _visit(self):
+        if self.grid.in_bounds(self.x, self.y):
+            self.visited[self.grid.index(self.x, self.y)] = 1
+
+    def _apply(self, event: Dict[str, Any]):
+        self.events_fired[event["id"]] += 1
+        for action in event.get("actions") or []:
+            kind = action.get("type")
+            params = action.get("params") or {}
+            self.actions[kind] += 1
+            if kind == "flag":
+                name = params.get("name") or params.get("key")
+                if name:
+                    self.state["flags"][name] = params.get("value", True)
+            elif kind == "teleport":
+                x, y = params.get("x"), params.get("y")
+                if isinstance(x, int) and isinstance(y, int) and self.grid.is_walkable(x, y):
+                    self.x, self.y = x, y
+                    self._visit()
+
+    def _run_auto(self):
+        """条件を満たした auto イベントを発動（発動で状態が変われば再確認）"""
+        while True:
+            fired = [
+                event for event in self.engine.fire("auto", state=self.state)
+                if event["id"] not in self.auto_fired
+            ]
+            if not fired:
+                return
+            for event in fired:
+                self.auto_fired.add(event["id"])
+                self._apply(event)
+
+    def _targets(self) -> List[Tuple[str, str, Point]]:
+        """目標（種類, ID, 座標）。npc と talk は隣のタイルから話しかけ、step はそのタイルを踏む"""
+        targets = [("npc", npc.id, (npc.x, npc.y)) for npc in self.world.npcs]
+        for event in self.world.events:
+            if event.get("x") is None or event.get("y") is None:
+                continue
+            if event.get("trigger_type") in ("talk", "step"):
+                targets.append((event["trigger_type"], event["id"], (event["x"], event["y"])))
+        return targets
+
+    def _target_done(self, target: Tuple[str, str, Point]) -> bool:
+        kind, target_id, _ = target
+        return target_id in (self.npcs_reached if kind == "npc" else self.events_fired)
+
+    def _visit_target(self, target: Tuple[str, str, Point], max_steps: int) -> bool:
+        """目標まで歩いて話しかける・踏む（到達できなければ False）"""
+        kind, _, (tx, ty) = target
+        if kind == "step":
+            path = find_path(self.grid, (self.x, self.y), (tx, ty))
+            if path is None:
+                return False
+            self.walk(path, max_steps)
+            return True
+
+        sides = list(DIRECTIONS.values())
+        self.rng.shuffle(sides)
+        for dx, dy in sides:
+            stand = (tx - dx, ty - dy)
+            path = find_path(self.grid, (self.x, self.y), stand)
+            if path is None:
+                continue
+            if self.walk(path, max_steps) and self.steps < max_steps:
+                # フロントエンドのクリック移動と同じく、到着したら相手の方を向く
+                self.direction = _direction(dx, dy)
+                self.talk()
+            return True
+        return False
+
+    def _wander_goal(self) -> Optional[Point]:
+        for _ in range(WANDER_ATTEMPTS):
+            x = self.x + self.rng.randint(-WANDER_RADIUS, WANDER_RADIUS)
+            y = self.y + self.rng.randint(-WANDER_RADIUS, WANDER_RADIUS)
+            if (x, y) != (self.x, self.y) and self.grid.is_walkable(x, y):
+                return x, y
+        return None
+
+
+def _direction(dx: int, dy: int) -> str:
+    if dy < 0:
+        return "up"
+    if dy > 0:
+        return "down"
+    return "left" if dx < 0 else "right"
+
+
+def parse_point(command: str) -> Point:
+    """"x,y" 形式の座標を解釈"""
+    try:
+        x, y = (int(value) for value in command.split(","))
+    except ValueError:
+        raise ValueError(f"ルートのコマンドが不正です: {command}") from None
+    return x, y
+
+
+def validate_route(route: Sequence[str]):
+    """指定ルートのコマンドを検証（不正なら ValueError）"""
+    for command in route:
+        if command not in DIRECTIONS and command != ROUTE_TALK:
+            parse_point(command)
+
+
+def run_seeds(
+    world: PlaytestWorld,
+    seeds: Sequence[int],
+    steps: int,
+    route: Optional[Sequence[str]] = None,
+) -> Dict[str, Any]:
+    """
+    1つのプロジェクトを複数のシードでテストプレイ（プロセスプールのタスク）
+
+    グリッドとイベントの索引はシード間で共有する。訪れたタイルは全シードの和集合を
+    ビット列に詰めて返し、プロセス間で受け渡すデータ量を抑える。
+    """
+    grid = world.grid()
+    engine = EventEngine(world.events)
+    visited = np.zeros(grid.walkable.size, dtype=bool)
+    npcs_reached: set = set()
+    events_fired: Counter = Counter()
+    actions: Counter = Counter()
+    runs = []
+
+    started = time.perf_counter()
+    for seed in seeds:
+        playtest = Playtest(world, grid, engine, seed)
+        if route is not None:
+            playtest.play_route(route, steps)
+        else:
+            playtest.wander(steps)
+        visited |= np.frombuffer(playtest.visited, dtype=bool)
+        npcs_reached |= playtest.npcs_reached
+        events_fired.update(playtest.events_fired)
+        actions.update(playtest.actions)
+        runs.append(playtest.report())
+
+    return {
+        "project": world.name,
+        "runs": runs,
+        "visited": np.packbits(visited).tobytes(),
+        "npcs_reached": sorted(npcs_reached),
+        "events_fired": dict(events_fired),
+        "actions": dict(actions),
+        "elapsed": time.perf_counter() - started,
+    }
+
+
+def _chunks(seeds: List[int], count: int) -> List[List[int]]:
+    size = max(1, math.ceil(len(seeds) / max(count, 1)))
+    return [seeds[i:i + size] for i in range(0, len(seeds), size)]
+
+
+def run_playtests(
+    worlds: List[PlaytestWorld],
+    seeds: Sequence[int],
+    steps: int,
+    route: Optional[Sequence[str]] = None,
+    workers: int = PLAYTEST_WORKERS,
+    progress: Optional[Callable[[int, int, str], None]] = None,
+) -> Dict[str, Any]:
+    """
+    複数のプロジェクトを複数のシードでテストプレイ
+
+    プロジェクトごとにシードをタスクに分けてプロセスプールで並列に実行する
+    （ワーカーが1つなら同じプロセスで実行）。ルートを指定した場合は結果が
+    シードによらないので、各プロジェクト1回だけ実行する。
+
+    Args:
+        progress: 完了したプレイ数・全体のプレイ数・プロジェクト名を受け取る
+
+    Returns:
+        プロジェクトごとの網羅率（訪れたタイル・話しかけた NPC・発動したイベント）と処理速度
+    """
+    seeds = [seeds[0]] if route is not None and seeds else list(seeds)
+    chunk_count = max(1, workers * PLAYTEST_TASKS_PER_WORKER // max(len(worlds), 1))
+    tasks = [(world, chunk) for world in worlds for chunk in _chunks(seeds, chunk_count)]
+    total = len(worlds) * len(seeds)
+    partials: Dict[str, List[Dict[str, Any]]] = {world.name: [] for world in worlds}
+
+    started = time.perf_counter()
+    done = 0
+    if workers <= 1 or len(tasks) <= 1:
+        for world, chunk in tasks:
+            partials[world.name].append(run_seeds(world, chunk, steps, route))
+            done += len(chunk)
+            if progress:
+                progress(done, total, world.name)
+    else:
+        # サーバーのスレッドから fork しないよう spawn でワーカーを起動する
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=context) as executor:
+            futures = {executor.submit(run_seeds, world, chunk, steps, route): len(chunk) for world, chunk in tasks}
+            for future in as_completed(futures):
+                result = future.result()
+                partials[result["project"]].append(result)
+                done += futures[future]
+                if progress:
+                    progress(done, total, result["project"])
+    elapsed = time.perf_counter() - started
+
+    projects = [_summarize(world, partials[world.name]) for world in worlds]
+    total_steps = sum(project["steps"] for project in projects)
+    return {
+        "projects": projects,
+        "runs": total,
+        "steps": total_steps,
+        "workers": workers,
+        "elapsed_s": round(elapsed, 3),
+        "runs_per_second": round(total / elapsed, 1) if elapsed > 0 else None,
+        "steps_per_second": round(total_steps / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def _summarize(world: PlaytestWorld, partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """タスクごとの結果をプロジェクト単位にまとめる"""
+    grid = world.grid()
+    visited = np.zeros(grid.walkable.size, dtype=bool)
+    npcs_reached: set = set()
+    events_fired: Counter = Counter()
+    actions: Counter = Counter()
+    runs: List[Dict[str, Any]] = []
+    for partial in partials:
+        packed = np.frombuffer(partial["visited"], dtype=np.uint8)
+        visited |= np.unpackbits(packed, count=visited.size).astype(bool)
+        npcs_reached.update(partial["npcs_reached"])
+        events_fired.update(partial["events_fired"])
+        actions.update(partial["actions"])
+        runs += partial["runs"]
+    runs.sort(key=lambda run: run["seed"])
+
+    # プレイヤーの開始位置から歩いて行ける範囲（テレポート先は含まない）
+    reachable_tiles = 0
+    player = world.player
+    if grid.in_bounds(player.x, player.y):
+        labels = sorted(grid.components_from(grid.index(player.x, player.y)))
+        if labels:
+            reachable_tiles = int(np.isin(grid.components(), labels).sum())
+    tiles_visited = int(visited.sum())
+    per_run = [run["tiles_visited"] / reachable_tiles for run in runs] if reachable_tiles else []
+
+    return {
+        "project": world.name,
+        "runs": len(runs),
+        "steps": sum(run["steps"] for run in runs),
+        "reachable_tiles": reachable_tiles,
+        "tiles_visited": tiles_visited,
+        "tile_coverage": round(min(tiles_visited / reachable_tiles, 1.0), 4) if reachable_tiles else None,
+        "tile_coverage_per_run": {
+            "min": round(min(per_run), 4),
+            "mean": round(sum(per_run) / len(per_run), 4),
+            "max": round(max(per_run), 4),
+        } if per_run else None,
+        "npcs_total": len(world.npcs),
+        "npcs_reached": len(npcs_reached),
+        "npcs_unreached": [npc.id for npc in world.npcs if npc.id not in npcs_reached],
+        "events_total": len(world.events),
+        "events_fired": dict(events_fired),
+        "events_never_fired": [event["id"] for event in world.events if event["id"] not in events_fired],
+        "actions": dict(actions),
+        "cpu_s": round(sum(partial["elapsed"] for partial in partials), 3),
+        "results": runs,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """コマンドラインからテストプレイを実行"""
+    parser = argparse.ArgumentParser(prog="mocotch-playtest", description="ブラウザを使わずにテストプレイを実行")
+    parser.add_argument("projects", nargs="+", help="プロジェクト名")
+    parser.add_argument("--projects-dir", type=Path, default=Path("./projects"), help="プロジェクトのルートディレクトリ")
+    parser.add_argument("--runs", type=int, default=16, help="シードごとのプレイ回数")
+    parser.add_argument("--seed", type=int, default=0, help="最初のシード")
+    parser.add_argument("--steps", type=int, default=1000, help="1回のプレイの入力数の上限")
+    parser.add_argument("--route", nargs="+", help='指定ルート（up/down/left/right/talk/"x,y"）。指定すると各プロジェクト1回')
+    parser.add_argument("--workers", type=int, default=PLAYTEST_WORKERS, help="並列に実行するプロセス数")
+    parser.add_argument("--strict", action="store_true", help="到達できなかった NPC・発動しなかったイベントがあれば失敗")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力")
+    args = parser.parse_args(argv)
+
+    if args.route:
+        try:
+            validate_route(args.route)
+        except ValueError as e:
+            parser.error(str(e))
+
+    worlds = []
+    for name in dict.fromkeys(args.projects):
+        try:
+            worlds.append(load_world(args.projects_dir, name))
+        except Exception as e:
+            print(f"{name}: 読み込み失敗: {e}", file=sys.stderr)
+            return 1
+
+    report = run_playtests(
+        worlds, range(args.seed, args.seed + args.runs), args.steps, args.route, args.workers,
+    )
+    incomplete = any(project["npcs_unreached"] or project["events_never_fired"] for project in report["projects"])
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        for project in report["projects"]:
+            coverage = project["tile_coverage"]
+            print(f"{project['project']}: {project['runs']} 回 / {project['steps']} 入力")
+            print(f"  タイル: {project['tiles_visited']} / {project['reachable_tiles']}"
+                  + (f" ({coverage:.1%})" if coverage is not None else ""))
+            print(f"  NPC: {project['npcs_reached']} / {project['npcs_total']}"
+                  + (f"（未到達: {', '.join(project['npcs_unreached'])}）" if project["npcs_unreached"] else ""))
+            print(f"  イベント: {project['events_total'] - len(project['events_never_fired'])} / {project['events_total']}"
+                  + (f"（未発動: {', '.join(project['events_never_fired'])}）" if project["events_never_fired"] else ""))
+        print(f"{report['runs']} 回 / {report['elapsed_s']} 秒"
+              f"（{report['runs_per_second']} 回/秒、{report['steps_per_second']} 入力/秒、{report['workers']} プロセス）")
+
+    return 1 if args.strict and incomplete else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
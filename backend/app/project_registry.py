@@ -0,0 +1,151 @@
+"""プロジェクト一覧をメモリ上で管理するレジストリ"""
+import threading
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple
+import logging
+
+from .rpg_service import RPGService
+
+logger = logging.getLogger(__name__)
+
+# ソート可能なキー
+SORT_KEYS = ("updated_at", "created_at", "name")
+
+
+class ProjectRegistry:
+    """
+    プロジェクト情報のレジストリ（プロセス全体で共有）
+
+    起動時に一度だけ PROJECTS_DIR を走査し、以降は作成・クローン・保存・削除の
+    各処理から更新する。一覧取得時はページ内のエントリだけ .mocotch.json の
+    mtime を確認し、外部で変更されたものを再読み込みする。
+    """
+
+    def __init__(self, projects_dir: Path):
+        self.projects_dir = projects_dir
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._meta_mtimes: Dict[str, Optional[int]] = {}
+        self._sorted: Dict[Tuple[str, bool], List[str]] = {}
+        self._dir_mtime: Optional[int] = None
+        self._lock = threading.RLock()
+
+    def scan(self):
+        """プロジェクトディレクトリを走査してレジストリを構築"""
+        with self._lock:
+            self._entries.clear()
+            self._meta_mtimes.clear()
+            self._sorted.clear()
+            self._dir_mtime = self._stat_mtime(self.projects_dir)
+            for project_dir in self.projects_dir.iterdir():
+                self._load_entry(project_dir.name)
+            logger.info(f"プロジェクトレジストリ構築完了: {len(self._entries)}件")
+
+    def refresh(self, name: str):
+        """指定プロジェクトのエントリを再読み込み（存在しなければ削除）"""
+        with self._lock:
+            self._load_entry(name)
+
+    def remove(self, name: str):
+        """指定プロジェクトをレジストリから削除"""
+        with self._lock:
+            if self._entries.pop(name, None) is not None:
+                self._meta_mtimes.pop(name, None)
+                self._sorted.clear()
+
+    def list_projects(
+        self,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        sort: str = "updated_at",
+        descending: bool = True,
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        プロジェクト一覧をページ単位で取得
+
+        Returns:
+            (total, page)
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"無効なソートキー: {sort}")
+
+        with self._lock:
+            self._recheck_dir()
+
+            names = self._sorted_names(sort, descending)
+            end = len(names) if limit is None else offset + limit
+            page_names = names[offset:end]
+
+            # ページ内のエントリだけ mtime を確認して再読み込み
+            stale = [
+                name for name in page_names
+                if self._stat_mtime(self._meta_path(name)) != self._meta_mtimes.get(name)
+            ]
+            for name in stale:
+                self._load_entry(name)
+            if stale:
+                names = self._sorted_names(sort, descending)
+                page_names = names[offset:end]
+
+            return len(names), [dict(self._entries[name]) for name in page_names]
+
+    def _recheck_dir(self):
+        """PROJECTS_DIR の mtime が変わっていれば追加・削除されたプロジェクトを反映"""
+        dir_mtime = self._stat_mtime(self.projects_dir)
+        if dir_mtime == self._dir_mtime:
+            return
+
+        self._dir_mtime = dir_mtime
+        current = {p.name for p in self.projects_dir.iterdir()}
+        for name in list(self._entries):
+            if name not in current:
+                self.remove(name)
+        for name in current:
+            if name not in self._entries:
+                self._load_entry(name)
+
+    def _load_entry(self, name: str):
+        """1プロジェクト分のエントリを読み込み"""
+        project_dir = self.projects_dir / name
+        if not (project_dir.is_dir() and (project_dir / ".git").exists()):
+            self.remove(name)
+            return
+
+        meta = RPGService(project_dir).load_meta_data()
+        if meta:
+            entry = {
+                "name": meta.get("name", name),
+                "description": meta.get("description"),
+                "created_at": meta.get("created_at"),
+                "updated_at": meta.get("updated_at"),
+                "branch": meta.get("branch", "unknown"),
+            }
+        else:
+            # メタデータがない場合はディレクトリ名から推測
+            entry = {"name": name, "branch": "unknown"}
+
+        self._entries[name] = entry
+        self._meta_mtimes[name] = self._stat_mtime(self._meta_path(name))
+        self._sorted.clear()
+
+    def _sorted_names(self, sort: str, descending: bool) -> List[str]:
+        """ソート済みのプロジェクト名一覧（変更があるまでキャッシュ）"""
+        key = (sort, descending)
+        names = self._sorted.get(key)
+        if names is None:
+            # 値がないエントリは昇順・降順どちらでも末尾に並べる
+            present = [n for n in self._entries if self._entries[n].get(sort)]
+            missing = sorted(n for n in self._entries if not self._entries[n].get(sort))
+            present.sort(key=lambda n: (self._entries[n][sort], n), reverse=descending)
+            names = present + missing
+            self._sorted[key] = names
+        return names
+
+    def _meta_path(self, name: str) -> Path:
+        return self.projects_dir / name / ".mocotch.json"
+
+    @staticmethod
+    def _stat_mtime(path: Path) -> Optional[int]:
+        try:
+            return path.stat().st_mtime_ns
+        except OSError:
+            return None
@@ -0,0 +1,110 @@
+"""新規プロジェクトの作成元になるテンプレートリポジトリのキャッシュ"""
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Optional
+import logging
+
+from .git_service import GitService
+from .repo_pool import repo_pool
+from .rpg_service import GITIGNORE_TEMPLATE, RPGService
+
+logger = logging.getLogger(__name__)
+
+# テンプレートリポジトリを置くディレクトリ（PROJECTS_DIR からの相対パス）
+TEMPLATES_DIR_NAME = ".templates"
+# テンプレートのプロジェクト名とブランチ（名前を含むファイルは作成時に書き換える）
+TEMPLATE_PROJECT_NAME = "template"
+TEMPLATE_BRANCH = "develop"
+# テンプレートの構成を変えたら上げる（古いテンプレートを作り直すため）
+TEMPLATE_VERSION = "1"
+
+
+class ProjectTemplateCache:
+    """
+    デフォルトプロジェクトのリポジトリを一度だけ作っておき、新規プロジェクトを
+    そのローカルクローンとして作成する
+
+    オブジェクトはハードリンクで共有され、プロジェクトごとに書き込むのは名前を含む
+    ファイル（game.json・README.md・メタデータ）とそれをまとめた1コミットだけになる。
+    テンプレートは内容のハッシュを名前にしたディレクトリに置き、.gitignore の
+    テンプレートなどが変わったら作り直す。
+    """
+
+    def __init__(self, projects_dir: Path):
+        self.templates_dir = projects_dir / TEMPLATES_DIR_NAME
+        self._path: Optional[Path] = None
+        self._lock = threading.Lock()
+
+    def create_project(self, project_path: Path, project_name: str, branch: str) -> bool:
+        """テンプレートから新規プロジェクトを作成（失敗したら作りかけのディレクトリを削除）"""
+        try:
+            template_path = self.template_path()
+        except Exception as e:
+            logger.error(f"テンプレートリポジトリの作成失敗: {e}")
+            return False
+
+        git_service = GitService(project_path, branch)
+        if not git_service.clone_template(template_path):
+            return False
+
+        try:
+            rpg_service = RPGService(project_path)
+            rpg_service.create_asset_dirs()
+            paths = rpg_service.write_named_files(project_name)
+            if git_service.commit_template(paths, "初期コミット: プロジェクト作成"):
+                return True
+        except Exception as e:
+            logger.error(f"テンプレートからのプロジェクト作成失敗: {e}")
+
+        repo_pool.evict(project_path)
+        shutil.rmtree(project_path, ignore_errors=True)
+        return False
+
+    def template_path(self) -> Path:
+        """テンプレートリポジトリのパス（なければ作成）"""
+        with self._lock:
+            if self._path is not None and self._path.exists():
+                return self._path
+
+            path = self.templates_dir / f"default-{self._fingerprint()}"
+            if not (path / ".git").exists():
+                self._build(path)
+            self._remove_stale(path)
+            self._path = path
+            return path
+
+    def _build(self, path: Path):
+        """テンプレートリポジトリを一時ディレクトリに作ってから配置"""
+        logger.info(f"テンプレートリポジトリを作成: {path}")
+        self.templates_dir.mkdir(parents=True, exist_ok=True)
+        build_path = self.templates_dir / f".build-{uuid.uuid4().hex}"
+        try:
+            if not RPGService(build_path).create_default_project(TEMPLATE_PROJECT_NAME):
+                raise RuntimeError("テンプレートのプロジェクト作成失敗")
+            git_service = GitService(build_path, TEMPLATE_BRANCH)
+            if not git_service.init_repo() or not git_service.commit_all("初期コミット: プロジェクト作成"):
+                raise RuntimeError("テンプレートの Git 初期化失敗")
+            repo_pool.evict(build_path)
+            os.replace(build_path, path)
+        finally:
+            repo_pool.evict(build_path)
+            shutil.rmtree(build_path, ignore_errors=True)
+
+    def _remove_stale(self, current: Path):
+        """現在のもの以外のテンプレートを削除"""
+        for entry in self.templates_dir.iterdir():
+            if entry != current and entry.name.startswith("default-"):
+                logger.info(f"古いテンプレートリポジトリを削除: {entry}")
+                shutil.rmtree(entry, ignore_errors=True)
+
+    @staticmethod
+    def _fingerprint() -> str:
+        """テンプレートのうちプロジェクトごとに書き換えない部分のハッシュ"""
+        digest = hashlib.sha256(TEMPLATE_VERSION.encode())
+        if GITIGNORE_TEMPLATE.exists():
+            digest.update(GITIGNORE_TEMPLATE.read_bytes())
+        return digest.hexdigest()[:12]
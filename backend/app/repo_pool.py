@@ -0,0 +1,182 @@
+"""GitPython の Repo ハンドルをプロジェクトごとに保持するプール"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional
+import logging
+
+from git import Repo
+
+logger = logging.getLogger(__name__)
+
+# プールに保持する Repo の上限数
+REPO_POOL_MAX_SIZE = int(os.environ.get("MOCOTCH_REPO_POOL_SIZE", "64"))
+# 最後に使われてからこの秒数が経過した Repo は閉じる
+REPO_POOL_IDLE_TIMEOUT = float(os.environ.get("MOCOTCH_REPO_POOL_IDLE_TIMEOUT", "300"))
+
+
+class _PooledRepo:
+    """プールに登録した Repo と、その貸し出し状態"""
+
+    def __init__(self, repo: Repo):
+        self.repo = repo
+        # 同じ Repo を使う操作を直列化する（GitPython の cat-file プロセスはスレッドセーフでない）
+        self.lock = threading.RLock()
+        self.leases = 0
+        self.last_used = time.monotonic()
+        # プールから外されたが、貸し出し中のため閉じるのを待っている
+        self.retired = False
+
+
+class RepoPool:
+    """
+    Repo ハンドルの LRU プール
+
+    Repo の背後で GitPython が起動する `git cat-file` プロセスやオブジェクト
+    キャッシュをリクエスト間で使い回す。上限を超えた場合とアイドル時間が
+    経過した場合は Repo.close() でヘルパープロセスを終了させる。
+
+    Repo は lease() で借りて使う。借りている間は Repo ごとのロックを保持するので
+    同じ Repo を複数のスレッドが同時に使うことはなく、貸し出し中の Repo は
+    プールから外されても返却されるまで閉じない。
+    """
+
+    def __init__(self, max_size: int = REPO_POOL_MAX_SIZE, idle_timeout: float = REPO_POOL_IDLE_TIMEOUT):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._repos: "OrderedDict[str, _PooledRepo]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lease(self, project_path: Path) -> Iterator[Optional[Repo]]:
+        """
+        プロジェクトの Repo を借りる（未オープンなら開いてプールに追加。リポジトリがなければ None）
+
+        with ブロックの間は Repo ごとのロックを保持する（同じスレッドからは入れ子で借りられる）
+        """
+        entry = self._acquire(project_path)
+        if entry is None:
+            yield None
+            return
+        try:
+            with entry.lock:
+                yield entry.repo
+        finally:
+            self._release(entry)
+
+    def put(self, project_path: Path, repo: Repo):
+        """新しく作成・クローンした Repo をプールに登録（同じパスが既にあれば置き換える）"""
+        key = self._key(project_path)
+        evicted = []
+
+        with self._lock:
+            entry = self._repos.pop(key, None)
+            if entry is not None and entry.repo is not repo:
+                evicted.append(entry)
+            self._repos[key] = _PooledRepo(repo)
+            evicted.extend(self._trim())
+
+        self._close_all(evicted)
+
+    def evict(self, project_path: Path):
+        """指定プロジェクトの Repo をプールから外して閉じる（貸し出し中なら返却後に閉じる）"""
+        with self._lock:
+            entry = self._repos.pop(self._key(project_path), None)
+            evicted = self._retire([entry] if entry else [])
+        self._close_all(evicted)
+
+    def evict_idle(self):
+        """アイドル時間を超えた Repo を閉じる（貸し出し中のものは除く）"""
+        deadline = time.monotonic() - self.idle_timeout
+
+        with self._lock:
+            idle = [
+                key for key, entry in self._repos.items() if entry.leases == 0 and entry.last_used <= deadline
+            ]
+            evicted = self._retire([self._repos.pop(key) for key in idle])
+        self._close_all(evicted)
+
+    def close_all(self):
+        """全ての Repo を閉じる（貸し出し中のものは返却後に閉じる）"""
+        with self._lock:
+            evicted = self._retire(list(self._repos.values()))
+            self._repos.clear()
+        self._close_all(evicted)
+
+    def _acquire(self, project_path: Path) -> Optional[_PooledRepo]:
+        key = self._key(project_path)
+        self.evict_idle()
+
+        with self._lock:
+            entry = self._repos.get(key)
+            if entry is not None:
+                entry.leases += 1
+                entry.last_used = time.monotonic()
+                self._repos.move_to_end(key)
+                return entry
+
+        if not (project_path / ".git").exists():
+            return None
+
+        repo = Repo(project_path)
+        evicted = []
+        with self._lock:
+            entry = self._repos.get(key)
+            if entry is None:
+                entry = self._repos[key] = _PooledRepo(repo)
+            else:
+                # 別スレッドが先に開いていた場合は既存のものを使う
+                evicted.append(_PooledRepo(repo))
+            entry.leases += 1
+            self._repos.move_to_end(key)
+            evicted.extend(self._trim())
+        self._close_all(evicted)
+        return entry
+
+    def _release(self, entry: _PooledRepo):
+        with self._lock:
+            entry.leases -= 1
+            entry.last_used = time.monotonic()
+            close = entry.retired and entry.leases == 0
+        if close:
+            self._close(entry.repo)
+
+    def _trim(self) -> List[_PooledRepo]:
+        """上限を超えた分を古い順にプールから外す（呼び出し側で _lock を保持）"""
+        removed = []
+        for key in list(self._repos):
+            if len(self._repos) - len(removed) <= self.max_size:
+                break
+            if self._repos[key].leases == 0:
+                removed.append(key)
+        return self._retire([self._repos.pop(key) for key in removed])
+
+    @staticmethod
+    def _retire(entries: List[_PooledRepo]) -> List[_PooledRepo]:
+        """プールから外したエントリのうち、すぐに閉じてよいもの（呼び出し側で _lock を保持）"""
+        for entry in entries:
+            entry.retired = True
+        return [entry for entry in entries if entry.leases == 0]
+
+    @staticmethod
+    def _key(project_path: Path) -> str:
+        return os.path.abspath(project_path)
+
+    def _close_all(self, entries: List[_PooledRepo]):
+        for entry in entries:
+            self._close(entry.repo)
+
+    @staticmethod
+    def _close(repo: Repo):
+        try:
+            repo.close()
+            logger.info(f"Repoハンドルを解放: {repo.working_dir}")
+        except Exception as e:
+            logger.error(f"Repoハンドル解放失敗: {e}")
+
+
+# プロセス全体で共有するプール
+repo_pool = RepoPool()
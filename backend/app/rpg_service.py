@@ -1,11 +1,45 @@
 """RPGプロジェクトデータを管理するサービス"""
-import json
+import hashlib
+import os
 import shutil
+import threading
+import time
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Callable, Optional, Dict, Any, List, Tuple
 import logging
 from datetime import datetime
 
+from .asset_index import get_asset_index
+from .autosave import autosave_buffer
+from . import json_codec
+from .data_patch import apply_operations
+from .event_engine import EventEngine
+from .document_cache import document_cache
+from .git_status import status_cache
+from .tile_codec import (
+    TILE_ENCODINGS,
+    TileEncodingError,
+    decode_document,
+    decode_map,
+    encode_document,
+    encode_map,
+)
+from .map_grid import MapGrid, tile_array
+from .map_lint import lint_document
+from .metrics import metrics
+from .map_chunks import (
+    DEFAULT_CHUNK_SIZE,
+    all_chunks,
+    changed_chunks,
+    chunk_bounds,
+    chunk_filename,
+    chunks_in_rect,
+    is_chunked,
+    parse_chunk_filename,
+    slice_chunk,
+    with_auto_chunking,
+)
+
 logger = logging.getLogger(__name__)
 
 # テンプレートファイルのパス
@@ -13,6 +47,53 @@ TEMPLATES_DIR = Path(__file__).parent.parent / "templates"
 README_TEMPLATE = TEMPLATES_DIR / "game-project-README.md"
 GITIGNORE_TEMPLATE = TEMPLATES_DIR / "game-project-gitignore"
 
+# game.json に保存するタイルのエンコーディング（json / u16 / rle / zlib）
+# json 以外では format_version 2 で保存し、旧形式しか読めないツールでは読めなくなるため既定は json
+TILE_ENCODING = os.environ.get("MOCOTCH_TILE_ENCODING", "json")
+if TILE_ENCODING not in TILE_ENCODINGS:
+    raise ValueError(f"MOCOTCH_TILE_ENCODING が不正です: {TILE_ENCODING}")
+
+DATA_LOAD_SECONDS = metrics.histogram(
+    "mocotch_data_load_duration_seconds", "ゲームデータをディスクから読み込んだ所要時間（秒）"
+)
+DATA_SAVE_SECONDS = metrics.histogram(
+    "mocotch_data_save_duration_seconds", "ゲームデータをディスクに書き込んだ所要時間（秒）"
+)
+DATA_READ_BYTES = metrics.counter(
+    "mocotch_data_read_bytes_total", "読み込んだゲームデータのファイル（game.json とチャンク）のバイト数"
+)
+DATA_WRITTEN_BYTES = metrics.counter(
+    "mocotch_data_written_bytes_total", "書き込んだゲームデータのファイル（game.json・チャンク・メタデータ）のバイト数"
+)
+
+# game.json ごとの書き込みロック
+_data_locks: Dict[str, threading.RLock] = {}
+_data_locks_guard = threading.Lock()
+
+
+def _data_lock(data_file: Path) -> threading.RLock:
+    """game.json の書き込みを直列化するロックを取得"""
+    key = str(data_file.resolve())
+    with _data_locks_guard:
+        lock = _data_locks.get(key)
+        if lock is None:
+            lock = _data_locks[key] = threading.RLock()
+        return lock
+
+
+# ゲームデータをディスクに書き込んだ後に呼ぶ関数（引数はプロジェクトのパス）
+_data_committed_hooks: List[Callable[[Path], None]] = []
+
+
+def on_data_committed(hook: Callable[[Path], None]):
+    """
+    ゲームデータの書き込み後に呼ぶ関数を登録
+
+    自動保存では保存のリクエストより後にまとめて書き込むので、書き込みに
+    連動する処理（プロジェクト一覧の更新日時など）はここから行う
+    """
+    _data_committed_hooks.append(hook)
+
 
 class RPGService:
     """RPGプロジェクトのデータを管理するサービス"""
@@ -22,83 +103,20 @@ class RPGService:
         self.data_file = project_path / "game.json"
         self.meta_file = project_path / ".mocotch.json"
         self.assets_dir = project_path / "assets"
+        # チャンク形式のマップの保存先
+        self.chunks_dir = project_path / "map"
+        # キャッシュの検証にはチャンクディレクトリの状態も含める
+        self._cache_watch = (self.chunks_dir,)
 
     def create_default_project(self, project_name: str) -> bool:
         """デフォルトのプロジェクトデータを作成"""
         try:
             # ディレクトリ構造を作成
             self.project_path.mkdir(parents=True, exist_ok=True)
-            (self.assets_dir / "images").mkdir(parents=True, exist_ok=True)
-            (self.assets_dir / "sounds").mkdir(parents=True, exist_ok=True)
-            (self.assets_dir / "movies").mkdir(parents=True, exist_ok=True)
-
-            # デフォルトのゲームデータ
-            default_data = {
-                "name": project_name,
-                "version": "1.0.0",
-                "map": {
-                    "width": 25,
-                    "height": 19,
-                    "tile_size": 32,
-                    "tiles": self._create_default_map()
-                },
-                "player": {
-                    "x": 5,
-                    "y": 5,
-                    "direction": "down"
-                },
-                "npcs": [
-                    {
-                        "id": "npc1",
-                        "name": "村人1",
-                        "x": 4,
-                        "y": 3,
-                        "message": "ようこそ、この世界へ！",
-                        "color": 0xff6b6b
-                    },
-                    {
-                        "id": "npc2",
-                        "name": "村人2",
-                        "x": 10,
-                        "y": 7,
-                        "message": "東の方に池があるぞ。",
-                        "color": 0xff6b6b
-                    },
-                    {
-                        "id": "npc3",
-                        "name": "村人3",
-                        "x": 6,
-                        "y": 9,
-                        "message": "いい天気だね。",
-                        "color": 0xff6b6b
-                    },
-                    {
-                        "id": "npc4",
-                        "name": "村人4",
-                        "x": 15,
-                        "y": 5,
-                        "message": "冒険の準備はできたかい？",
-                        "color": 0xff6b6b
-                    }
-                ],
-                "events": []
-            }
-
-            # game.jsonに保存
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(default_data, f, ensure_ascii=False, indent=2)
-
-            # メタデータ
-            meta_data = {
-                "name": project_name,
-                "description": "RPGプロジェクト",
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat(),
-                "branch": "develop"
-            }
-
-            with open(self.meta_file, 'w', encoding='utf-8') as f:
-                json.dump(meta_data, f, ensure_ascii=False, indent=2)
+            self.create_asset_dirs()
+
+            # game.json・メタデータ・README.md
+            self.write_named_files(project_name)
 
             # .gitignoreをテンプレートからコピー
             gitignore_path = self.project_path / ".gitignore"
@@ -109,28 +127,113 @@ class RPGService:
                 with open(gitignore_path, 'w') as f:
                     f.write(".mocotch.json\n")
 
-            # README.mdをテンプレートからコピーして変数を置換
-            readme_path = self.project_path / "README.md"
-            if README_TEMPLATE.exists():
-                with open(README_TEMPLATE, 'r', encoding='utf-8') as f:
-                    readme_content = f.read()
-
-                # テンプレート変数を置換
-                readme_content = readme_content.replace("{project_name}", project_name)
-                readme_content = readme_content.replace("{created_date}", datetime.now().strftime("%Y-%m-%d"))
-                readme_content = readme_content.replace("{mocotch_version}", "1.0.0")
-
-                with open(readme_path, 'w', encoding='utf-8') as f:
-                    f.write(readme_content)
-            else:
-                logger.warning("README テンプレートが見つかりません")
-
             logger.info(f"デフォルトプロジェクト作成完了: {project_name}")
             return True
         except Exception as e:
             logger.error(f"プロジェクト作成失敗: {e}")
             return False
 
+    def create_asset_dirs(self):
+        """アセットのディレクトリを作成"""
+        for asset_type in ("images", "sounds", "movies"):
+            (self.assets_dir / asset_type).mkdir(parents=True, exist_ok=True)
+
+    def write_named_files(self, project_name: str) -> List[str]:
+        """
+        プロジェクト名を含むファイル（game.json・メタデータ・README.md）を書き込み
+
+        テンプレートから作成したプロジェクトでも、このファイルだけを書き換える
+
+        Returns:
+            書き込んだファイルのうち Git で管理するもののパス（プロジェクトからの相対パス）
+        """
+        self._write_data_file(self._default_data(project_name))
+
+        # メタデータ
+        meta_data = {
+            "name": project_name,
+            "description": "RPGプロジェクト",
+            "created_at": datetime.now().isoformat(),
+            "updated_at": datetime.now().isoformat(),
+            "branch": "develop"
+        }
+        self._atomic_write_json(self.meta_file, meta_data)
+
+        # README.mdをテンプレートからコピーして変数を置換
+        readme_path = self.project_path / "README.md"
+        if README_TEMPLATE.exists():
+            with open(README_TEMPLATE, 'r', encoding='utf-8') as f:
+                readme_content = f.read()
+
+            # テンプレート変数を置換
+            readme_content = readme_content.replace("{project_name}", project_name)
+            readme_content = readme_content.replace("{created_date}", datetime.now().strftime("%Y-%m-%d"))
+            readme_content = readme_content.replace("{mocotch_version}", "1.0.0")
+
+            with open(readme_path, 'w', encoding='utf-8') as f:
+                f.write(readme_content)
+        else:
+            logger.warning("README テンプレートが見つかりません")
+
+        written = [self.data_file, readme_path]
+        if self.chunks_dir.exists():
+            written.extend(sorted(self.chunks_dir.iterdir()))
+        return [path.relative_to(self.project_path).as_posix() for path in written if path.exists()]
+
+    def _default_data(self, project_name: str) -> Dict[str, Any]:
+        """デフォルトのゲームデータ"""
+        default_data = {
+            "name": project_name,
+            "version": "1.0.0",
+            "map": {
+                "width": 25,
+                "height": 19,
+                "tile_size": 32,
+                "tiles": self._create_default_map()
+            },
+            "player": {
+                "x": 5,
+                "y": 5,
+                "direction": "down"
+            },
+            "npcs": [
+                {
+                    "id": "npc1",
+                    "name": "村人1",
+                    "x": 4,
+                    "y": 3,
+                    "message": "ようこそ、この世界へ！",
+                    "color": 0xff6b6b
+                },
+                {
+                    "id": "npc2",
+                    "name": "村人2",
+                    "x": 10,
+                    "y": 7,
+                    "message": "東の方に池があるぞ。",
+                    "color": 0xff6b6b
+                },
+                {
+                    "id": "npc3",
+                    "name": "村人3",
+                    "x": 6,
+                    "y": 9,
+                    "message": "いい天気だね。",
+                    "color": 0xff6b6b
+                },
+                {
+                    "id": "npc4",
+                    "name": "村人4",
+                    "x": 15,
+                    "y": 5,
+                    "message": "冒険の準備はできたかい？",
+                    "color": 0xff6b6b
+                }
+            ],
+            "events": []
+        }
+        return default_data
+
     def _create_default_map(self):
         """デフォルトマップを作成（既存のMainSceneと同じ）"""
         return [
@@ -156,14 +259,34 @@ class RPGService:
         ]
 
     def load_project_data(self) -> Optional[Dict[str, Any]]:
-        """プロジェクトデータを読み込み"""
+        """
+        プロジェクトデータを読み込み
+
+        書き込み待ちの自動保存があればそれを返す。
+        返すドキュメントはキャッシュと共有されるため、変更してはいけない
+        """
         try:
+            pending = autosave_buffer.get(self.data_file)
+            if pending is not None:
+                return pending
+
+            cached = document_cache.get(self.data_file, self._cache_watch)
+            if cached is not None:
+                return cached
+
             if not self.data_file.exists():
                 logger.error(f"ゲームデータファイルが存在しません: {self.data_file}")
                 return None
 
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            start = time.perf_counter()
+            file_key = document_cache.file_key(self.data_file, self._cache_watch)
+            data, raw, stored_encoding = self._read_stored_data()
+            map_data = data.get("map")
+            if is_chunked(map_data) and "tiles" not in map_data:
+                map_data["tiles"] = self._read_chunk_tiles(map_data)
+            DATA_LOAD_SECONDS.observe(time.perf_counter() - start)
+            document_cache.put(self.data_file, data, file_key, self._cache_watch)
+            self._remember_stored(data, raw, stored_encoding)
 
             logger.info(f"プロジェクトデータ読み込み成功")
             return data
@@ -171,34 +294,390 @@ class RPGService:
             logger.error(f"プロジェクトデータ読み込み失敗: {e}")
             return None
 
-    def save_project_data(self, data: Dict[str, Any]) -> bool:
-        """プロジェクトデータを保存"""
+    def load_map_region(self, x: int, y: int, width: int, height: int) -> Optional[Dict[str, Any]]:
+        """
+        矩形範囲と重なるチャンクのタイルを取得
+
+        チャンク形式のマップでキャッシュがない場合は、必要なチャンクファイルだけを読み込む
+        """
         try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            data = autosave_buffer.get(self.data_file) or document_cache.get(self.data_file, self._cache_watch)
+            if data is None:
+                if not self.data_file.exists():
+                    logger.error(f"ゲームデータファイルが存在しません: {self.data_file}")
+                    return None
+                header = self._read_data_file()
+                if is_chunked(header.get("map")) and "tiles" not in header["map"]:
+                    return self._region_from_files(header["map"], x, y, width, height)
+                data = self.load_project_data()
+                if data is None:
+                    return None
+
+            map_data = data["map"]
+            chunk_size = map_data.get("chunk_size") or DEFAULT_CHUNK_SIZE
+            map_width, map_height = map_data["width"], map_data["height"]
+            chunks = []
+            for cx, cy in chunks_in_rect(x, y, width, height, chunk_size, map_width, map_height):
+                tiles = slice_chunk(map_data["tiles"], cx, cy, chunk_size, map_width, map_height)
+                chunks.append(self._chunk_entry(cx, cy, chunk_size, map_width, map_height, tiles))
+
+            return self._region_response(map_data, chunk_size, chunks)
+        except Exception as e:
+            logger.error(f"マップ範囲読み込み失敗: {e}")
+            return None
+
+    def render_project_data(self, data: Dict[str, Any], tiles_encoding: Optional[str] = None) -> Tuple[bytes, str]:
+        """
+        API レスポンス用にシリアライズしたゲームデータと ETag を取得
+
+        結果はキャッシュ中のドキュメントに紐づけて保持し、変更されるまで再利用する。
+        game.json の内容がそのままレスポンスになる場合（同じエンコーディングで、
+        チャンク形式でない場合）はシリアライズせずにファイルの内容を返す
+        """
+        def render(doc: Dict[str, Any]) -> Tuple[bytes, str]:
+            stored = document_cache.derived(self.data_file, doc, "stored")
+            if stored is not None and stored[1] == (tiles_encoding or "json"):
+                body = stored[0]
+            else:
+                body_doc = encode_document(doc, tiles_encoding) if tiles_encoding else doc
+                body = json_codec.dumps(body_doc)
+            return body, f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+        return document_cache.derive(self.data_file, data, f"response:{tiles_encoding or ''}", render)
+
+    def map_grid(self, data: Dict[str, Any], avoid_npcs: bool = True) -> MapGrid:
+        """
+        通行判定用のグリッドを取得
 
-            # メタデータの更新日時を更新
-            if self.meta_file.exists():
-                with open(self.meta_file, 'r', encoding='utf-8') as f:
-                    meta = json.load(f)
-                meta["updated_at"] = datetime.now().isoformat()
-                with open(self.meta_file, 'w', encoding='utf-8') as f:
-                    json.dump(meta, f, ensure_ascii=False, indent=2)
+        キャッシュ中のドキュメントに紐づけて保持する（タイルの配列は NPC の扱いに関係なく共有）
+        """
+        def build(doc: Dict[str, Any]) -> MapGrid:
+            tiles = document_cache.derive(self.data_file, doc, "tile_array", lambda d: tile_array(d["map"]))
+            blocked = [(npc["x"], npc["y"]) for npc in doc.get("npcs") or []] if avoid_npcs else []
+            return MapGrid(tiles, blocked)
+
+        return document_cache.derive(self.data_file, data, f"map_grid:{int(avoid_npcs)}", build)
+
+    def event_engine(self, data: Dict[str, Any]) -> EventEngine:
+        """イベントの発動判定（条件式のコンパイル結果はキャッシュ中のドキュメントに紐づけて保持）"""
+        return document_cache.derive(self.data_file, data, "event_engine", EventEngine.from_document)
+
+    def lint_project_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """ゲームデータを検査（結果はキャッシュ中のドキュメントに紐づけて保持）"""
+        return document_cache.derive(
+            self.data_file, data, "lint", lambda doc: lint_document(doc, lambda: self.map_grid(doc))
+        )
+
+    def data_last_modified(self) -> Optional[float]:
+        """ゲームデータの最終更新時刻（game.json とチャンクディレクトリの新しい方）"""
+        saved_at = autosave_buffer.saved_at(self.data_file)
+        if saved_at is not None:
+            return saved_at
+
+        mtimes = []
+        for path in (self.data_file, self.chunks_dir):
+            try:
+                mtimes.append(path.stat().st_mtime)
+            except OSError:
+                pass
+        return max(mtimes) if mtimes else None
+
+    def save_project_data(self, data: Dict[str, Any], window: Optional[float] = None) -> bool:
+        """
+        プロジェクトデータを保存
+
+        自動保存バッファが有効な場合はメモリ上で受け付け、まとめて書き込む
+        （読み込みは書き込み前でも最新のデータを返す）。window を指定すると
+        MOCOTCH_AUTOSAVE_WINDOW の代わりにその秒数でまとめる
+        """
+        window = autosave_buffer.window if window is None else window
+        pending = None
+        try:
+            # エンコード済みのタイルを受け取った場合もメモリ上は2次元配列に揃える
+            data = decode_document(data)
+            if isinstance(data.get("map"), dict):
+                data["map"] = with_auto_chunking(data["map"])
+
+            with _data_lock(self.data_file):
+                if window > 0:
+                    base = None
+                    if not autosave_buffer.has(self.data_file) and self.data_file.exists():
+                        # 書き込み時に変更のあったチャンクだけを書くため、ディスク上のデータを控えておく
+                        base = self.load_project_data()
+                    autosave_buffer.put(self.data_file, data, self.flush_pending_data, base, window)
+                    # ディスクは未更新のままなので、書き込み時に改めて登録し直す
+                    document_cache.put(self.data_file, data, watch=self._cache_watch)
+                    return True
+
+                previous = None
+                pending = autosave_buffer.take(self.data_file)
+                if pending is not None:
+                    # 共同編集などの書き込み待ちはこの保存で置き換える（ディスク上のデータは base）
+                    previous = pending.base
+                elif is_chunked(data.get("map")) and self.data_file.exists():
+                    # 変更のあったチャンクだけを書き込むため前回のデータと比較する
+                    previous = self.load_project_data()
+                self._commit_data(data, previous)
 
             logger.info("プロジェクトデータ保存成功")
             return True
         except Exception as e:
+            document_cache.invalidate(self.data_file)
+            if pending is not None:
+                # 置き換えるはずだった書き込み待ちは失わないよう戻す
+                autosave_buffer.restore(self.data_file, pending)
             logger.error(f"プロジェクトデータ保存失敗: {e}")
             return False
 
+    def flush_pending_data(self) -> bool:
+        """書き込み待ちの自動保存をディスクに書き込む"""
+        with _data_lock(self.data_file):
+            pending = autosave_buffer.take(self.data_file)
+            if pending is None:
+                return True
+
+            try:
+                self._commit_data(pending.data, pending.base)
+            except Exception as e:
+                document_cache.invalidate(self.data_file)
+                autosave_buffer.restore(self.data_file, pending)
+                logger.error(f"プロジェクトデータ保存失敗: {e}")
+                return False
+
+        logger.info("プロジェクトデータ保存成功（自動保存）")
+        return True
+
+    def _commit_data(self, data: Dict[str, Any], previous: Optional[Dict[str, Any]]):
+        """ゲームデータを書き込み、キャッシュとメタデータの更新日時を更新"""
+        with DATA_SAVE_SECONDS.time():
+            written = self._write_data_file(data, previous)
+        document_cache.put(self.data_file, data, watch=self._cache_watch)
+        status_cache.invalidate(self.project_path)
+        if written is not None:
+            self._remember_stored(data, *written)
+
+        # メタデータの更新日時を更新
+        if self.meta_file.exists():
+            meta = json_codec.read_file(self.meta_file)
+            meta["updated_at"] = datetime.now().isoformat()
+            self._atomic_write_json(self.meta_file, meta)
+
+        for hook in _data_committed_hooks:
+            try:
+                hook(self.project_path)
+            except Exception as e:
+                logger.error(f"保存後の処理失敗: {e}")
+
+    def patch_project_data(self, operations: List[Dict[str, Any]], window: Optional[float] = None) -> bool:
+        """
+        プロジェクトデータに差分操作を適用して保存
+
+        キャッシュ済みのドキュメントに操作を適用し、変更があった場合だけ保存する。
+        操作が不正な場合は PatchError を送出する。window は save_project_data と同じ。
+        """
+        with _data_lock(self.data_file):
+            data = self.load_project_data()
+            if data is None:
+                return False
+
+            new_data, changed = apply_operations(data, operations)
+            if not changed:
+                return True
+
+            return self.save_project_data(new_data, window)
+
+    def _read_data_file(self) -> Dict[str, Any]:
+        """game.json を読み込んで API と同じ形式に変換（チャンクは読み込まない）"""
+        return self._read_stored_data()[0]
+
+    def _read_stored_data(self) -> Tuple[Dict[str, Any], bytes, Optional[str]]:
+        """
+        game.json を読み込み
+
+        Returns:
+            (API と同じ形式のデータ, ファイルの内容, ファイル内のタイルのエンコーディング)
+        """
+        with open(self.data_file, 'rb') as f:
+            raw = f.read()
+        DATA_READ_BYTES.inc(len(raw))
+        stored = json_codec.loads(raw)
+        return decode_document(stored), raw, self._stored_encoding(stored)
+
+    @staticmethod
+    def _stored_encoding(stored: Dict[str, Any]) -> Optional[str]:
+        """
+        保存形式のデータが、どのエンコーディング指定の API レスポンスと同じ内容かを判定
+
+        どれとも一致しない場合（チャンク形式やタイルのないマップなど）は None
+        """
+        map_data = stored.get("map")
+        if not isinstance(map_data, dict) or is_chunked(map_data):
+            return None
+        encoding = map_data.get("tiles_encoding")
+        if encoding:
+            return encoding if "format_version" in stored else None
+        if "tiles" in map_data and "format_version" not in stored:
+            return "json"
+        return None
+
+    def _remember_stored(self, data: Dict[str, Any], raw: bytes, stored_encoding: Optional[str]):
+        """game.json の内容をそのままレスポンスに使えるよう、キャッシュ中のドキュメントに紐づける"""
+        if stored_encoding is not None:
+            document_cache.derive(self.data_file, data, "stored", lambda _: (raw, stored_encoding))
+
+    def _write_data_file(
+        self, data: Dict[str, Any], previous: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Tuple[bytes, Optional[str]]]:
+        """
+        ゲームデータを保存用の形式にエンコードして書き込み
+
+        チャンク形式のマップは、前回のデータから変わったチャンクのファイルだけを
+        書き込み、マップ以外に変更がなければ game.json 自体も書き換えない
+
+        Returns:
+            書き込んだ game.json の内容とタイルのエンコーディング（書き込まなかった場合は None）
+        """
+        map_data = data.get("map")
+        if is_chunked(map_data):
+            previous_map = previous.get("map") if previous else None
+            self._write_chunks(map_data, previous_map)
+
+            header = {**data, "map": {k: v for k, v in map_data.items() if k != "tiles"}}
+            if previous is not None and previous_map is not None:
+                previous_header = {**previous, "map": {k: v for k, v in previous_map.items() if k != "tiles"}}
+                if header == previous_header:
+                    return None
+            stored = encode_document(header, TILE_ENCODING)
+        else:
+            try:
+                stored = encode_document(data, TILE_ENCODING)
+            except TileEncodingError as e:
+                # エンコードできないマップ（行の長さが不揃いなど）は従来形式で保存
+                logger.warning(f"タイルをエンコードできないため従来形式で保存: {e}")
+                stored = encode_document(data, "json")
+            self._remove_chunks()
+
+        raw = self._atomic_write_json(self.data_file, stored)
+        return raw, self._stored_encoding(stored)
+
+    def _write_chunks(self, map_data: Dict[str, Any], previous_map: Optional[Dict[str, Any]]):
+        """変更のあったチャンクをファイルに書き込み"""
+        chunk_size, width, height = map_data["chunk_size"], map_data["width"], map_data["height"]
+        tiles = map_data["tiles"]
+        if len(tiles) != height or any(len(row) != width for row in tiles):
+            raise TileEncodingError("タイル配列のサイズが width / height と一致しません")
+
+        same_layout = (
+            previous_map is not None
+            and "tiles" in previous_map
+            and self.chunks_dir.exists()
+            and all(previous_map.get(k) == map_data[k] for k in ("chunk_size", "width", "height"))
+        )
+        if same_layout:
+            targets = changed_chunks(tiles, previous_map["tiles"], chunk_size, width, height)
+        else:
+            targets = set(all_chunks(chunk_size, width, height))
+            self._remove_chunks(keep=targets)
+
+        self.chunks_dir.mkdir(parents=True, exist_ok=True)
+        for cx, cy in sorted(targets):
+            chunk_tiles = slice_chunk(tiles, cx, cy, chunk_size, width, height)
+            x, y, w, h = chunk_bounds(cx, cy, chunk_size, width, height)
+            chunk = {"x": x, "y": y, "width": w, "height": h, "tiles": chunk_tiles}
+            try:
+                stored = encode_map(chunk, TILE_ENCODING)
+            except TileEncodingError as e:
+                logger.warning(f"タイルをエンコードできないため従来形式で保存: {e}")
+                stored = chunk
+            self._atomic_write_json(self.chunks_dir / chunk_filename(cx, cy), stored)
+
+        if targets:
+            logger.info(f"チャンク保存: {len(targets)}件")
+
+    def _read_chunk_tiles(self, map_data: Dict[str, Any]) -> List[List[int]]:
+        """全チャンクを読み込んでマップ全体のタイル配列を組み立て（存在しないチャンクは0）"""
+        chunk_size, width, height = map_data["chunk_size"], map_data["width"], map_data["height"]
+        tiles = [[0] * width for _ in range(height)]
+        for cx, cy in all_chunks(chunk_size, width, height):
+            chunk_tiles = self._read_chunk(cx, cy, chunk_size, width, height)
+            if chunk_tiles is None:
+                continue
+            x, y, w, _ = chunk_bounds(cx, cy, chunk_size, width, height)
+            for dy, row in enumerate(chunk_tiles):
+                tiles[y + dy][x:x + w] = row
+        return tiles
+
+    def _read_chunk(self, cx: int, cy: int, chunk_size: int, width: int, height: int) -> Optional[List[List[int]]]:
+        """チャンクファイルを1つ読み込み"""
+        path = self.chunks_dir / chunk_filename(cx, cy)
+        if not path.exists():
+            return None
+
+        raw = path.read_bytes()
+        DATA_READ_BYTES.inc(len(raw))
+        chunk = decode_map(json_codec.loads(raw))
+        _, _, w, h = chunk_bounds(cx, cy, chunk_size, width, height)
+        tiles = chunk.get("tiles")
+        if chunk.get("width") != w or chunk.get("height") != h or tiles is None:
+            raise TileEncodingError(f"チャンクのサイズが不正です: {path.name}")
+        return tiles
+
+    def _region_from_files(self, map_data: Dict[str, Any], x: int, y: int, width: int, height: int) -> Dict[str, Any]:
+        """必要なチャンクファイルだけを読み込んで矩形範囲のレスポンスを作成"""
+        chunk_size, map_width, map_height = map_data["chunk_size"], map_data["width"], map_data["height"]
+        chunks = []
+        for cx, cy in chunks_in_rect(x, y, width, height, chunk_size, map_width, map_height):
+            tiles = self._read_chunk(cx, cy, chunk_size, map_width, map_height)
+            if tiles is None:
+                _, _, w, h = chunk_bounds(cx, cy, chunk_size, map_width, map_height)
+                tiles = [[0] * w for _ in range(h)]
+            chunks.append(self._chunk_entry(cx, cy, chunk_size, map_width, map_height, tiles))
+        return self._region_response(map_data, chunk_size, chunks)
+
+    @staticmethod
+    def _chunk_entry(cx: int, cy: int, chunk_size: int, map_width: int, map_height: int, tiles: List[List[int]]) -> Dict[str, Any]:
+        x, y, w, h = chunk_bounds(cx, cy, chunk_size, map_width, map_height)
+        return {"cx": cx, "cy": cy, "x": x, "y": y, "width": w, "height": h, "tiles": tiles}
+
+    @staticmethod
+    def _region_response(map_data: Dict[str, Any], chunk_size: int, chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "width": map_data["width"],
+            "height": map_data["height"],
+            "tile_size": map_data["tile_size"],
+            "chunk_size": chunk_size,
+            "chunks": chunks,
+        }
+
+    def _remove_chunks(self, keep=()):
+        """keep に含まれないチャンクファイルを削除"""
+        if not self.chunks_dir.exists():
+            return
+        for path in self.chunks_dir.iterdir():
+            coords = parse_chunk_filename(path.name)
+            if coords is not None and coords not in keep:
+                path.unlink()
+        if not keep and not any(self.chunks_dir.iterdir()):
+            self.chunks_dir.rmdir()
+
+    @staticmethod
+    def _atomic_write_json(path: Path, obj: Any) -> bytes:
+        """一時ファイルに書き込んでから置き換え、書き込んだ内容を返す"""
+        raw = json_codec.dump_file_bytes(obj)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(raw)
+        os.replace(tmp_path, path)
+        DATA_WRITTEN_BYTES.inc(len(raw))
+        return raw
+
     def load_meta_data(self) -> Optional[Dict[str, Any]]:
         """メタデータを読み込み"""
         try:
             if not self.meta_file.exists():
                 return None
 
-            with open(self.meta_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return json_codec.read_file(self.meta_file)
         except Exception as e:
             logger.error(f"メタデータ読み込み失敗: {e}")
             return None
@@ -206,22 +685,7 @@ class RPGService:
     def get_assets(self, asset_type: str):
         """アセットファイル一覧を取得"""
         try:
-            asset_path = self.assets_dir / asset_type
-            if not asset_path.exists():
-                return []
-
-            files = []
-            for file_path in asset_path.iterdir():
-                if file_path.is_file():
-                    stat = file_path.stat()
-                    files.append({
-                        "filename": file_path.name,
-                        "path": str(file_path.relative_to(self.project_path)),
-                        "size": stat.st_size,
-                        "created_at": datetime.fromtimestamp(stat.st_ctime).isoformat()
-                    })
-
-            return files
+            return get_asset_index(self.project_path).list_assets(asset_type)[1]
         except Exception as e:
             logger.error(f"アセット一覧取得失敗: {e}")
             return []
@@ -0,0 +1,150 @@
+"""タイル配列のエンコード・デコード"""
+import base64
+import sys
+import zlib
+from array import array
+from itertools import chain
+from typing import Any, Dict, List
+
+# game.json のフォーマットバージョン（2以降はタイルをエンコードして保存）
+DATA_FORMAT_VERSION = 2
+
+# 対応するエンコーディング
+#   json: 従来どおり2次元配列のまま保存
+#   u16:  リトルエンディアン uint16 配列を base64 化
+#   rle:  (連続数, タイル値) の uint16 ペア列を base64 化
+#   zlib: u16 を zlib 圧縮して base64 化
+TILE_ENCODINGS = ("json", "u16", "rle", "zlib")
+
+_MAX_TILE = 0xFFFF
+
+
+class TileEncodingError(ValueError):
+    """タイルのエンコード・デコードに失敗"""
+
+
+def encode_tiles(tiles: List[List[int]], width: int, height: int, encoding: str) -> str:
+    """2次元タイル配列を base64 文字列にエンコード"""
+    if len(tiles) != height or any(len(row) != width for row in tiles):
+        raise TileEncodingError("タイル配列のサイズが width / height と一致しません")
+
+    try:
+        values = array("H", chain.from_iterable(tiles))
+    except (OverflowError, TypeError) as e:
+        raise TileEncodingError(f"uint16 に収まらないタイル値があります: {e}") from None
+
+    if encoding == "rle":
+        values = _rle_encode(values)
+    if sys.byteorder == "big":
+        values.byteswap()
+    raw = values.tobytes()
+
+    if encoding == "zlib":
+        raw = zlib.compress(raw)
+    elif encoding not in ("u16", "rle"):
+        raise TileEncodingError(f"未対応のエンコーディング: {encoding}")
+
+    return base64.b64encode(raw).decode("ascii")
+
+
+def decode_tiles(data: str, width: int, height: int, encoding: str) -> List[List[int]]:
+    """base64 文字列を2次元タイル配列にデコード"""
+    try:
+        raw = base64.b64decode(data, validate=True)
+        if encoding == "zlib":
+            raw = zlib.decompress(raw)
+        elif encoding not in ("u16", "rle"):
+            raise TileEncodingError(f"未対応のエンコーディング: {encoding}")
+
+        values = array("H")
+        values.frombytes(raw)
+    except (ValueError, zlib.error) as e:
+        raise TileEncodingError(f"タイルデータが壊れています: {e}") from None
+
+    if sys.byteorder == "big":
+        values.byteswap()
+    if encoding == "rle":
+        values = _rle_decode(values)
+
+    if len(values) != width * height:
+        raise TileEncodingError("タイルデータのサイズが width / height と一致しません")
+
+    flat = values.tolist()
+    return [flat[y * width:(y + 1) * width] for y in range(height)]
+
+
+def encode_map(map_data: Dict[str, Any], encoding: str) -> Dict[str, Any]:
+    """マップデータのタイルをエンコード（json の場合はそのまま）"""
+    map_data = decode_map(map_data)
+    # チャンク形式のマップヘッダーなどタイルを持たない場合はそのまま
+    if encoding == "json" or "tiles" not in map_data:
+        return map_data
+
+    encoded = {k: v for k, v in map_data.items() if k != "tiles"}
+    encoded["tiles_encoding"] = encoding
+    encoded["tiles_data"] = encode_tiles(
+        map_data["tiles"], map_data["width"], map_data["height"], encoding
+    )
+    return encoded
+
+
+def decode_map(map_data: Dict[str, Any]) -> Dict[str, Any]:
+    """マップデータを2次元配列のタイルを持つ形式に正規化"""
+    encoding = map_data.get("tiles_encoding")
+    decoded = {
+        k: v for k, v in map_data.items()
+        if k not in ("tiles_encoding", "tiles_data") and not (k == "tiles" and v is None)
+    }
+    if encoding and encoding != "json":
+        decoded["tiles"] = decode_tiles(
+            map_data.get("tiles_data") or "", map_data["width"], map_data["height"], encoding
+        )
+    return decoded
+
+
+def encode_document(doc: Dict[str, Any], encoding: str) -> Dict[str, Any]:
+    """ゲームデータ全体を保存用の形式に変換"""
+    encoded = {k: v for k, v in doc.items() if k != "format_version"}
+    if "map" in doc:
+        encoded["map"] = encode_map(doc["map"], encoding)
+    if encoding != "json":
+        return {"format_version": DATA_FORMAT_VERSION, **encoded}
+    return encoded
+
+
+def decode_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """保存形式（新旧どちらでも）のゲームデータを API と同じ形式に変換"""
+    decoded = {k: v for k, v in doc.items() if k != "format_version"}
+    if isinstance(doc.get("map"), dict):
+        decoded["map"] = decode_map(doc["map"])
+    return decoded
+
+
+def _rle_encode(values: array) -> array:
+    """uint16 配列を (連続数, 値) ペアの配列に変換"""
+    runs = array("H")
+    if not values:
+        return runs
+
+    current, count = values[0], 0
+    for value in values:
+        if value == current and count < _MAX_TILE:
+            count += 1
+        else:
+            runs.append(count)
+            runs.append(current)
+            current, count = value, 1
+    runs.append(count)
+    runs.append(current)
+    return runs
+
+
+def _rle_decode(runs: array) -> array:
+    """(連続数, 値) ペアの配列を uint16 配列に展開"""
+    if len(runs) % 2:
+        raise TileEncodingError("RLE データの長さが不正です")
+
+    values = array("H")
+    for i in range(0, len(runs), 2):
+        values.extend(array("H", [runs[i + 1]]) * runs[i])
+    return values
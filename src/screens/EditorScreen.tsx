@@ -8,6 +8,9 @@ import { Mode, RPGProject } from '../types'
 
 type EditorTab = 'map' | 'npc' | 'player' | 'assets'
 
+// ジョブ状態を確認する間隔（ミリ秒）
+const JOB_POLL_INTERVAL = 500
+
 interface EditorScreenProps {
   projectName: string
   apiBaseUrl: string
@@ -94,6 +97,20 @@ function EditorScreen({
     }
   }, [projectData, apiBaseUrl, projectName])
 
+  // バックグラウンドジョブの完了を待つ
+  const waitForJob = async (jobId: string) => {
+    for (;;) {
+      const response = await fetch(`${apiBaseUrl}/api/jobs/${jobId}`)
+      if (!response.ok) throw new Error('ジョブ状態の取得に失敗しました')
+
+      const job = await response.json()
+      if (job.status === 'succeeded') return job
+      if (job.status === 'failed') throw new Error(job.error ?? 'ジョブが失敗しました')
+
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL))
+    }
+  }
+
   // 保存ボタン: Gitコミット・プッシュ
   const handleSave = async () => {
     setIsSaving(true)
@@ -107,6 +124,9 @@ function EditorScreen({
       })
       if (!response.ok) throw new Error('コミットに失敗しました')
 
+      const { job_id } = await response.json()
+      await waitForJob(job_id)
+
       initialDataRef.current = JSON.stringify(projectData)
       setHasUnsavedChanges(false)
     } catch (error) {